@@ -0,0 +1,33 @@
+"""
+shell 命令行与参数列表（argv）启动延迟基准测试
+
+运行（在项目根目录）：python -m benchmarks.bench_cmd_argv [命令数量]
+"""
+import sys
+import time
+
+from happy_python import run_cmd
+
+
+def bench(n: int, cmd, use_shell: bool) -> float:
+    start = time.perf_counter()
+
+    for _ in range(n):
+        run_cmd(cmd, use_shell=use_shell)
+
+    return (time.perf_counter() - start) / n
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+
+    for name, cmd, use_shell in (('shell', 'true', True),
+                                 ('shell pipeline', 'echo foo | cat', True),
+                                 ('use_shell=False', 'true', False),
+                                 ('argv', ['true'], True)):
+        latency = bench(n, cmd, use_shell)
+        print('%-16s %10.1f us/cmd' % (name, latency * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+"""
+execute_cmd_batch 并发数量与吞吐量基准测试
+
+运行（在项目根目录）：python -m benchmarks.bench_cmd_batch [命令数量]
+"""
+import os
+import sys
+import time
+
+from happy_python import execute_cmd, execute_cmd_batch
+
+CMD = 'sleep 0.01; echo ok'
+
+
+def bench_serial(n: int) -> float:
+    start = time.perf_counter()
+
+    for _ in range(n):
+        execute_cmd(CMD)
+
+    return time.perf_counter() - start
+
+
+def bench_batch(n: int, workers: int) -> float:
+    start = time.perf_counter()
+
+    for _ in execute_cmd_batch((CMD for _ in range(n)), workers=workers):
+        pass
+
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+
+    elapsed = bench_serial(n)
+    print('%-16s %8.3fs %10.1f cmd/s' % ('execute_cmd', elapsed, n / elapsed))
+
+    for workers in (1, 2, 4, 8, 16, 32, (os.cpu_count() or 1) * 4):
+        elapsed = bench_batch(n, workers)
+        print('%-16s %8.3fs %10.1f cmd/s' % ('workers=%d' % workers, elapsed, n / elapsed))
+
+
+if __name__ == '__main__':
+    main()
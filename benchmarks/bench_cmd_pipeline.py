@@ -0,0 +1,33 @@
+"""
+命令管道吞吐量基准测试：shell 管道、CmdPipeline（命令直连、Python 过滤阶段、splice 透传阶段）、
+先捕获输出再写入下一个命令
+
+运行（在项目根目录）：python -m benchmarks.bench_cmd_pipeline [行数]
+"""
+import sys
+import time
+
+from happy_python import CmdPipeline, run_cmd
+
+
+def bench(name: str, func, size: int) -> None:
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print('%-24s %8.3fs %10.1f MB/s' % (name, elapsed, size / elapsed / 1e6))
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000000
+    seq = 'seq 1 %d' % n
+    size = len(run_cmd(seq).stdout)
+
+    bench('shell', lambda: run_cmd('%s | wc -c' % seq), size)
+    bench('pipeline', lambda: CmdPipeline().pipe(seq).pipe('wc -c').run(), size)
+    bench('pipeline + splice', lambda: CmdPipeline().pipe(seq).progress(lambda _: None).pipe('wc -c').run(), size)
+    bench('pipeline + filter', lambda: CmdPipeline().pipe(seq).filter(lambda b: b).pipe('wc -c').run(), size)
+    bench('capture and feed', lambda: CmdPipeline().pipe('wc -c').run(input=run_cmd(seq).stdout), size)
+
+
+if __name__ == '__main__':
+    main()
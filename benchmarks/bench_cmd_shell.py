@@ -0,0 +1,35 @@
+"""
+常驻 shell 协进程与每次启动新 shell 的小命令延迟基准测试
+
+运行（在项目根目录）：python -m benchmarks.bench_cmd_shell [命令数量]
+"""
+import sys
+import time
+
+from happy_python import CmdShell, get_exit_code_of_cmd
+
+CMD = 'test -f /etc/passwd'
+
+
+def bench(n: int, func) -> float:
+    start = time.perf_counter()
+
+    for _ in range(n):
+        func(CMD)
+
+    return (time.perf_counter() - start) / n
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+
+    print('%-24s %10.1f us/cmd' % ('get_exit_code_of_cmd', bench(n, get_exit_code_of_cmd) * 1e6))
+
+    for isolated in (True, False):
+        with CmdShell(isolated=isolated) as shell:
+            latency = bench(n, shell.get_exit_code_of_cmd)
+            print('%-24s %10.1f us/cmd' % ('CmdShell(isolated=%s)' % isolated, latency * 1e6))
+
+
+if __name__ == '__main__':
+    main()
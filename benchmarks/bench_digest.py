@@ -0,0 +1,46 @@
+"""
+文件摘要基准测试：整体读入内存后逐个计算、分块读取、mmap 读取，单次读取同时计算 md5 和 sha256
+
+运行（在项目根目录）：python -m benchmarks.bench_digest [文件大小MiB]
+"""
+import hashlib
+import os
+import sys
+import tempfile
+import time
+
+from happy_python import gen_file_hexdigests
+
+
+def bench(name: str, func, size: int) -> None:
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print('%-20s %8.3fs %8.1f MiB/s' % (name, elapsed, size / elapsed / (1 << 20)))
+
+
+def read_all(path: str) -> dict[str, str]:
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    return {'md5': hashlib.md5(data).hexdigest(), 'sha256': hashlib.sha256(data).hexdigest()}
+
+
+def main() -> None:
+    size = (int(sys.argv[1]) if len(sys.argv) > 1 else 256) << 20
+
+    with tempfile.NamedTemporaryFile(delete=False) as f:
+        for _ in range(size >> 20):
+            f.write(os.urandom(1 << 20))
+
+    try:
+        bench('read all', lambda: read_all(f.name), size)
+        bench('chunked', lambda: gen_file_hexdigests(f.name, use_mmap=False), size)
+        bench('mmap', lambda: gen_file_hexdigests(f.name, use_mmap=True), size)
+        bench('file_digest sha256', lambda: gen_file_hexdigests(f.name, ('sha256',), use_mmap=False), size)
+    finally:
+        os.unlink(f.name)
+
+
+if __name__ == '__main__':
+    main()
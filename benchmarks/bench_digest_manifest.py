@@ -0,0 +1,62 @@
+"""
+目录清单基准测试：单线程逐个计算文件摘要与 build_manifest、verify_manifest 并行计算对比
+
+运行（在项目根目录）：python -m benchmarks.bench_digest_manifest [小文件数量] [大文件数量]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from happy_python import build_manifest, gen_file_hexdigest, verify_manifest
+from happy_python.digest_manifest import scan_files
+
+
+def make_tree(root: str, small: int, large: int) -> int:
+    total = 0
+
+    for i in range(small):
+        path = os.path.join(root, 'd%03d' % (i % 100), 'f%06d' % i)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = os.urandom(512 + i % 16384)
+        total += len(data)
+
+        with open(path, 'wb') as f:
+            f.write(data)
+
+    for i in range(large):
+        with open(os.path.join(root, 'large%d' % i), 'wb') as f:
+            for _ in range(128):
+                f.write(os.urandom(1 << 20))
+                total += 1 << 20
+
+    return total
+
+
+def bench(name: str, func, total: int) -> None:
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print('%-20s %8.3fs %8.1f MiB/s' % (name, elapsed, total / elapsed / (1 << 20)))
+
+
+def main() -> None:
+    small = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    large = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+
+    with tempfile.TemporaryDirectory() as root:
+        total = make_tree(root, small, large)
+        print('%d files, %.1f MiB, %d CPUs' % (small + large, total / (1 << 20), os.cpu_count()))
+
+        bench('single thread', lambda: sorted((rel_path, gen_file_hexdigest(path))
+                                              for path, rel_path, _ in scan_files(root)), total)
+
+        for workers in (1, 4, 16):
+            bench('build workers=%d' % workers, lambda: build_manifest(root, workers=workers), total)
+
+        manifest = build_manifest(root)
+        bench('verify', lambda: verify_manifest(root, manifest), total)
+
+
+if __name__ == '__main__':
+    main()
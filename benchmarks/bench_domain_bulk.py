@@ -0,0 +1,33 @@
+"""
+批量域名解析基准测试：逐个调用 to_domain_obj 与 parse_domains（单进程、进程池）
+
+运行（在项目根目录）：python -m benchmarks.bench_domain_bulk [域名数量]
+"""
+import os
+import sys
+import time
+
+from happy_python import parse_domains, to_domain_obj
+from benchmarks.bench_domain_tld import gen_domains
+
+
+def bench(name: str, func, n: int) -> None:
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print('%-24s %8.3fs %10.0f domains/s' % (name, elapsed, n / elapsed))
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    # 约 10% 的无效域名
+    domains = [d if i % 10 else d + '.invalid' for i, d in enumerate(gen_domains(n))]
+
+    bench('to_domain_obj', lambda: [to_domain_obj(d) for d in domains], n)
+
+    for workers in (1, os.cpu_count() or 1):
+        bench('parse_domains(workers=%d)' % workers, lambda: list(parse_domains(domains, workers=workers)), n)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+"""
+域名索引基准测试：按注册域名统计、子树查询的线性扫描与 DomainIndex 对比，以及索引的构建、保存、载入耗时
+
+运行（在项目根目录）：python -m benchmarks.bench_domain_index [域名数量]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from happy_python import DomainIndex, parse_domain_name
+from benchmarks.bench_domain_tld import gen_domains
+
+
+def timeit(name: str, func, repeat: int = 1):
+    start = time.perf_counter()
+
+    for _ in range(repeat):
+        result = func()
+
+    print('%-24s %10.3fms' % (name, (time.perf_counter() - start) / repeat * 1000))
+    return result
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    domains = [d for d in map(parse_domain_name, gen_domains(n)) if d is not None]
+    target = domains[0].domain_name
+
+    index = timeit('build', lambda: DomainIndex(domains))
+
+    timeit('scan count', lambda: sum(1 for d in domains if d.domain_name == target), 10)
+    timeit('index count', lambda: index.count(target), 10000)
+    timeit('scan find', lambda: [d.name for d in domains if d.name.endswith('.' + target)], 10)
+    timeit('index find', lambda: list(index.find(target)), 10000)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        filename = os.path.join(tmp_dir, 'domains.idx')
+        timeit('save', lambda: index.save(filename))
+        timeit('load', lambda: DomainIndex.load(filename))
+        print('file size %.1f bytes/domain' % (os.path.getsize(filename) / len(index)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""
+域名对象内存占用：Domain 与 DomainName 每个对象的平均内存（tracemalloc 统计，不含输入字符串），
+以及 to_domain_obj、parse_domain_name 在重复输入下的耗时
+
+运行（在项目根目录）：python -m benchmarks.bench_domain_memory [域名数量]
+"""
+import sys
+import time
+import tracemalloc
+
+from happy_python import parse_domain_name, to_domain_obj, clear_domain_cache
+from happy_python.domain import _parse_domain
+from benchmarks.bench_domain_tld import gen_domains
+
+
+def measure(name: str, func, domains: list[str]) -> None:
+    clear_domain_cache()
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    objs = [func(d) for d in domains]
+    # 缓存不计入
+    clear_domain_cache()
+    used = tracemalloc.get_traced_memory()[0] - start
+    tracemalloc.stop()
+
+    # 扣除结果列表本身
+    used -= sys.getsizeof(objs)
+    print('%-20s %8.1f bytes/domain' % (name, used / len(objs)))
+
+
+def bench(name: str, func, domains: list[str]) -> None:
+    start = time.perf_counter()
+
+    for domain in domains:
+        func(domain)
+
+    elapsed = time.perf_counter() - start
+    print('%-20s %8.3fs %10.0f domains/s' % (name, elapsed, len(domains) / elapsed))
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    domains = gen_domains(n)
+
+    measure('Domain', lambda d: _parse_domain(d)[0], domains)
+    measure('DomainName', parse_domain_name, domains)
+
+    # 重复输入：1000 个不同的域名
+    repeated = domains[:1000] * (n // 1000)
+    clear_domain_cache()
+    bench('to_domain_obj', to_domain_obj, repeated)
+    bench('parse_domain_name', parse_domain_name, repeated)
+
+
+if __name__ == '__main__':
+    main()
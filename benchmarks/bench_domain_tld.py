@@ -0,0 +1,61 @@
+"""
+顶级域查找基准测试：列表线性查找、集合哈希查找、反向后缀树查找，以及 to_domain_obj、validate_domain、is_valid_domain 整体耗时
+
+运行（在项目根目录）：python -m benchmarks.bench_domain_tld [域名数量]
+"""
+import random
+import string
+import sys
+import time
+
+from happy_python import to_domain_obj, validate_domain, is_valid_domain
+from happy_python.domain import TLDs, TLD_TRIE, _TLD_SET
+
+
+def gen_domains(n: int) -> list[str]:
+    rnd = random.Random(0)
+    tlds = [tld[1:] for tld in TLDs if tld.isascii()]
+    suffixes = ['com.cn', 'co.uk', 'ne.jp', 'com.au']
+    domains = []
+
+    for _ in range(n):
+        label = ''.join(rnd.choices(string.ascii_lowercase, k=rnd.randint(3, 12)))
+        suffix = rnd.choice(suffixes) if rnd.random() < 0.2 else rnd.choice(tlds)
+        domains.append('www.%s.%s' % (label, suffix))
+
+    return domains
+
+
+def bench(name: str, func, domains: list[str]) -> None:
+    start = time.perf_counter()
+
+    for domain in domains:
+        func(domain)
+
+    elapsed = time.perf_counter() - start
+    print('%-20s %8.3fs %10.0f domains/s' % (name, elapsed, len(domains) / elapsed))
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    domains = gen_domains(n)
+
+    bench('list', lambda d: '.' + d.rsplit('.', 1)[1] in TLDs, domains)
+    bench('set', lambda d: '.' + d.rsplit('.', 1)[1] in _TLD_SET, domains)
+    bench('trie', lambda d: TLD_TRIE.match(d.split('.')), domains)
+    bench('to_domain_obj', to_domain_obj, domains)
+    bench('validate_domain', validate_domain, domains)
+    bench('is_valid_domain', is_valid_domain, domains)
+
+    # 无效域名：to_domain_obj 每个都输出错误日志
+    invalid = [d + '.invalid' for d in domains]
+    bench('to_domain_obj(bad)', to_domain_obj, invalid)
+    bench('is_valid_domain(bad)', is_valid_domain, invalid)
+
+    # 国际化域名：转换为 punycode 后验证
+    idn = ['www.时尚%s.中国' % d.split('.')[1] for d in domains]
+    bench('is_valid_domain(idn)', is_valid_domain, idn)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""
+顶级域数据载入基准测试：文本文件、预编译索引、mmap 索引的载入耗时和 is_valid_domain 吞吐量
+
+运行（在项目根目录）：python -m benchmarks.bench_tld_db [域名数量]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from happy_python import is_valid_domain, load_tld_db
+from happy_python.domain import clear_domain_cache
+from happy_python.tld_db import TLD_DB_FILE, TLD_TEXT_FILES, read_suffix_text
+from benchmarks.bench_domain_tld import gen_domains
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    domains = gen_domains(n)
+
+    with tempfile.NamedTemporaryFile('w', suffix='.txt', encoding='UTF-8', delete=False) as f:
+        f.write('\n'.join(suffix for tmp in TLD_TEXT_FILES for suffix in read_suffix_text(tmp)))
+
+    for name, load in (('text', lambda: load_tld_db(f.name)),
+                       ('index', lambda: load_tld_db(TLD_DB_FILE, use_mmap=False)),
+                       ('mmap', lambda: load_tld_db(TLD_DB_FILE, use_mmap=True))):
+        start = time.perf_counter()
+
+        for _ in range(100):
+            load()
+
+        load_elapsed = (time.perf_counter() - start) / 100
+        clear_domain_cache()
+        start = time.perf_counter()
+
+        for domain in domains:
+            is_valid_domain(domain)
+
+        elapsed = time.perf_counter() - start
+        print('%-8s load %8.3fms %10.0f domains/s' % (name, load_elapsed * 1000, n / elapsed))
+
+    os.unlink(f.name)
+    load_tld_db()
+
+
+if __name__ == '__main__':
+    main()
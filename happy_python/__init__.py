@@ -9,6 +9,8 @@ from happy_python.digest import gen_md5_32_hexdigest, sign_sha1_digest, sign_sha
     sign_sha384_digest, sign_sha512_digest
 from happy_python.digest import gen_sha1_hexdigest
 from happy_python.digest import gen_sha512_hexdigest
+from happy_python.digest import gen_stream_hexdigests, gen_file_hexdigests, gen_file_hexdigest
+from happy_python.digest_manifest import Manifest, ManifestEntry, ManifestDiff, build_manifest, verify_manifest
 from happy_python.datetime import str_to_datetime
 from happy_python.datetime import datetime_to_str
 from happy_python.datetime import get_current_datetime
@@ -26,8 +28,26 @@ from happy_python.str_util import bytes_to_str
 from happy_python.str_util import dict_to_str
 from happy_python.str_util import str_to_dict
 from happy_python.json import dict_to_pretty_json
-from happy_python.domain import Domain, to_domain_obj
+from happy_python.domain import Domain, to_domain_obj, DomainError, DomainRecord, DomainParseStats, \
+    DomainBulkParser, parse_domains, DomainValidation, validate_domain, is_valid_domain, \
+    DomainName, parse_domain_name, clear_domain_cache, load_tld_db, \
+    normalize_domain, domain_to_unicode
+from happy_python.domain_index import DomainIndex
 from happy_python.cmd import execute_cmd
+from happy_python.cmd import CmdResult, run_cmd, execute_cmd_batch
+from happy_python.cmd import CmdHandle, start_cmd
+from happy_python.cmd import CmdOutputStream, iter_cmd_output
+from happy_python.cmd import CmdCapture, SpilledOutput
+from happy_python.cmd import CmdLine, resolve_executable
+from happy_python.cmd import CmdLimits
+from happy_python.cmd import set_cmd_telemetry
+from happy_python.cmd import set_cmd_close_fds
+from happy_python.cmd import CmdPipeline, CmdPipelineResult
+from happy_python.cmd import CmdCache, CmdCacheStats
+from happy_python.cmd_telemetry import CmdTelemetry, CmdUsage
+from happy_python.cmd_asyncio import async_get_exit_code_of_cmd, async_get_exit_status_of_cmd, \
+    async_get_output_of_cmd, async_execute_cmd, async_exe_cmd_and_poll_output
+from happy_python.cmd_shell import CmdShell
 
 __all__ = [
     "HappyPyException",
@@ -39,6 +59,14 @@ __all__ = [
     "gen_md5_32_hexdigest",
     "gen_sha1_hexdigest",
     "gen_sha512_hexdigest",
+    "gen_stream_hexdigests",
+    "gen_file_hexdigests",
+    "gen_file_hexdigest",
+    "Manifest",
+    "ManifestEntry",
+    "ManifestDiff",
+    "build_manifest",
+    "verify_manifest",
     "get_current_datetime",
     "get_current_timestamp",
     "get_exit_code_of_cmd",
@@ -68,7 +96,48 @@ __all__ = [
     "is_printable_ascii_str",
     "Domain",
     "to_domain_obj",
+    "DomainError",
+    "DomainRecord",
+    "DomainParseStats",
+    "DomainBulkParser",
+    "parse_domains",
+    "DomainValidation",
+    "validate_domain",
+    "is_valid_domain",
+    "DomainName",
+    "parse_domain_name",
+    "clear_domain_cache",
+    "load_tld_db",
+    "normalize_domain",
+    "domain_to_unicode",
+    "DomainIndex",
     "execute_cmd",
     "HappyDatetimeFormat",
     "from_hex_str",
+    "CmdResult",
+    "run_cmd",
+    "execute_cmd_batch",
+    "CmdHandle",
+    "start_cmd",
+    "CmdOutputStream",
+    "iter_cmd_output",
+    "CmdCapture",
+    "SpilledOutput",
+    "CmdLine",
+    "resolve_executable",
+    "CmdShell",
+    "CmdLimits",
+    "set_cmd_telemetry",
+    "set_cmd_close_fds",
+    "CmdTelemetry",
+    "CmdUsage",
+    "CmdPipeline",
+    "CmdPipelineResult",
+    "CmdCache",
+    "CmdCacheStats",
+    "async_get_exit_code_of_cmd",
+    "async_get_exit_status_of_cmd",
+    "async_get_output_of_cmd",
+    "async_execute_cmd",
+    "async_exe_cmd_and_poll_output",
 ]
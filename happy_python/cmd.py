@@ -1,28 +1,632 @@
+import codecs
+import errno
+import fcntl
 import inspect
+import mmap
 import os
+import resource
+import selectors
+import shlex
+import shutil
+import signal
 import subprocess
+import sys
+import tempfile
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from threading import Lock, Thread
+from dataclasses import dataclass, replace
+from functools import lru_cache
 from multiprocessing import Process, get_context
+from typing import BinaryIO, Callable, Iterable, Iterator, Optional, Sequence, Union
 
 from happy_python import HappyLog
+from happy_python.cmd_telemetry import CmdTelemetry, CmdUsage
+from happy_python.happy_log import HappyLogLevel
 
 hlog = HappyLog()
 
+# 输出流名称
+STDOUT = 'stdout'
+STDERR = 'stderr'
 
-def get_exit_code_of_cmd(cmd: str,
+# 每次从管道读取的最大字节数
+READ_CHUNK_SIZE = 65536
+
+# 执行失败时日志中每个输出流最多保留的字节数，超出时保留开头和结尾各一半
+LOG_OUTPUT_MAX_SIZE = 4096
+
+# 超时后先向进程组发送 SIGTERM，等待该时长（秒）后仍未全部退出时发送 SIGKILL
+KILL_GRACE_PERIOD = 2.0
+
+# 执行统计，None 表示不统计，通过 set_cmd_telemetry() 设置
+_telemetry: Optional[CmdTelemetry] = None
+
+# 直接执行（不经过 shell）的命令是否关闭继承的文件描述符，通过 set_cmd_close_fds() 设置
+_close_fds = True
+
+# 命令行：字符串或参数列表。参数列表直接执行，不经过 shell
+CmdLine = Union[str, Sequence[str]]
+
+
+@lru_cache(maxsize=1024)
+def _which(name: str, path: Optional[str]) -> Optional[str]:
+    return shutil.which(name, path=path)
+
+
+def resolve_executable(name: str) -> str:
+    """
+    查找可执行文件的绝对路径，结果在进程生命周期内缓存（PATH 变化时重新查找）
+    :param name: 可执行文件名或路径
+    :return:
+    """
+    if os.sep in name:
+        return name
+
+    path = _which(name, os.environ.get('PATH'))
+
+    if path is None:
+        raise FileNotFoundError(errno.ENOENT, '找不到可执行文件', name)
+
+    return path
+
+
+# 资源对应的 prlimit 选项
+_PRLIMIT_OPTIONS = {resource.RLIMIT_CPU: 'cpu', resource.RLIMIT_AS: 'as', resource.RLIMIT_NOFILE: 'nofile'}
+
+# 没有 prlimit 时使用的包装进程：参数为限制数量 n、n 组（资源, 软限制, 硬限制）和目标命令
+_RLIMIT_SHIM = '''import os, resource, sys
+n = int(sys.argv[1])
+for i in range(n):
+    resource.setrlimit(int(sys.argv[2 + i * 3]), (int(sys.argv[3 + i * 3]), int(sys.argv[4 + i * 3])))
+os.execv(sys.argv[2 + n * 3], sys.argv[2 + n * 3:])
+'''
+
+
+@dataclass(frozen=True)
+class CmdLimits:
+    """
+    子进程资源限制，只影响该子进程及其后代进程。
+    命令通过 prlimit（util-linux）启动，找不到 prlimit 时通过 Python 包装进程启动，设置资源限制后 exec 目标命令，
+    进程号不变。不使用 preexec_fn，在多线程中（比如 execute_cmd_batch）执行也是安全的。
+    超出 CPU 时间限制时子进程收到 SIGXCPU（1 秒后 SIGKILL），超出其他限制时相应的系统调用失败。
+    """
+    # CPU 时间，单位秒
+    cpu_seconds: Optional[int] = None
+    # 虚拟地址空间，单位字节
+    address_space: Optional[int] = None
+    # 打开的文件描述符数量
+    open_files: Optional[int] = None
+
+    def to_rlimits(self) -> list[tuple[int, tuple[int, int]]]:
+        """
+        :return: (资源, (软限制, 硬限制)) 列表
+        """
+        rlimits = []
+
+        if self.cpu_seconds is not None:
+            rlimits.append((resource.RLIMIT_CPU, (self.cpu_seconds, self.cpu_seconds + 1)))
+
+        if self.address_space is not None:
+            rlimits.append((resource.RLIMIT_AS, (self.address_space, self.address_space)))
+
+        if self.open_files is not None:
+            rlimits.append((resource.RLIMIT_NOFILE, (self.open_files, self.open_files)))
+
+        return rlimits
+
+    def wrap_argv(self, argv: list[str]) -> list[str]:
+        """
+        :param argv: 目标命令的参数列表
+        :return: 设置资源限制后执行目标命令的参数列表
+        """
+        rlimits = self.to_rlimits()
+        prlimit = _which('prlimit', os.environ.get('PATH'))
+
+        if prlimit is not None:
+            options = ['--%s=%d:%d' % (_PRLIMIT_OPTIONS[res], soft, hard) for res, (soft, hard) in rlimits]
+            return [prlimit, *options, '--', *argv]
+
+        values = [str(value) for res, limits in rlimits for value in (res, *limits)]
+        return [sys.executable, '-I', '-S', '-c', _RLIMIT_SHIM, str(len(rlimits)), *values, *argv]
+
+
+def _to_popen_args(cmd: CmdLine,
+                   use_shell: bool,
+                   limits: Optional[CmdLimits] = None) -> tuple[Union[str, list[str]], dict]:
+    """
+    将命令行转换为 Popen 参数。
+    字符串且 use_shell=True 时通过 /bin/sh 执行；参数列表或 use_shell=False 时直接执行，
+    可执行文件解析为绝对路径，跳过 shell 和 PATH 查找。默认 close_fds=True（Python 3.10 起同样使用 vfork），
+    通过 set_cmd_close_fds(False) 启用 posix_spawn 快速路径。
+    设置资源限制时通过 CmdLimits.wrap_argv() 包装命令，字符串命令行改为 /bin/sh -c 执行。
+    :return: Popen 的 args 和其他关键字参数
+    """
+    if isinstance(cmd, str) and use_shell:
+        args, kwargs = cmd, {'shell': True}
+    else:
+        argv = shlex.split(cmd) if isinstance(cmd, str) else list(cmd)
+
+        if not argv:
+            raise ValueError('命令行不能为空')
+
+        argv[0] = resolve_executable(argv[0])
+        args, kwargs = argv, {'shell': False, 'close_fds': _close_fds}
+
+    if limits is not None:
+        if kwargs['shell']:
+            args, kwargs = ['/bin/sh', '-c', args], {'shell': False, 'close_fds': _close_fds}
+
+        args = limits.wrap_argv(args)
+
+    return args, kwargs
+
+
+def set_cmd_close_fds(close_fds: bool) -> bool:
+    """
+    设置直接执行（参数列表或 use_shell=False）的命令是否关闭继承的文件描述符，默认为 True。
+    设置为 False 时 subprocess 可以使用 posix_spawn，启动更快，但当前进程中可继承的文件描述符
+    （从父进程继承的，或通过 os.set_inheritable 设置的）会泄漏到子进程，只在确认没有此类文件描述符时使用
+    :param close_fds:
+    :return: close_fds
+    """
+    global _close_fds
+
+    _close_fds = close_fds
+
+    return close_fds
+
+
+def set_cmd_telemetry(telemetry: Optional[CmdTelemetry]) -> Optional[CmdTelemetry]:
+    """
+    设置执行统计。启用后 run_cmd 系列函数使用 os.wait4 回收子进程，收集资源使用情况并按命令名汇总
+    :param telemetry: 执行统计对象，None 表示关闭
+    :return: telemetry
+    """
+    global _telemetry
+
+    _telemetry = telemetry
+
+    return telemetry
+
+
+def _wait_with_usage(p: subprocess.Popen) -> tuple[int, Optional[CmdUsage]]:
+    """
+    使用 os.wait4 回收子进程，已被回收（比如超时结束）时没有资源使用情况
+    :return: 退出代码和资源使用情况
+    """
+    if p.returncode is None:
+        try:
+            _, status, ru = os.wait4(p.pid, 0)
+        except ChildProcessError:
+            return p.wait(), None
+
+        # 设置 returncode 后 Popen 不会再次回收子进程
+        p.returncode = os.waitstatus_to_exitcode(status)
+
+        return p.returncode, CmdUsage.from_rusage(ru)
+
+    return p.returncode, None
+
+
+def _signal_process_group(pgid: int, sig: int) -> bool:
+    """
+    :return: 进程组是否存在
+    """
+    try:
+        os.killpg(pgid, sig)
+        return True
+    except ProcessLookupError:
+        return False
+
+
+def _kill_process_group(p: subprocess.Popen, grace: float = KILL_GRACE_PERIOD) -> None:
+    """
+    结束在独立会话中启动的子进程及其所在进程组中的所有进程（包括 shell 启动的孙进程）：
+    先发送 SIGTERM，子进程退出或等待 grace 秒后，向进程组发送 SIGKILL 清理剩余进程，最后回收子进程
+    """
+    if _signal_process_group(p.pid, signal.SIGTERM):
+        try:
+            p.wait(grace)
+        except subprocess.TimeoutExpired:
+            pass
+
+        # 不能用进程组是否存在来判断，孤儿进程退出后在被回收之前仍属于该进程组
+        _signal_process_group(p.pid, signal.SIGKILL)
+
+    p.wait()
+
+
+@dataclass
+class CmdCapture:
+    """
+    命令输出捕获方式，用于输出很大的命令，比如 tar -t、数据库导出。
+    max_bytes 和 spill_threshold 不能同时设置。
+    """
+    # 每个流最多保留的字节数，超出时保留开头和结尾各一半，None 表示不限制
+    max_bytes: Optional[int] = None
+    # 每个流的输出超过该字节数时写入临时文件，结果为 SpilledOutput，None 表示始终保存在内存中
+    spill_threshold: Optional[int] = None
+    # 是否解码为字符串，False 时返回 bytes，不做解码和复制
+    decode: bool = True
+
+    def __post_init__(self):
+        if self.max_bytes is not None and self.spill_threshold is not None:
+            raise ValueError('max_bytes 和 spill_threshold 不能同时设置')
+
+        # max_bytes 为 0 时保留结尾的长度为 0，del tail[:-0] 不裁剪，不能限制大小
+        if self.max_bytes is not None and self.max_bytes <= 0:
+            raise ValueError('max_bytes 必须大于 0')
+
+        if self.spill_threshold is not None and self.spill_threshold < 0:
+            raise ValueError('spill_threshold 不能小于 0')
+
+
+class SpilledOutput:
+    """
+    写入临时文件的命令输出，通过只读 mmap 或 memoryview 访问，不占用进程堆内存。
+    临时文件没有文件名，close() 或对象被回收后自动删除。
+    """
+
+    def __init__(self, file: BinaryIO, size: int):
+        self.file = file
+        self.size = size
+        self._mmap: Optional[mmap.mmap] = None
+
+    def __len__(self) -> int:
+        return self.size
+
+    @property
+    def mmap(self) -> mmap.mmap:
+        if self._mmap is None:
+            self.file.flush()
+            self._mmap = mmap.mmap(self.file.fileno(), self.size, access=mmap.ACCESS_READ)
+
+        return self._mmap
+
+    def memoryview(self) -> memoryview:
+        """
+        返回输出内容的 memoryview，close() 前需要先释放（release()）
+        :return:
+        """
+        return memoryview(self.mmap)
+
+    def decode(self, encoding='UTF-8', errors='strict') -> str:
+        """
+        将全部输出解码为字符串，会将输出读入内存
+        :return:
+        """
+        return str(self.mmap[:], encoding, errors)
+
+    def close(self) -> None:
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+        self.file.close()
+
+    def __enter__(self) -> 'SpilledOutput':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> bool:
+        self.close()
+        return False
+
+    def __str__(self) -> str:
+        return '<SpilledOutput %d bytes>' % self.size
+
+
+CmdOutput = Union[str, bytes, SpilledOutput]
+
+
+def _output_preview(output: CmdOutput, encoding: str, max_size: int = LOG_OUTPUT_MAX_SIZE) -> str:
+    """
+    截取用于日志的输出，只复制开头和结尾各 max_size // 2 个字节（字符串为字符），不复制或读入整个输出
+    """
+    size = len(output)
+
+    if size <= max_size:
+        if isinstance(output, SpilledOutput):
+            return output.decode(encoding, 'replace').strip()
+
+        return (output if isinstance(output, str) else str(output, encoding, 'replace')).strip()
+
+    half = max_size // 2
+    data = output.mmap if isinstance(output, SpilledOutput) else output
+    head = data[:half]
+    tail = data[size - half:]
+
+    if not isinstance(head, str):
+        # 截断处可能切开多字节字符
+        head = str(head, encoding, 'replace')
+        tail = str(tail, encoding, 'replace')
+
+    return '%s\n...(truncated %d)...\n%s' % (head, size - half * 2, tail)
+
+
+@dataclass
+class CmdResult:
+    """
+    命令执行结果
+    """
+    # 命令行
+    cmd: CmdLine
+    # 退出代码
+    returncode: int
+    # 标准输出，根据 CmdCapture 设置可能为 str、bytes 或 SpilledOutput
+    stdout: CmdOutput
+    # 标准错误，同标准输出
+    stderr: CmdOutput
+    # 执行时长，单位秒
+    duration: float
+    # 批量执行时的提交序号
+    index: int = 0
+    # 因 CmdCapture.max_bytes 限制而丢弃的字节数
+    stdout_truncated: int = 0
+    stderr_truncated: int = 0
+    # 是否因超时被结束，此时 stdout、stderr 为超时前的输出
+    timed_out: bool = False
+    # 子进程资源使用情况，只在启用执行统计时收集
+    usage: Optional[CmdUsage] = None
+
+
+class _OutputBuffer:
+    """
+    单个输出流的捕获缓冲区，按 CmdCapture 设置保存在内存中、保留首尾或写入临时文件
+    """
+
+    def __init__(self, capture: CmdCapture):
+        self.max_bytes = capture.max_bytes
+        self.spill_threshold = capture.spill_threshold
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.total = 0
+        self.file: Optional[BinaryIO] = None
+
+    def write(self, data: bytes) -> None:
+        self.total += len(data)
+
+        if self.file is not None:
+            self.file.write(data)
+            return
+
+        if self.max_bytes is None:
+            self.head += data
+
+            if self.spill_threshold is not None and self.total > self.spill_threshold:
+                self.file = tempfile.TemporaryFile(prefix='happy_cmd_')
+                self.file.write(self.head)
+                self.head = bytearray()
+
+            return
+
+        head_room = self.max_bytes // 2 - len(self.head)
+
+        if head_room > 0:
+            self.head += data[:head_room]
+            data = data[head_room:]
+
+        if data:
+            self.tail += data
+            tail_size = self.max_bytes - self.max_bytes // 2
+
+            # 超出一倍后再裁剪，均摊复制开销
+            if len(self.tail) > tail_size * 2:
+                del self.tail[:-tail_size]
+
+    def getvalue(self, capture: CmdCapture, encoding: str) -> tuple[CmdOutput, int]:
+        """
+        :return: 输出内容和丢弃的字节数
+        """
+        if self.file is not None:
+            return SpilledOutput(self.file, self.total), 0
+
+        truncated = 0
+        data = self.head
+
+        if self.max_bytes is not None:
+            tail_size = self.max_bytes - self.max_bytes // 2
+
+            if len(self.tail) > tail_size:
+                del self.tail[:-tail_size]
+
+            truncated = self.total - len(self.head) - len(self.tail)
+            data += self.tail
+
+        if capture.decode:
+            # 截断处可能切开多字节字符
+            return str(data, encoding, 'replace' if truncated else 'strict'), truncated
+
+        return bytes(data), truncated
+
+
+def _communicate_capture(p: subprocess.Popen,
+                         capture: CmdCapture,
+                         timeout: Optional[float] = None) -> tuple[_OutputBuffer, _OutputBuffer, bool]:
+    """
+    使用 selectors 同时读取标准输出和标准错误，直到两个管道都读到 EOF。
+    超时后结束子进程所在的进程组，继续读取剩余输出。
+    :return: 标准输出缓冲区、标准错误缓冲区、是否超时
+    """
+    buffers = {STDOUT: _OutputBuffer(capture), STDERR: _OutputBuffer(capture)}
+    deadline = None if timeout is None else time.monotonic() + timeout
+    timed_out = False
+
+    with selectors.DefaultSelector() as sel:
+        sel.register(p.stdout, selectors.EVENT_READ, STDOUT)
+        sel.register(p.stderr, selectors.EVENT_READ, STDERR)
+
+        while sel.get_map():
+            if timed_out:
+                # 进程组已结束，仍未关闭管道的只可能是脱离进程组的后台进程，不再等待
+                remaining = KILL_GRACE_PERIOD
+            else:
+                remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+
+            events = sel.select(remaining)
+
+            if not events and remaining is not None:
+                if timed_out:
+                    break
+
+                timed_out = True
+                _kill_process_group(p)
+                continue
+
+            for key, _ in events:
+                data = os.read(key.fd, READ_CHUNK_SIZE)
+
+                if data:
+                    buffers[key.data].write(data)
+                else:
+                    sel.unregister(key.fileobj)
+
+    return buffers[STDOUT], buffers[STDERR], timed_out
+
+
+_DEFAULT_CAPTURE = CmdCapture()
+
+
+def _run_cmd(cmd: CmdLine,
+             encoding: str,
+             remove_white_char: bool,
+             is_raise_exception: bool,
+             capture: Optional[CmdCapture],
+             use_shell: bool,
+             timeout: Optional[float],
+             limits: Optional[CmdLimits]) -> CmdResult:
+    """
+    执行系统命令，超时时不抛出异常，返回 timed_out=True 的结果
+    """
+    args, popen_kwargs = _to_popen_args(cmd, use_shell, limits)
+    telemetry = _telemetry
+    start = time.perf_counter()
+    timed_out = False
+    usage = None
+
+    # subprocess.run 内部回收子进程，收集资源使用情况时不能使用
+    if timeout is None and telemetry is None \
+            and (capture is None or (capture.max_bytes is None and capture.spill_threshold is None)):
+        cp = subprocess.run(args, capture_output=True, check=is_raise_exception, **popen_kwargs)
+        duration = time.perf_counter() - start
+        returncode = cp.returncode
+
+        if capture is None or capture.decode:
+            stdout = str(cp.stdout, encoding)
+            stderr = str(cp.stderr, encoding)
+        else:
+            stdout = cp.stdout
+            stderr = cp.stderr
+
+        stdout_truncated = stderr_truncated = 0
+    else:
+        capture = capture or _DEFAULT_CAPTURE
+
+        # 设置超时时在独立的会话中启动，超时后可以连同 shell 启动的孙进程一起结束
+        with subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                              start_new_session=timeout is not None, **popen_kwargs) as p:
+            try:
+                out_buf, err_buf, timed_out = _communicate_capture(p, capture, timeout)
+            except BaseException:
+                if timeout is None:
+                    p.kill()
+                else:
+                    _kill_process_group(p, 0)
+
+                raise
+
+            if telemetry is None:
+                returncode = p.wait()
+            else:
+                returncode, usage = _wait_with_usage(p)
+
+        stdout, stdout_truncated = out_buf.getvalue(capture, encoding)
+        stderr, stderr_truncated = err_buf.getvalue(capture, encoding)
+
+        duration = time.perf_counter() - start
+
+        if telemetry is not None:
+            telemetry.record(cmd, returncode, duration, usage, timed_out)
+
+        if returncode != 0 and is_raise_exception and not timed_out:
+            raise subprocess.CalledProcessError(returncode, cmd, stdout, stderr)
+
+    if remove_white_char and not isinstance(stdout, SpilledOutput):
+        stdout = stdout.strip()
+
+    return CmdResult(cmd=cmd,
+                     returncode=returncode,
+                     stdout=stdout,
+                     stderr=stderr,
+                     duration=duration,
+                     stdout_truncated=stdout_truncated,
+                     stderr_truncated=stderr_truncated,
+                     timed_out=timed_out,
+                     usage=usage)
+
+
+def _check_timeout(cr: CmdResult, timeout: Optional[float], is_show_error=True) -> None:
+    if cr.timed_out:
+        if is_show_error:
+            hlog.error('Command timed out after %s seconds: %s' % (timeout, cr.cmd))
+
+        raise subprocess.TimeoutExpired(cr.cmd, timeout, cr.stdout, cr.stderr)
+
+
+def run_cmd(cmd: CmdLine,
+            encoding='UTF-8',
+            remove_white_char=False,
+            is_raise_exception=False,
+            capture: Optional[CmdCapture] = None,
+            use_shell=True,
+            timeout: Optional[float] = None,
+            limits: Optional[CmdLimits] = None) -> CmdResult:
+    """
+    执行系统命令，返回包含退出代码、标准输出、标准错误和执行时长的结果对象，不输出错误日志
+    :cmd: 命令行，字符串或参数列表
+    :encoding: 指定返回字符串编码
+    :remove_white_char: 是否移除标准输出最后的空白字符，比如换行符（SpilledOutput 不处理）
+    :is_raise_exception: 执行失败时，抛出异常
+    :capture: 输出捕获方式，None 表示全部读入内存并解码
+    :use_shell: 字符串命令行是否通过 shell 执行，False 时使用 shlex 拆分后直接执行
+    :timeout: 超时时间（秒），超时后结束子进程所在的进程组（SIGTERM，KILL_GRACE_PERIOD 秒后 SIGKILL），
+              抛出 subprocess.TimeoutExpired
+    :limits: 子进程资源限制
+    :return:
+    """
+    cr = _run_cmd(cmd, encoding, remove_white_char, is_raise_exception, capture, use_shell, timeout, limits)
+    _check_timeout(cr, timeout, is_show_error=False)
+
+    return cr
+
+
+# 只需要退出代码时不解码输出，出错时再解码
+_RAW_CAPTURE = CmdCapture(decode=False)
+
+
+def get_exit_code_of_cmd(cmd: CmdLine,
                          encoding='UTF-8',
                          is_show_error=True,
                          is_show_output=False,
-                         is_raise_exception=False) -> int:
+                         is_raise_exception=False,
+                         use_shell=True,
+                         timeout: Optional[float] = None,
+                         limits: Optional[CmdLimits] = None) -> int:
     """
     执行系统命令，屏蔽标准输出，返回命令退出代码
-    :cmd: 命令行
+    :cmd: 命令行，字符串或参数列表
     :encoding: 指定编码
     :is_show_error: 显示错误提示信息
     :is_show_output: 打印命令输出
     :is_raise_exception: 执行失败时，抛出异常
+    :use_shell: 字符串命令行是否通过 shell 执行，False 时使用 shlex 拆分后直接执行
+    :timeout: 超时时间（秒），超时后结束子进程所在的进程组，抛出 subprocess.TimeoutExpired
+    :limits: 子进程资源限制
     :return:
     """
-    func_name = inspect.stack()[0][3]
+    func_name = inspect.currentframe().f_code.co_name
     hlog.enter_func(func_name)
 
     hlog.debug("cmd=%s" % cmd)
@@ -31,11 +635,12 @@ def get_exit_code_of_cmd(cmd: str,
         hlog.critical('"cmd" 参数不能为空')
         return 1
 
-    cp = subprocess.run(cmd, shell=True, capture_output=True, check=is_raise_exception)
+    cp = _run_cmd(cmd, encoding, False, is_raise_exception, _RAW_CAPTURE, use_shell, timeout, limits)
+    _check_timeout(cp, timeout)
     result = cp.returncode
 
-    if result != 0 and is_show_error:
-        hlog.error('error code: %d, error message: %s' % (result, str(cp.stderr, encoding=encoding).strip()))
+    if result != 0 and is_show_error and hlog.is_enabled(HappyLogLevel.ERROR):
+        hlog.logger.error('error code: %d, error message: %s', result, _output_preview(cp.stderr, encoding))
 
     if is_show_output:
         hlog.info('Command output:%s%s' % (os.linesep, str(cp.stdout, encoding=encoding).strip()))
@@ -46,26 +651,33 @@ def get_exit_code_of_cmd(cmd: str,
     return result
 
 
-def get_exit_status_of_cmd(cmd: str,
+def get_exit_status_of_cmd(cmd: CmdLine,
                            encoding='UTF-8',
                            is_show_error=True,
                            is_show_output=False,
-                           is_raise_exception=False) -> bool:
+                           is_raise_exception=False,
+                           use_shell=True,
+                           timeout: Optional[float] = None,
+                           limits: Optional[CmdLimits] = None) -> bool:
     """
     执行系统命令，屏蔽标准输出，根据命令退出代码返回布尔值
-    :cmd: 命令行
+    :cmd: 命令行，字符串或参数列表
     :encoding: 指定编码
     :is_show_error: 显示错误提示信息
     :is_show_output: 打印命令输出
     :is_raise_exception: 执行失败时，抛出异常
+    :use_shell: 字符串命令行是否通过 shell 执行，False 时使用 shlex 拆分后直接执行
+    :timeout: 超时时间（秒），超时后结束子进程所在的进程组，抛出 subprocess.TimeoutExpired
+    :limits: 子进程资源限制
     :return:
     """
-    func_name = inspect.stack()[0][3]
+    func_name = inspect.currentframe().f_code.co_name
     hlog.enter_func(func_name)
 
     hlog.debug("cmd=%s" % cmd)
 
-    result = get_exit_code_of_cmd(cmd, encoding, is_show_error, is_show_output, is_raise_exception) == 0
+    result = get_exit_code_of_cmd(cmd, encoding, is_show_error, is_show_output, is_raise_exception,
+                                  use_shell, timeout, limits) == 0
 
     hlog.debug("Command %s" % ('succeeded' if result else 'failed'))
     hlog.exit_func(func_name)
@@ -73,73 +685,347 @@ def get_exit_status_of_cmd(cmd: str,
     return result
 
 
-def get_output_of_cmd(cmd: str, encoding='UTF-8', remove_white_char=False, is_raise_exception=False) -> str:
+def get_output_of_cmd(cmd: CmdLine,
+                      encoding='UTF-8',
+                      remove_white_char=False,
+                      is_raise_exception=False,
+                      capture: Optional[CmdCapture] = None,
+                      use_shell=True,
+                      timeout: Optional[float] = None,
+                      limits: Optional[CmdLimits] = None) -> CmdOutput:
     """
     执行系统命令，返回命令执行结果字符串
-    :cmd: 命令行
+    :cmd: 命令行，字符串或参数列表
     :encoding: 指定返回字符串编码
     :remove_white_char: 是否移除返回字符串最后的空白字符，比如换行符
     :is_raise_exception: 执行失败时，抛出异常
+    :capture: 输出捕获方式，可以限制大小、写入临时文件或返回 bytes
+    :use_shell: 字符串命令行是否通过 shell 执行，False 时使用 shlex 拆分后直接执行
+    :timeout: 超时时间（秒），超时后结束子进程所在的进程组，抛出 subprocess.TimeoutExpired
+    :limits: 子进程资源限制
     :return:
     """
-    func_name = inspect.stack()[0][3]
+    func_name = inspect.currentframe().f_code.co_name
     hlog.enter_func(func_name)
 
     hlog.debug("cmd=%s" % cmd)
 
-    cp = subprocess.run(cmd, shell=True, capture_output=True, check=is_raise_exception)
-    result = str(cp.stdout, encoding)
-
-    if remove_white_char:
-        result = result.strip()
+    cr = _run_cmd(cmd, encoding, remove_white_char, is_raise_exception, capture, use_shell, timeout, limits)
+    _check_timeout(cr, timeout)
+    result = cr.stdout
 
-    if cp.returncode != 0:
-        hlog.error('error code: %d, error message: %s' % (cp.returncode, str(cp.stderr, encoding=encoding)))
-        hlog.error(result)
+    # 输出可能很大或已写入临时文件，日志中只保留开头和结尾
+    if cr.returncode != 0 and hlog.is_enabled(HappyLogLevel.ERROR):
+        hlog.logger.error('error code: %d, error message: %s', cr.returncode, _output_preview(cr.stderr, encoding))
+        hlog.logger.error('%s', _output_preview(result, encoding))
 
-    hlog.debug("result=%s" % result)
+    # 输出可能很大，只在 DEBUG 级别启用时格式化
+    if hlog.is_enabled(HappyLogLevel.DEBUG):
+        hlog.debug("result=%s" % result)
     hlog.exit_func(func_name)
 
     return result
 
 
-def execute_cmd(cmd: str, encoding='UTF-8', remove_white_char=False, is_raise_exception=False) -> (int, str):
+def execute_cmd(cmd: CmdLine,
+                encoding='UTF-8',
+                remove_white_char=False,
+                is_raise_exception=False,
+                capture: Optional[CmdCapture] = None,
+                use_shell=True,
+                timeout: Optional[float] = None,
+                limits: Optional[CmdLimits] = None) -> (int, CmdOutput):
     """
     执行系统命令，返回 命令执行结果字符串和返回代码
-    :cmd: 命令行
+    :cmd: 命令行，字符串或参数列表
     :encoding: 指定返回字符串编码
     :remove_white_char: 是否移除返回字符串最后的空白字符，比如换行符
     :is_raise_exception: 执行失败时，抛出异常
+    :capture: 输出捕获方式，可以限制大小、写入临时文件或返回 bytes
+    :use_shell: 字符串命令行是否通过 shell 执行，False 时使用 shlex 拆分后直接执行
+    :timeout: 超时时间（秒），超时后结束子进程所在的进程组，抛出 subprocess.TimeoutExpired
+    :limits: 子进程资源限制
     :return:
     """
-    func_name = inspect.stack()[0][3]
+    func_name = inspect.currentframe().f_code.co_name
     hlog.enter_func(func_name)
 
     hlog.debug("cmd=%s" % cmd)
 
-    cp = subprocess.run(cmd, shell=True, capture_output=True, check=is_raise_exception)
-    result = str(cp.stdout, encoding)
+    cr = _run_cmd(cmd, encoding, remove_white_char, is_raise_exception, capture, use_shell, timeout, limits)
+    _check_timeout(cr, timeout)
+    result = cr.stdout
+
+    # 输出可能很大或已写入临时文件，日志中只保留开头和结尾
+    if cr.returncode != 0 and hlog.is_enabled(HappyLogLevel.ERROR):
+        hlog.logger.error('error code: %d, error message: %s', cr.returncode, _output_preview(cr.stderr, encoding))
+        hlog.logger.error('%s', _output_preview(result, encoding))
+
+    # 输出可能很大，只在 DEBUG 级别启用时格式化
+    if hlog.is_enabled(HappyLogLevel.DEBUG):
+        hlog.debug("result=%s" % result)
+    hlog.exit_func(func_name)
+
+    return cr.returncode, result
+
+
+def execute_cmd_batch(cmds: Iterable[CmdLine],
+                      workers: Optional[int] = None,
+                      fail_fast=False,
+                      ordered=True,
+                      encoding='UTF-8',
+                      remove_white_char=False,
+                      is_show_error=True,
+                      capture: Optional[CmdCapture] = None,
+                      use_shell=True,
+                      timeout: Optional[float] = None,
+                      limits: Optional[CmdLimits] = None) -> Iterator[CmdResult]:
+    """
+    使用线程池并发执行多个系统命令，以生成器方式返回执行结果。
+    命令按需从 cmds 中读取，同时提交的命令数量不超过 workers 的两倍，可以处理很长的命令序列。
+    :cmds: 命令行序列
+    :workers: 并发数量，默认为 CPU 核数
+    :fail_fast: 遇到第一个执行失败的命令时，返回该结果后停止，不再执行尚未开始的命令；
+                无法启动的命令（比如找不到可执行文件）直接抛出异常
+    :ordered: True 按提交顺序返回结果，False 按完成顺序返回结果
+    :encoding: 指定返回字符串编码
+    :remove_white_char: 是否移除标准输出最后的空白字符，比如换行符
+    :is_show_error: 显示错误提示信息
+    :capture: 输出捕获方式，可以限制大小、写入临时文件或返回 bytes
+    :use_shell: 字符串命令行是否通过 shell 执行，False 时使用 shlex 拆分后直接执行
+    :timeout: 单个命令的超时时间（秒），超时的命令不抛出异常，返回 CmdResult.timed_out 为 True 的结果
+    :limits: 子进程资源限制
+    :return: CmdResult 生成器，CmdResult.index 为命令的提交序号。fail_fast=False 时无法启动的命令
+             不中断批量执行，返回退出代码为 127（没有执行权限时为 126）、标准错误为异常信息的结果
+    """
+    func_name = inspect.currentframe().f_code.co_name
+    hlog.enter_func(func_name)
+
+    workers = workers or os.cpu_count() or 1
+    max_pending = workers * 2
+    cmd_iter = enumerate(cmds)
+    pending: deque[Future] = deque()
+
+    def _run(index: int, cmd: CmdLine) -> CmdResult:
+        start = time.perf_counter()
+
+        try:
+            cr = _run_cmd(cmd, encoding, remove_white_char, False, capture, use_shell, timeout, limits)
+        except Exception as e:
+            if fail_fast:
+                raise
+
+            # 与 shell 的约定相同：没有执行权限为 126，找不到命令等其他错误为 127
+            returncode = 126 if isinstance(e, PermissionError) else 127
+            empty = '' if capture is None or capture.decode else b''
+            stderr = str(e) if capture is None or capture.decode else str(e).encode(encoding)
+            cr = CmdResult(cmd=cmd,
+                           returncode=returncode,
+                           stdout=empty,
+                           stderr=stderr,
+                           duration=time.perf_counter() - start)
+
+        cr.index = index
+
+        return cr
+
+    def _submit() -> None:
+        while len(pending) < max_pending:
+            try:
+                index, cmd = next(cmd_iter)
+            except StopIteration:
+                return
+
+            pending.append(executor.submit(_run, index, cmd))
+
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='HappyCmdBatch')
+
+    try:
+        _submit()
+
+        while pending:
+            if ordered:
+                cr = pending.popleft().result()
+            else:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                future = done.pop()
+                pending.remove(future)
+                cr = future.result()
+
+            if cr.timed_out and is_show_error:
+                hlog.error('Command timed out after %s seconds: %s' % (timeout, cr.cmd))
+            elif cr.returncode != 0 and is_show_error and hlog.is_enabled(HappyLogLevel.ERROR):
+                hlog.logger.error('error code: %d, cmd: %s, error message: %s',
+                                  cr.returncode, cr.cmd, _output_preview(cr.stderr, encoding))
+
+            yield cr
+
+            if cr.returncode != 0 and fail_fast:
+                break
+
+            _submit()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    hlog.exit_func(func_name)
+
+
+class CmdHandle(Future):
+    """
+    基于 Popen 的非阻塞命令句柄，同时也是 concurrent.futures.Future，结果为 CmdResult。
+    可以直接用于 concurrent.futures.wait()、as_completed() 以及 add_done_callback()。
+    """
+
+    def __init__(self,
+                 cmd: CmdLine,
+                 encoding='UTF-8',
+                 remove_white_char=False,
+                 is_show_error=True,
+                 capture_output=True,
+                 use_shell=True,
+                 timeout: Optional[float] = None,
+                 limits: Optional[CmdLimits] = None):
+        super().__init__()
+        self.cmd = cmd
+        self.timeout = timeout
+        self.encoding = encoding
+        self.remove_white_char = remove_white_char
+        self.is_show_error = is_show_error
+        self._start = time.perf_counter()
+
+        pipe = subprocess.PIPE if capture_output else subprocess.DEVNULL
+        args, popen_kwargs = _to_popen_args(cmd, use_shell, limits)
+        # 在独立的会话中启动，kill()/terminate() 可以连同 shell 启动的子进程一起结束
+        self.process = subprocess.Popen(args, stdout=pipe, stderr=pipe, start_new_session=True, **popen_kwargs)
+        self.set_running_or_notify_cancel()
+
+        # 等待线程只负责读取输出和回收子进程，开销远小于启动新的 Python 解释器
+        self._waiter = Thread(target=self._communicate, daemon=True, name='HappyCmdHandle-%d' % self.process.pid)
+        self._waiter.start()
+
+    def _communicate(self) -> None:
+        try:
+            try:
+                stdout, stderr = self.process.communicate(timeout=self.timeout)
+            except subprocess.TimeoutExpired:
+                _kill_process_group(self.process)
+                stdout, stderr = self.process.communicate()
+
+                if self.is_show_error:
+                    hlog.error('Command timed out after %s seconds: %s' % (self.timeout, self.cmd))
+
+                self.set_exception(subprocess.TimeoutExpired(self.cmd, self.timeout, stdout, stderr))
+                return
+
+            stdout = str(stdout, self.encoding) if stdout else ''
+
+            if self.remove_white_char:
+                stdout = stdout.strip()
 
-    if remove_white_char:
-        result = result.strip()
+            cr = CmdResult(cmd=self.cmd,
+                           returncode=self.process.returncode,
+                           stdout=stdout,
+                           stderr=str(stderr, self.encoding) if stderr else '',
+                           duration=time.perf_counter() - self._start)
 
-    if cp.returncode != 0:
-        hlog.error('error code: %d, error message: %s' % (cp.returncode, str(cp.stderr, encoding=encoding)))
-        hlog.error(result)
+            if cr.returncode != 0 and self.is_show_error:
+                hlog.error('error code: %d, error message: %s' % (cr.returncode, cr.stderr.strip()))
+
+            self.set_result(cr)
+        except BaseException as e:
+            self.set_exception(e)
+
+    @property
+    def pid(self) -> int:
+        return self.process.pid
+
+    @property
+    def returncode(self) -> Optional[int]:
+        return self.process.returncode
+
+    def poll(self) -> Optional[int]:
+        """
+        检查命令是否结束
+        :return: 命令退出代码，未结束时返回 None
+        """
+        return self.process.poll()
+
+    def wait(self, timeout: Optional[float] = None) -> int:
+        """
+        等待命令结束并读取完所有输出
+        :param timeout: 超时时间（秒），超时抛出 subprocess.TimeoutExpired
+        :return: 命令退出代码
+        """
+        try:
+            return self.result(timeout).returncode
+        except FutureTimeoutError:
+            raise subprocess.TimeoutExpired(self.cmd, timeout)
+
+    def _signal_group(self, sig: int) -> None:
+        if self.process.poll() is None:
+            try:
+                os.killpg(self.process.pid, sig)
+            except ProcessLookupError:
+                pass
+
+    def terminate(self) -> None:
+        self._signal_group(signal.SIGTERM)
+
+    def kill(self) -> None:
+        self._signal_group(signal.SIGKILL)
+
+    def stop(self, grace: float = KILL_GRACE_PERIOD) -> int:
+        """
+        结束命令所在的进程组：先发送 SIGTERM，grace 秒后仍未全部退出时发送 SIGKILL
+        :param grace: 等待进程组退出的时长（秒）
+        :return: 命令退出代码
+        """
+        if self.process.poll() is None:
+            _kill_process_group(self.process, grace)
+
+        return self.wait()
+
+
+def start_cmd(cmd: CmdLine,
+              encoding='UTF-8',
+              remove_white_char=False,
+              is_show_error=True,
+              capture_output=True,
+              use_shell=True,
+              timeout: Optional[float] = None,
+              limits: Optional[CmdLimits] = None) -> CmdHandle:
+    """
+    非阻塞执行系统命令，立即返回命令句柄
+    :cmd: 命令行，字符串或参数列表
+    :encoding: 指定返回字符串编码
+    :remove_white_char: 是否移除标准输出最后的空白字符，比如换行符
+    :is_show_error: 命令执行失败时显示错误提示信息
+    :capture_output: 是否捕获标准输出和标准错误，否则丢弃
+    :use_shell: 字符串命令行是否通过 shell 执行，False 时使用 shlex 拆分后直接执行
+    :timeout: 超时时间（秒），超时后结束子进程所在的进程组，result() 抛出 subprocess.TimeoutExpired
+    :limits: 子进程资源限制
+    :return: CmdHandle，可通过 poll()、wait()、stop()、result() 获取状态和结果
+    """
+    func_name = inspect.currentframe().f_code.co_name
+    hlog.enter_func(func_name)
+
+    hlog.trace("cmd=%s" % cmd)
+
+    handle = CmdHandle(cmd, encoding, remove_white_char, is_show_error, capture_output, use_shell, timeout, limits)
 
-    hlog.debug("result=%s" % result)
     hlog.exit_func(func_name)
 
-    return cp.returncode, result
+    return handle
 
 
 def non_blocking_exe_cmd(cmd: str) -> Process:
     """
-    使用非阻塞的子进程执行命令
+    使用非阻塞的子进程执行命令。
+    该函数会启动新的 Python 解释器，开销较大，建议使用 start_cmd()
     :cmd: 命令行
     :return: 子进程对象，父进程可以通过join()等待其结束
     """
-    func_name = inspect.stack()[0][3]
+    func_name = inspect.currentframe().f_code.co_name
     hlog.enter_func(func_name)
 
     hlog.trace("cmd=%s" % cmd)
@@ -154,35 +1040,820 @@ def non_blocking_exe_cmd(cmd: str) -> Process:
     return child_process
 
 
-def exe_cmd_and_poll_output(cmd, encoding='UTF-8', is_capture_output=False):
+class CmdOutputStream:
+    """
+    基于 selectors 的命令输出流，迭代产生 (流名称, 行或数据块) 事件，流名称为 STDOUT 或 STDERR。
+
+    - 标准输出和标准错误分别读取（merge_stderr=True 时合并到标准输出）
+    - 使用 codecs 增量解码器解码，多字节字符跨数据块时不会出错
+    - 支持每行回调和有界的环形缓冲区（只保留最后 capture_lines 行）
+    - 两个管道都读到 EOF 后才回收子进程，保证不丢失命令结束前写入的输出
+    - 迭代提前终止时杀死子进程
+    """
+
+    def __init__(self,
+                 cmd: CmdLine,
+                 encoding='UTF-8',
+                 lines=True,
+                 merge_stderr=False,
+                 on_stdout: Optional[Callable[[str], None]] = None,
+                 on_stderr: Optional[Callable[[str], None]] = None,
+                 capture_lines=0,
+                 chunk_size=READ_CHUNK_SIZE,
+                 use_shell=False,
+                 timeout: Optional[float] = None,
+                 limits: Optional[CmdLimits] = None):
+        """
+        :param cmd: 命令行，字符串或参数列表
+        :param encoding: 字符编码，无法解码的字节替换为 U+FFFD
+        :param lines: True 按行产生事件（保留换行符），False 按读取到的数据块产生事件
+        :param merge_stderr: 是否将标准错误合并到标准输出
+        :param on_stdout: 标准输出每行（或数据块）的回调函数
+        :param on_stderr: 标准错误每行（或数据块）的回调函数
+        :param capture_lines: 环形缓冲区保留的最大行数（或数据块数），0 表示不保留
+        :param chunk_size: 每次从管道读取的最大字节数
+        :param use_shell: 字符串命令行是否通过 shell 执行，默认使用 shlex 拆分后直接执行
+        :param timeout: 超时时间（秒），超时后结束子进程所在的进程组，迭代抛出 subprocess.TimeoutExpired
+        :param limits: 子进程资源限制
+        """
+        self.cmd = cmd
+        self.use_shell = use_shell
+        self.timeout = timeout
+        self.limits = limits
+        self.encoding = encoding
+        self.lines = lines
+        self.merge_stderr = merge_stderr
+        self.callbacks = {STDOUT: on_stdout, STDERR: on_stderr}
+        self.chunk_size = chunk_size
+        self.stdout_tail: deque[str] = deque(maxlen=capture_lines)
+        self.stderr_tail: deque[str] = deque(maxlen=capture_lines)
+        self.returncode: Optional[int] = None
+
+    def _emit(self, name: str, text: str) -> tuple[str, str]:
+        callback = self.callbacks[name]
+
+        if callback:
+            callback(text)
+
+        if self.stdout_tail.maxlen:
+            (self.stdout_tail if name == STDOUT else self.stderr_tail).append(text)
+
+        return name, text
+
+    def __iter__(self) -> Iterator[tuple[str, str]]:
+        args, popen_kwargs = _to_popen_args(self.cmd, self.use_shell, self.limits)
+        new_session = self.timeout is not None
+        p = subprocess.Popen(args,
+                             stdout=subprocess.PIPE,
+                             stderr=subprocess.STDOUT if self.merge_stderr else subprocess.PIPE,
+                             start_new_session=new_session,
+                             **popen_kwargs)
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        sel = selectors.DefaultSelector()
+        decoders = {}
+        pending = {}
+
+        for name, pipe in ((STDOUT, p.stdout), (STDERR, p.stderr)):
+            if pipe is not None:
+                sel.register(pipe, selectors.EVENT_READ, name)
+                decoders[name] = codecs.getincrementaldecoder(self.encoding)(errors='replace')
+                pending[name] = ''
+
+        try:
+            while sel.get_map():
+                remaining = None if deadline is None else deadline - time.monotonic()
+
+                if remaining is not None and remaining <= 0:
+                    hlog.error('Command timed out after %s seconds: %s' % (self.timeout, self.cmd))
+                    raise subprocess.TimeoutExpired(self.cmd, self.timeout)
+
+                for key, _ in sel.select(remaining):
+                    name = key.data
+                    data = os.read(key.fd, self.chunk_size)
+                    is_eof = not data
+
+                    if is_eof:
+                        sel.unregister(key.fileobj)
+
+                    text = decoders[name].decode(data, final=is_eof)
+
+                    if not self.lines:
+                        if text:
+                            yield self._emit(name, text)
+
+                        continue
+
+                    text = pending[name] + text
+
+                    # 最后一段没有换行符时，等待后续数据
+                    i = len(text) if is_eof else text.rfind('\n') + 1
+                    pending[name] = text[i:]
+                    parts = text[:i].split('\n')
+
+                    for line in parts[:-1]:
+                        yield self._emit(name, line + '\n')
+
+                    if parts[-1]:
+                        yield self._emit(name, parts[-1])
+
+            self.returncode = p.wait()
+        finally:
+            sel.close()
+
+            if new_session:
+                # 回收子进程后，shell 启动的孙进程也可能仍在运行
+                _kill_process_group(p, 0)
+            elif p.poll() is None:
+                p.kill()
+                p.wait()
+
+            for pipe in (p.stdout, p.stderr):
+                if pipe is not None:
+                    pipe.close()
+
+    def run(self) -> int:
+        """
+        读取全部输出（只触发回调和环形缓冲区），返回命令退出代码
+        :return:
+        """
+        for _ in self:
+            pass
+
+        return self.returncode
+
+
+def iter_cmd_output(cmd: CmdLine, **kwargs) -> CmdOutputStream:
+    """
+    流式读取命令输出，参数见 CmdOutputStream
+    :param cmd: 命令行，字符串或参数列表
+    :return: 可迭代的 CmdOutputStream，迭代结束后 returncode 为命令退出代码
+    """
+    return CmdOutputStream(cmd, **kwargs)
+
+
+def exe_cmd_and_poll_output(cmd,
+                            encoding='UTF-8',
+                            is_capture_output=False,
+                            timeout: Optional[float] = None,
+                            limits: Optional[CmdLimits] = None):
     """
     将命令输出实时打印到标准输出
     :param is_capture_output:
-    :param cmd: 命令行
+    :param cmd: 命令行，字符串（使用 shlex 拆分后直接执行）或参数列表
     :param encoding: 字符编码
+    :param timeout: 超时时间（秒），超时后结束子进程所在的进程组，抛出 subprocess.TimeoutExpired
+    :param limits: 子进程资源限制
     :return: 标准输出字符串列表
     """
-    import shlex
-
-    func_name = inspect.stack()[0][3]
+    func_name = inspect.currentframe().f_code.co_name
     hlog.enter_func(func_name)
 
     hlog.trace("cmd=%s" % cmd)
 
     output = list()
-    cmd = shlex.split(cmd)
+    stream = CmdOutputStream(cmd, encoding=encoding, merge_stderr=True, timeout=timeout, limits=limits)
 
-    with subprocess.Popen(cmd, shell=False, stdout=subprocess.PIPE, stderr=subprocess.STDOUT) as p:
-        while p.poll() is None:
-            line = p.stdout.readline()
-            line = str(line, encoding=encoding)
-            print(line, end='')
+    for _, line in stream:
+        print(line, end='')
 
-            if is_capture_output:
-                output.append(line)
+        if is_capture_output:
+            output.append(line)
 
-    if p.returncode != 0:
+    if stream.returncode != 0:
         hlog.error('Command execution failed')
 
     hlog.exit_func(func_name)
     return output
+
+
+# 管道缓冲区大小，Python 过滤阶段每次读写的最大字节数
+PIPE_BUFFER_SIZE = 1 << 20
+
+
+def _set_pipe_size(fd: int) -> None:
+    # 增大管道缓冲区（仅 Linux），减少进程切换次数
+    try:
+        fcntl.fcntl(fd, fcntl.F_SETPIPE_SZ, PIPE_BUFFER_SIZE)
+    except (AttributeError, OSError):
+        pass
+
+
+def _write_all(fd: int, data: bytes) -> None:
+    view = memoryview(data)
+
+    while view:
+        view = view[os.write(fd, view):]
+
+
+def _copy_fd(in_fd: int, out_fd: int, on_progress: Optional[Callable[[int], None]] = None) -> int:
+    """
+    在内核中复制数据直到 EOF：至少一端是管道时使用 os.splice，输入为普通文件时使用 os.sendfile，
+    都不可用时回退到大缓冲区的 read/write
+    :return: 复制的字节数
+    """
+    total = 0
+
+    for func in (getattr(os, 'splice', None), os.sendfile):
+        if func is None:
+            continue
+
+        try:
+            while True:
+                if func is os.sendfile:
+                    n = os.sendfile(out_fd, in_fd, None, PIPE_BUFFER_SIZE)
+                else:
+                    n = func(in_fd, out_fd, PIPE_BUFFER_SIZE)
+
+                if not n:
+                    return total
+
+                total += n
+
+                if on_progress:
+                    on_progress(total)
+        except OSError as e:
+            # 文件描述符类型不支持，已经复制部分数据时不能换用其他方式
+            if total or e.errno not in (errno.EINVAL, errno.ENOSYS, errno.EBADF):
+                raise
+
+    while True:
+        data = os.read(in_fd, PIPE_BUFFER_SIZE)
+
+        if not data:
+            return total
+
+        _write_all(out_fd, data)
+        total += len(data)
+
+        if on_progress:
+            on_progress(total)
+
+
+@dataclass
+class CmdPipelineResult:
+    """
+    管道执行结果，各列表按阶段顺序排列
+    """
+    # 各阶段的描述
+    stages: list[str]
+    # 各阶段的退出代码。Python 阶段正常结束为 0，抛出异常为 1，下游提前关闭管道为 -SIGPIPE
+    returncodes: list[int]
+    # 最后一个阶段的标准输出，指定 stdout 时为空
+    stdout: Union[str, bytes]
+    # 各命令阶段的标准错误，Python 阶段为空
+    stderr: list[Union[str, bytes]]
+    # 各 Python 阶段抛出的异常
+    errors: list[Optional[BaseException]]
+    # 执行时长，单位秒
+    duration: float
+
+    @property
+    def returncode(self) -> int:
+        """
+        与 shell 相同，管道的退出代码为最后一个阶段的退出代码
+        """
+        return self.returncodes[-1]
+
+    @property
+    def pipefail_returncode(self) -> int:
+        """
+        与 shell 的 pipefail 选项相同，最后一个非 0 的退出代码，全部成功时为 0
+        """
+        for code in reversed(self.returncodes):
+            if code != 0:
+                return code
+
+        return 0
+
+
+class _CmdStage:
+    def __init__(self, cmd: CmdLine, use_shell: bool, limits: Optional[CmdLimits]):
+        self.cmd = cmd
+        self.use_shell = use_shell
+        self.limits = limits
+
+    def __str__(self) -> str:
+        return self.cmd if isinstance(self.cmd, str) else shlex.join(self.cmd)
+
+
+class _PyStage:
+    def __init__(self,
+                 name: str,
+                 func: Optional[Callable[[bytes], bytes]] = None,
+                 on_progress: Optional[Callable[[int], None]] = None):
+        self.name = name
+        self.func = func
+        self.on_progress = on_progress
+        self.returncode = 0
+        self.error: Optional[BaseException] = None
+
+    def __str__(self) -> str:
+        return '<%s>' % self.name
+
+    def run(self, in_fd: int, out_fd: int) -> None:
+        try:
+            if self.func is None:
+                _copy_fd(in_fd, out_fd, self.on_progress)
+            else:
+                while True:
+                    data = os.read(in_fd, PIPE_BUFFER_SIZE)
+                    result = self.func(data)
+
+                    if result:
+                        _write_all(out_fd, result)
+
+                    if not data:
+                        break
+        except BrokenPipeError:
+            self.returncode = -signal.SIGPIPE
+        except BaseException as e:
+            self.returncode = 1
+            self.error = e
+            hlog.error('Pipeline stage %s failed: %r' % (self, e))
+        finally:
+            # 关闭输入使上游收到 SIGPIPE，关闭输出使下游读到 EOF
+            os.close(in_fd)
+            os.close(out_fd)
+
+
+class CmdPipeline:
+    """
+    不经过 shell 的命令管道，相当于 a | b | c。
+
+    - 相邻的命令阶段直接通过操作系统管道连接，数据不经过 Python
+    - filter() 插入 Python 过滤阶段，在线程中按数据块转换数据
+    - progress() 插入 Python 透传阶段，使用 os.splice/os.sendfile 在内核中复制数据并统计字节数
+    - 返回各阶段的退出代码和标准错误
+
+    >>> result = CmdPipeline().pipe('seq 1 100').filter(lambda b: b.replace(b'1', b'x')).pipe('grep x').run()
+    >>> result.returncodes, result.stdout
+    """
+
+    def __init__(self):
+        self._stages: list[Union[_CmdStage, _PyStage]] = []
+
+    def __str__(self) -> str:
+        return ' | '.join(str(stage) for stage in self._stages)
+
+    def pipe(self, cmd: CmdLine, use_shell=False, limits: Optional[CmdLimits] = None) -> 'CmdPipeline':
+        """
+        添加命令阶段
+        :param cmd: 命令行，字符串或参数列表
+        :param use_shell: 字符串命令行是否通过 shell 执行，默认使用 shlex 拆分后直接执行
+        :param limits: 子进程资源限制
+        :return: self，支持链式调用
+        """
+        self._stages.append(_CmdStage(cmd, use_shell, limits))
+        return self
+
+    def filter(self, func: Callable[[bytes], bytes], name: Optional[str] = None) -> 'CmdPipeline':
+        """
+        添加 Python 过滤阶段。func 对每个数据块返回转换后的数据，数据块不保证按行切分；
+        输入结束时以 b'' 调用一次，可以返回缓存的剩余数据
+        :param func: 过滤函数
+        :param name: 阶段名称，默认为函数名
+        :return: self，支持链式调用
+        """
+        self._stages.append(_PyStage(name or getattr(func, '__name__', 'filter'), func=func))
+        return self
+
+    def progress(self, on_progress: Callable[[int], None], name='progress') -> 'CmdPipeline':
+        """
+        添加 Python 透传阶段，数据在内核中复制，每复制一个数据块以累计字节数调用 on_progress
+        :param on_progress: 进度回调函数
+        :param name: 阶段名称
+        :return: self，支持链式调用
+        """
+        self._stages.append(_PyStage(name, on_progress=on_progress))
+        return self
+
+    def run(self,
+            input: Union[None, bytes, str, BinaryIO] = None,
+            stdout: Optional[BinaryIO] = None,
+            encoding: Optional[str] = 'UTF-8',
+            capture_stderr=True,
+            timeout: Optional[float] = None) -> CmdPipelineResult:
+        """
+        执行管道，等待所有阶段结束
+        :param input: 第一个阶段的输入：None 表示空输入，bytes/str 由后台线程写入，文件对象直接作为输入
+        :param stdout: 最后一个阶段的输出文件对象，None 表示捕获到 CmdPipelineResult.stdout
+        :param encoding: 输出的字符编码，None 表示返回 bytes
+        :param capture_stderr: 是否捕获各命令阶段的标准错误，否则继承当前进程的标准错误
+        :param timeout: 超时时间（秒），超时后结束所有命令阶段所在的进程组，抛出 subprocess.TimeoutExpired
+        :return:
+        """
+        func_name = inspect.currentframe().f_code.co_name
+        hlog.enter_func(func_name)
+
+        hlog.debug("pipeline=%s" % self)
+
+        if not self._stages:
+            raise ValueError('管道至少需要一个阶段')
+
+        for stage in self._stages:
+            if isinstance(stage, _PyStage):
+                stage.returncode = 0
+                stage.error = None
+
+        start = time.perf_counter()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        procs: dict[int, subprocess.Popen] = {}
+        threads: list[Thread] = []
+        # 当前进程持有、启动子进程后需要关闭的文件描述符
+        owned: set[int] = set()
+        # 交给线程关闭的文件描述符，线程启动前失败时由当前进程关闭
+        handed: list[int] = []
+
+        def _pipe() -> tuple[int, int]:
+            r, w = os.pipe()
+            _set_pipe_size(w)
+            owned.update((r, w))
+            return r, w
+
+        if input is None:
+            in_fd = os.open(os.devnull, os.O_RDONLY)
+            owned.add(in_fd)
+        elif isinstance(input, (bytes, str)):
+            data = input.encode(encoding or 'UTF-8') if isinstance(input, str) else input
+            in_fd, w = _pipe()
+            owned.discard(w)
+            handed.append(w)
+            threads.append(Thread(target=self._feed, args=(w, data), daemon=True, name='HappyCmdPipelineInput'))
+        else:
+            in_fd = input.fileno()
+
+        if stdout is None:
+            out_r, final_fd = _pipe()
+        else:
+            out_r, final_fd = None, stdout.fileno()
+
+        is_spawned = False
+
+        try:
+            for i, stage in enumerate(self._stages):
+                if i == len(self._stages) - 1:
+                    out_fd, next_in = final_fd, None
+                else:
+                    next_in, out_fd = _pipe()
+
+                if isinstance(stage, _PyStage):
+                    # 线程关闭输入、输出，当前进程中的副本由线程负责
+                    in_fd = in_fd if in_fd in owned else os.dup(in_fd)
+                    out_fd = out_fd if out_fd in owned else os.dup(out_fd)
+                    owned.discard(in_fd)
+                    owned.discard(out_fd)
+                    handed.extend((in_fd, out_fd))
+                    threads.append(Thread(target=stage.run, args=(in_fd, out_fd), daemon=True,
+                                          name='HappyCmdPipeline-%s' % stage.name))
+                else:
+                    args, popen_kwargs = _to_popen_args(stage.cmd, stage.use_shell, stage.limits)
+                    procs[i] = subprocess.Popen(args,
+                                                stdin=in_fd,
+                                                stdout=out_fd,
+                                                stderr=subprocess.PIPE if capture_stderr else None,
+                                                start_new_session=True,
+                                                **popen_kwargs)
+
+                    for fd in (in_fd, out_fd):
+                        if fd in owned:
+                            os.close(fd)
+                            owned.discard(fd)
+
+                in_fd = next_in
+
+            is_spawned = True
+        finally:
+            if not is_spawned:
+                # 启动某个阶段失败（比如找不到可执行文件）时结束已启动的阶段，关闭所有管道
+                for p in procs.values():
+                    _kill_process_group(p, 0)
+
+                    if p.stderr is not None:
+                        p.stderr.close()
+
+                for fd in owned | set(handed):
+                    os.close(fd)
+
+        for t in threads:
+            t.start()
+
+        streams = {}
+
+        if out_r is not None:
+            streams[out_r] = (STDOUT, bytearray())
+
+        for i, p in procs.items():
+            if p.stderr is not None:
+                streams[p.stderr.fileno()] = (i, bytearray())
+
+        timed_out = self._communicate(streams, procs, deadline)
+
+        for t in threads:
+            t.join()
+
+        if out_r is not None:
+            os.close(out_r)
+
+        for p in procs.values():
+            if p.stderr is not None:
+                p.stderr.close()
+
+        duration = time.perf_counter() - start
+        output = bytes(streams[out_r][1]) if out_r is not None else b''
+        stderr = {key: bytes(buf) for key, buf in streams.values()}
+
+        def _decode(b: bytes) -> Union[str, bytes]:
+            return b if encoding is None else str(b, encoding, 'replace')
+
+        result = CmdPipelineResult(
+            stages=[str(stage) for stage in self._stages],
+            returncodes=[procs[i].returncode if i in procs else stage.returncode
+                         for i, stage in enumerate(self._stages)],
+            stdout=_decode(output),
+            stderr=[_decode(stderr.get(i, b'')) for i in range(len(self._stages))],
+            errors=[None if i in procs else stage.error for i, stage in enumerate(self._stages)],
+            duration=duration)
+
+        if timed_out:
+            hlog.error('Command timed out after %s seconds: %s' % (timeout, self))
+            raise subprocess.TimeoutExpired(str(self), timeout, result.stdout, result.stderr)
+
+        hlog.debug("returncodes=%s" % result.returncodes)
+        hlog.exit_func(func_name)
+
+        return result
+
+    @staticmethod
+    def _feed(fd: int, data: bytes) -> None:
+        try:
+            _write_all(fd, data)
+        except BrokenPipeError:
+            pass
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def _communicate(streams: dict, procs: dict[int, subprocess.Popen], deadline: Optional[float]) -> bool:
+        """
+        读取最后一个阶段的标准输出和各命令阶段的标准错误，等待命令阶段结束
+        :return: 是否超时
+        """
+        timed_out = False
+
+        def _remaining() -> Optional[float]:
+            return None if deadline is None or timed_out else max(0.0, deadline - time.monotonic())
+
+        def _kill_all() -> None:
+            for p in procs.values():
+                _kill_process_group(p, KILL_GRACE_PERIOD)
+
+        with selectors.DefaultSelector() as sel:
+            for fd in streams:
+                sel.register(fd, selectors.EVENT_READ)
+
+            while sel.get_map():
+                remaining = _remaining()
+                events = sel.select(remaining)
+
+                if not events and remaining is not None:
+                    timed_out = True
+                    _kill_all()
+                    continue
+
+                for key, _ in events:
+                    data = os.read(key.fd, READ_CHUNK_SIZE)
+
+                    if data:
+                        streams[key.fd][1].extend(data)
+                    else:
+                        sel.unregister(key.fd)
+
+        for p in procs.values():
+            try:
+                p.wait(_remaining())
+            except subprocess.TimeoutExpired:
+                timed_out = True
+                _kill_all()
+
+        return timed_out
+
+
+# 命令结果缓存默认的有效期（秒）和最大条目数
+CMD_CACHE_TTL = 60.0
+CMD_CACHE_MAXSIZE = 1024
+
+
+def _environ_key() -> tuple[tuple[str, str], ...]:
+    """
+    环境变量的缓存键，环境变量改变后命令的输出可能不同，不能命中旧的结果
+    """
+    return tuple(sorted(os.environ.items()))
+
+
+@dataclass(frozen=True)
+class CmdCacheStats:
+    # 命中缓存的次数
+    hits: int
+    # 未命中、实际执行命令的次数
+    misses: int
+    # 等待相同命令正在进行的执行、共享其结果的次数
+    coalesced: int
+    # 因超出最大条目数被淘汰的条目数量
+    evictions: int
+    # 当前缓存的条目数量
+    size: int
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses + self.coalesced
+        return (self.hits + self.coalesced) / total if total else 0.0
+
+
+class CmdCache:
+    """
+    幂等命令（比如 uname -r、nproc、hostname、git rev-parse HEAD）的执行结果缓存。
+
+    - 键为 (命令行, 执行方式, 编码, 环境变量, 工作目录)，环境变量或工作目录变化时重新执行
+    - 条目在 ttl 秒后过期，超出 maxsize 时淘汰最久未使用的条目
+    - 相同的键同时被多个线程请求时只执行一次命令，其他线程等待并共享结果
+    - 默认只缓存退出代码为 0 的结果
+    - 线程安全
+
+    >>> cache = CmdCache(ttl=30)
+    >>> kernel = cache.get_output_of_cmd('uname -r', remove_white_char=True)
+    """
+
+    def __init__(self, ttl: float = CMD_CACHE_TTL, maxsize: int = CMD_CACHE_MAXSIZE, cache_failures=False):
+        """
+        :param ttl: 有效期，单位秒
+        :param maxsize: 最大条目数
+        :param cache_failures: 是否缓存退出代码不为 0 的结果
+        """
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.cache_failures = cache_failures
+        self._lock = Lock()
+        # 键 -> (过期时间, CmdResult)，按最近使用顺序排列
+        self._entries: OrderedDict[tuple, tuple[float, CmdResult]] = OrderedDict()
+        # 正在执行的命令，invalidate() 时移除，之前开始的执行结果不再写入缓存
+        self._inflight: dict[tuple, Future] = {}
+        self._hits = 0
+        self._misses = 0
+        self._coalesced = 0
+        self._evictions = 0
+
+    @staticmethod
+    def _make_key(cmd: CmdLine, use_shell: bool, encoding: str) -> tuple:
+        return cmd if isinstance(cmd, str) else tuple(cmd), use_shell, encoding, _environ_key(), os.getcwd()
+
+    def run_cmd(self,
+                cmd: CmdLine,
+                encoding='UTF-8',
+                remove_white_char=False,
+                is_raise_exception=False,
+                use_shell=True,
+                timeout: Optional[float] = None) -> CmdResult:
+        """
+        执行命令或返回缓存的结果，参数同 happy_python.cmd.run_cmd。
+        返回的 CmdResult 可能被多个调用者共享，不要修改
+        :return:
+        """
+        key = self._make_key(cmd, use_shell, encoding)
+
+        with self._lock:
+            item = self._entries.get(key)
+
+            if item is not None:
+                if item[0] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return self._finish(item[1], remove_white_char, is_raise_exception)
+
+                del self._entries[key]
+
+            future = self._inflight.get(key)
+            is_owner = future is None
+
+            if is_owner:
+                future = self._inflight[key] = Future()
+                self._misses += 1
+            else:
+                self._coalesced += 1
+
+        if not is_owner:
+            return self._finish(future.result(), remove_white_char, is_raise_exception)
+
+        try:
+            cr = run_cmd(cmd, encoding, use_shell=use_shell, timeout=timeout)
+        except BaseException as e:
+            with self._lock:
+                if self._inflight.get(key) is future:
+                    del self._inflight[key]
+
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            # 执行期间被 invalidate() 移除时不写入缓存
+            is_current = self._inflight.get(key) is future
+
+            if is_current:
+                del self._inflight[key]
+
+            if is_current and (cr.returncode == 0 or self.cache_failures):
+                self._entries[key] = (time.monotonic() + self.ttl, cr)
+
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+                    self._evictions += 1
+
+        future.set_result(cr)
+
+        return self._finish(cr, remove_white_char, is_raise_exception)
+
+    @staticmethod
+    def _finish(cr: CmdResult, remove_white_char: bool, is_raise_exception: bool) -> CmdResult:
+        if cr.returncode != 0 and is_raise_exception:
+            raise subprocess.CalledProcessError(cr.returncode, cr.cmd, cr.stdout, cr.stderr)
+
+        if remove_white_char:
+            return replace(cr, stdout=cr.stdout.strip())
+
+        return cr
+
+    def execute_cmd(self,
+                    cmd: CmdLine,
+                    encoding='UTF-8',
+                    remove_white_char=False,
+                    is_raise_exception=False,
+                    use_shell=True,
+                    timeout: Optional[float] = None) -> (int, str):
+        """
+        执行命令或返回缓存的结果，参数和返回值同 happy_python.cmd.execute_cmd
+        :return:
+        """
+        func_name = inspect.currentframe().f_code.co_name
+        hlog.enter_func(func_name)
+
+        hlog.debug("cmd=%s" % cmd)
+
+        cr = self.run_cmd(cmd, encoding, remove_white_char, is_raise_exception, use_shell, timeout)
+        result = cr.stdout
+
+        if cr.returncode != 0 and hlog.is_enabled(HappyLogLevel.ERROR):
+            hlog.logger.error('error code: %d, error message: %s', cr.returncode, _output_preview(cr.stderr, encoding))
+            hlog.logger.error('%s', _output_preview(result, encoding))
+
+        if hlog.is_enabled(HappyLogLevel.DEBUG):
+            hlog.debug("result=%s" % result)
+        hlog.exit_func(func_name)
+
+        return cr.returncode, result
+
+    def get_output_of_cmd(self,
+                          cmd: CmdLine,
+                          encoding='UTF-8',
+                          remove_white_char=False,
+                          is_raise_exception=False,
+                          use_shell=True,
+                          timeout: Optional[float] = None) -> str:
+        """
+        执行命令或返回缓存的结果，参数和返回值同 happy_python.cmd.get_output_of_cmd
+        :return:
+        """
+        _, result = self.execute_cmd(cmd, encoding, remove_white_char, is_raise_exception, use_shell, timeout)
+
+        return result
+
+    def invalidate(self, cmd: Optional[CmdLine] = None) -> int:
+        """
+        使缓存失效，正在执行的相同命令的结果也不再写入缓存，其他命令不受影响
+        :param cmd: 命令行，None 表示全部
+        :return: 删除的条目数量
+        """
+        with self._lock:
+            if cmd is None:
+                n = len(self._entries)
+                self._entries.clear()
+                self._inflight.clear()
+                return n
+
+            target = cmd if isinstance(cmd, str) else tuple(cmd)
+
+            for key in [key for key in self._inflight if key[0] == target]:
+                del self._inflight[key]
+
+            keys = [key for key in self._entries if key[0] == target]
+
+            for key in keys:
+                del self._entries[key]
+
+            return len(keys)
+
+    def stats(self) -> CmdCacheStats:
+        with self._lock:
+            return CmdCacheStats(hits=self._hits,
+                                 misses=self._misses,
+                                 coalesced=self._coalesced,
+                                 evictions=self._evictions,
+                                 size=len(self._entries))
@@ -0,0 +1,342 @@
+"""
+基于 asyncio 的系统命令执行，与 happy_python.cmd 中的同名函数保持相同的编码、错误日志和异常语义
+
+额外支持：
+    - timeout: 单次调用超时（秒），超时后杀死子进程并抛出 subprocess.TimeoutExpired
+    - 子进程在独立的会话（进程组）中启动，超时或取消时连同 shell 启动的孙进程一起结束：
+      先发送 SIGTERM，KILL_GRACE_PERIOD 秒后仍未全部退出时发送 SIGKILL
+    - limits: 子进程资源限制（CmdLimits）
+    - 取消：调用被取消（asyncio.CancelledError）时杀死子进程
+    - 并发限制：同一事件循环中同时运行的子进程数量不超过 set_cmd_concurrency() 设置的上限，
+      也可以通过 semaphore 参数指定信号量
+"""
+import asyncio
+import inspect
+import os
+import signal
+import subprocess
+import weakref
+from typing import Optional
+
+from happy_python import HappyLog
+from happy_python.cmd import CmdLimits, CmdLine, KILL_GRACE_PERIOD, READ_CHUNK_SIZE, _signal_process_group, \
+    _to_popen_args
+from happy_python.happy_log import HappyLogLevel
+
+hlog = HappyLog()
+
+# 每个事件循环默认的最大并发子进程数量
+CMD_CONCURRENCY = 64
+
+_loop_semaphores: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+def set_cmd_concurrency(n: int) -> None:
+    """
+    设置每个事件循环默认的最大并发子进程数量，只对之后首次使用的事件循环生效
+    :param n:
+    :return:
+    """
+    global CMD_CONCURRENCY
+
+    if n <= 0:
+        raise ValueError('并发数量必须大于0：%d' % n)
+
+    CMD_CONCURRENCY = n
+    _loop_semaphores.clear()
+
+
+def _get_semaphore(semaphore: Optional[asyncio.Semaphore]) -> asyncio.Semaphore:
+    if semaphore is not None:
+        return semaphore
+
+    loop = asyncio.get_running_loop()
+    sem = _loop_semaphores.get(loop)
+
+    if sem is None:
+        sem = _loop_semaphores[loop] = asyncio.Semaphore(CMD_CONCURRENCY)
+
+    return sem
+
+
+async def _kill(proc: asyncio.subprocess.Process, grace: float = KILL_GRACE_PERIOD) -> None:
+    # 子进程在独立的会话中启动，结束整个进程组，避免 shell 的子进程继续占用输出管道
+    if proc.returncode is None and _signal_process_group(proc.pid, signal.SIGTERM):
+        try:
+            await asyncio.wait_for(proc.wait(), grace)
+        except asyncio.TimeoutError:
+            pass
+
+        _signal_process_group(proc.pid, signal.SIGKILL)
+
+    await proc.wait()
+
+
+async def _create_subprocess(cmd: CmdLine,
+                             use_shell: bool,
+                             limits: Optional[CmdLimits],
+                             **kwargs) -> asyncio.subprocess.Process:
+    args, popen_kwargs = _to_popen_args(cmd, use_shell, limits)
+
+    if popen_kwargs.pop('shell'):
+        return await asyncio.create_subprocess_shell(args, start_new_session=True, **popen_kwargs, **kwargs)
+
+    return await asyncio.create_subprocess_exec(*args, start_new_session=True, **popen_kwargs, **kwargs)
+
+
+async def _run_cmd(cmd: CmdLine,
+                   timeout: Optional[float],
+                   semaphore: Optional[asyncio.Semaphore],
+                   use_shell: bool,
+                   limits: Optional[CmdLimits]) -> (int, bytes, bytes):
+    async with _get_semaphore(semaphore):
+        proc = await _create_subprocess(cmd, use_shell, limits, stdout=asyncio.subprocess.PIPE,
+                                        stderr=asyncio.subprocess.PIPE)
+
+        try:
+            stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout)
+        except asyncio.TimeoutError:
+            await _kill(proc)
+            hlog.error('Command timed out after %s seconds: %s' % (timeout, cmd))
+            raise subprocess.TimeoutExpired(cmd, timeout)
+        finally:
+            # 被取消或出现其他异常时，不遗留子进程
+            await asyncio.shield(_kill(proc))
+
+    return proc.returncode, stdout, stderr
+
+
+async def async_get_exit_code_of_cmd(cmd: CmdLine,
+                                     encoding='UTF-8',
+                                     is_show_error=True,
+                                     is_show_output=False,
+                                     is_raise_exception=False,
+                                     timeout: Optional[float] = None,
+                                     semaphore: Optional[asyncio.Semaphore] = None,
+                                     use_shell=True,
+                                     limits: Optional[CmdLimits] = None) -> int:
+    """
+    异步执行系统命令，屏蔽标准输出，返回命令退出代码
+    :cmd: 命令行，字符串或参数列表
+    :encoding: 指定编码
+    :is_show_error: 显示错误提示信息
+    :is_show_output: 打印命令输出
+    :is_raise_exception: 执行失败时，抛出异常
+    :timeout: 超时时间（秒）
+    :semaphore: 并发限制信号量，默认使用事件循环共享的信号量
+    :use_shell: 字符串命令行是否通过 shell 执行，False 时使用 shlex 拆分后直接执行
+    :limits: 子进程资源限制
+    :return:
+    """
+    func_name = inspect.currentframe().f_code.co_name
+    hlog.enter_func(func_name)
+
+    hlog.debug("cmd=%s" % cmd)
+
+    if not cmd:
+        hlog.critical('"cmd" 参数不能为空')
+        return 1
+
+    result, stdout, stderr = await _run_cmd(cmd, timeout, semaphore, use_shell, limits)
+
+    if result != 0 and is_raise_exception:
+        raise subprocess.CalledProcessError(result, cmd, stdout, stderr)
+
+    if result != 0 and is_show_error:
+        hlog.error('error code: %d, error message: %s' % (result, str(stderr, encoding=encoding).strip()))
+
+    if is_show_output:
+        hlog.info('Command output:%s%s' % (os.linesep, str(stdout, encoding=encoding).strip()))
+
+    hlog.debug("result=%d" % result)
+    hlog.exit_func(func_name)
+
+    return result
+
+
+async def async_get_exit_status_of_cmd(cmd: CmdLine,
+                                       encoding='UTF-8',
+                                       is_show_error=True,
+                                       is_show_output=False,
+                                       is_raise_exception=False,
+                                       timeout: Optional[float] = None,
+                                       semaphore: Optional[asyncio.Semaphore] = None,
+                                       use_shell=True,
+                                       limits: Optional[CmdLimits] = None) -> bool:
+    """
+    异步执行系统命令，屏蔽标准输出，根据命令退出代码返回布尔值
+    :cmd: 命令行，字符串或参数列表
+    :encoding: 指定编码
+    :is_show_error: 显示错误提示信息
+    :is_show_output: 打印命令输出
+    :is_raise_exception: 执行失败时，抛出异常
+    :timeout: 超时时间（秒）
+    :semaphore: 并发限制信号量，默认使用事件循环共享的信号量
+    :use_shell: 字符串命令行是否通过 shell 执行，False 时使用 shlex 拆分后直接执行
+    :limits: 子进程资源限制
+    :return:
+    """
+    func_name = inspect.currentframe().f_code.co_name
+    hlog.enter_func(func_name)
+
+    hlog.debug("cmd=%s" % cmd)
+
+    result = await async_get_exit_code_of_cmd(cmd, encoding, is_show_error, is_show_output, is_raise_exception,
+                                              timeout, semaphore, use_shell, limits) == 0
+
+    hlog.debug("Command %s" % ('succeeded' if result else 'failed'))
+    hlog.exit_func(func_name)
+
+    return result
+
+
+async def async_execute_cmd(cmd: CmdLine,
+                            encoding='UTF-8',
+                            remove_white_char=False,
+                            is_raise_exception=False,
+                            timeout: Optional[float] = None,
+                            semaphore: Optional[asyncio.Semaphore] = None,
+                            use_shell=True,
+                            limits: Optional[CmdLimits] = None) -> (int, str):
+    """
+    异步执行系统命令，返回 命令执行结果字符串和返回代码
+    :cmd: 命令行，字符串或参数列表
+    :encoding: 指定返回字符串编码
+    :remove_white_char: 是否移除返回字符串最后的空白字符，比如换行符
+    :is_raise_exception: 执行失败时，抛出异常
+    :timeout: 超时时间（秒）
+    :semaphore: 并发限制信号量，默认使用事件循环共享的信号量
+    :use_shell: 字符串命令行是否通过 shell 执行，False 时使用 shlex 拆分后直接执行
+    :limits: 子进程资源限制
+    :return:
+    """
+    func_name = inspect.currentframe().f_code.co_name
+    hlog.enter_func(func_name)
+
+    hlog.debug("cmd=%s" % cmd)
+
+    returncode, stdout, stderr = await _run_cmd(cmd, timeout, semaphore, use_shell, limits)
+
+    if returncode != 0 and is_raise_exception:
+        raise subprocess.CalledProcessError(returncode, cmd, stdout, stderr)
+
+    result = str(stdout, encoding)
+
+    if remove_white_char:
+        result = result.strip()
+
+    if returncode != 0:
+        hlog.error('error code: %d, error message: %s' % (returncode, str(stderr, encoding=encoding)))
+        hlog.error(result)
+
+    if hlog.is_enabled(HappyLogLevel.DEBUG):
+        hlog.debug("result=%s" % result)
+    hlog.exit_func(func_name)
+
+    return returncode, result
+
+
+async def async_get_output_of_cmd(cmd: CmdLine,
+                                  encoding='UTF-8',
+                                  remove_white_char=False,
+                                  is_raise_exception=False,
+                                  timeout: Optional[float] = None,
+                                  semaphore: Optional[asyncio.Semaphore] = None,
+                                  use_shell=True,
+                                  limits: Optional[CmdLimits] = None) -> str:
+    """
+    异步执行系统命令，返回命令执行结果字符串
+    :cmd: 命令行，字符串或参数列表
+    :encoding: 指定返回字符串编码
+    :remove_white_char: 是否移除返回字符串最后的空白字符，比如换行符
+    :is_raise_exception: 执行失败时，抛出异常
+    :timeout: 超时时间（秒）
+    :semaphore: 并发限制信号量，默认使用事件循环共享的信号量
+    :use_shell: 字符串命令行是否通过 shell 执行，False 时使用 shlex 拆分后直接执行
+    :limits: 子进程资源限制
+    :return:
+    """
+    _, result = await async_execute_cmd(cmd, encoding, remove_white_char, is_raise_exception, timeout, semaphore,
+                                        use_shell, limits)
+
+    return result
+
+
+async def async_exe_cmd_and_poll_output(cmd: CmdLine,
+                                        encoding='UTF-8',
+                                        is_capture_output=False,
+                                        timeout: Optional[float] = None,
+                                        semaphore: Optional[asyncio.Semaphore] = None,
+                                        use_shell=False,
+                                        limits: Optional[CmdLimits] = None):
+    """
+    异步执行命令，将命令输出实时打印到标准输出
+    :param cmd: 命令行
+    :param encoding: 字符编码
+    :param is_capture_output: 是否返回命令输出
+    :param timeout: 超时时间（秒）
+    :param semaphore: 并发限制信号量，默认使用事件循环共享的信号量
+    :param use_shell: 字符串命令行是否通过 shell 执行，默认使用 shlex 拆分后直接执行
+    :param limits: 子进程资源限制
+    :return: 标准输出字符串列表
+    """
+    func_name = inspect.currentframe().f_code.co_name
+    hlog.enter_func(func_name)
+
+    hlog.trace("cmd=%s" % cmd)
+
+    output = list()
+
+    def _print_line(line: bytes) -> None:
+        line = str(line, encoding=encoding)
+        print(line, end='')
+
+        if is_capture_output:
+            output.append(line)
+
+    async def _poll_output(p: asyncio.subprocess.Process) -> None:
+        # 按块读取后自行分行，StreamReader.readline 遇到超过 limit（默认 64 KiB）的行时抛出异常
+        pending = []
+
+        while True:
+            data = await p.stdout.read(READ_CHUNK_SIZE)
+
+            if not data:
+                break
+
+            start = 0
+            end = data.find(b'\n')
+
+            while end >= 0:
+                pending.append(data[start:end + 1])
+                _print_line(b''.join(pending))
+                pending.clear()
+                start = end + 1
+                end = data.find(b'\n', start)
+
+            if start < len(data):
+                pending.append(data[start:])
+
+        if pending:
+            _print_line(b''.join(pending))
+
+        await p.wait()
+
+    async with _get_semaphore(semaphore):
+        proc = await _create_subprocess(cmd, use_shell, limits, stdout=asyncio.subprocess.PIPE,
+                                        stderr=asyncio.subprocess.STDOUT)
+
+        try:
+            await asyncio.wait_for(_poll_output(proc), timeout)
+        except asyncio.TimeoutError:
+            await _kill(proc)
+            hlog.error('Command timed out after %s seconds: %s' % (timeout, cmd))
+            raise subprocess.TimeoutExpired(cmd, timeout)
+        finally:
+            await asyncio.shield(_kill(proc))
+
+    if proc.returncode != 0:
+        hlog.error('Command execution failed')
+
+    hlog.exit_func(func_name)
+    return output
@@ -0,0 +1,368 @@
+"""
+常驻 shell 协进程，适合高频执行大量小命令（比如 test -f、stat、grep -q）
+
+每次调用 happy_python.cmd 中的函数都要 fork/exec 一个新的 shell，小命令的耗时几乎全部花在进程启动上。
+CmdShell 只启动一个常驻的 bash 进程，通过管道发送命令，在标准输出和标准错误的末尾写入唯一的分隔标记，
+据此切分每条命令的输出并取得退出代码。
+
+    - 返回值与 happy_python.cmd 中的同名函数兼容
+    - 默认每条命令在子 shell 中执行（fork，不 exec），cd、变量、exit 不影响常驻进程；
+      isolated=False 时直接在常驻进程中执行，省去 fork，命令之间共享 shell 状态
+    - 命令的标准输入重定向到 /dev/null，不会读走后续命令
+    - 常驻进程退出（比如被杀死，或 isolated=False 时执行了 exit）后，下一次调用时自动重启
+    - 超时后结束常驻进程所在的进程组（SIGTERM，随后 SIGKILL）并抛出 subprocess.TimeoutExpired
+    - 同一个 CmdShell 的调用串行执行，可以在多个线程中共享
+
+注意：命令在后台启动的进程（比如 cmd &）继续输出时，会混入之后命令的输出。
+
+快速开始
+    >>> from happy_python.cmd_shell import CmdShell
+
+    >>> with CmdShell() as shell:
+    ...     for name in names:
+    ...         if shell.get_exit_status_of_cmd('test -f %s' % name, is_show_error=False):
+    ...             pass
+"""
+import inspect
+import itertools
+import os
+import selectors
+import shlex
+import subprocess
+import threading
+import time
+import uuid
+from typing import Optional
+
+from happy_python import HappyLog
+from happy_python.cmd import CmdLine, CmdResult, READ_CHUNK_SIZE, STDERR, STDOUT, _kill_process_group, \
+    resolve_executable
+from happy_python.happy_log import HappyLogLevel
+
+hlog = HappyLog()
+
+# 默认使用的 shell
+SHELL = 'bash'
+
+
+class CmdShell:
+    def __init__(self,
+                 shell: str = SHELL,
+                 isolated: bool = True,
+                 env: Optional[dict] = None,
+                 cwd: Optional[str] = None):
+        """
+        :param shell: bash 兼容的 shell
+        :param isolated: 每条命令是否在子 shell 中执行
+        :param env: 常驻进程的环境变量，None 表示继承当前进程
+        :param cwd: 常驻进程的工作目录
+        """
+        self.shell = shell
+        self.isolated = isolated
+        self.env = env
+        self.cwd = cwd
+        # 常驻进程启动次数
+        self.start_count = 0
+        self._proc: Optional[subprocess.Popen] = None
+        self._lock = threading.Lock()
+        self._token = uuid.uuid4().hex
+        self._counter = itertools.count()
+
+    @property
+    def pid(self) -> Optional[int]:
+        return None if self._proc is None else self._proc.pid
+
+    def start(self) -> None:
+        with self._lock:
+            self._ensure_started()
+
+    def close(self) -> None:
+        with self._lock:
+            self._stop()
+
+    def __enter__(self) -> 'CmdShell':
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> bool:
+        self.close()
+        return False
+
+    def __del__(self):
+        if self._proc is not None:
+            self._kill()
+
+    def _ensure_started(self) -> None:
+        if self._proc is not None and self._proc.poll() is None:
+            return
+
+        if self._proc is not None:
+            hlog.warning('Shell coprocess %d exited with code %d, restarting' % (self._proc.pid, self._proc.returncode))
+            self._cleanup()
+
+        # 在独立的会话中启动，超时后可以连同正在执行的命令一起杀死
+        self._proc = subprocess.Popen([resolve_executable(self.shell), '--noprofile', '--norc'],
+                                      stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                      env=self.env, cwd=self.cwd, start_new_session=True, bufsize=0)
+        self.start_count += 1
+
+    def _kill(self) -> None:
+        _kill_process_group(self._proc)
+        self._cleanup()
+
+    def _stop(self) -> None:
+        if self._proc is None:
+            return
+
+        try:
+            # 关闭标准输入后 shell 读到 EOF 正常退出
+            self._proc.stdin.close()
+            self._proc.wait(timeout=1)
+        except (OSError, subprocess.TimeoutExpired):
+            pass
+
+        if self._proc.poll() is None:
+            self._kill()
+        else:
+            self._cleanup()
+
+    def _cleanup(self) -> None:
+        for f in (self._proc.stdin, self._proc.stdout, self._proc.stderr):
+            try:
+                f.close()
+            except OSError:
+                pass
+
+        self._proc = None
+
+    def _build_script(self, cmd: CmdLine, sentinel: str) -> bytes:
+        if not isinstance(cmd, str):
+            cmd = shlex.join(cmd)
+
+        # eval 遇到语法错误时只返回非 0 退出代码，不会导致常驻进程退出
+        body = 'eval %s' % shlex.quote(cmd)
+
+        if self.isolated:
+            body = '( %s )' % body
+
+        # 先输出换行符，保证标记位于行首，切分时去掉该换行符即可还原命令输出
+        return ('%s </dev/null\n'
+                'printf \'\\n%s:%%d\\n\' "$?"; printf \'\\n%s\\n\' >&2\n' % (body, sentinel, sentinel)).encode()
+
+    def _communicate(self, sentinel: str, timeout: Optional[float]) -> tuple[int, bytes, bytes]:
+        markers = {STDOUT: ('\n%s:' % sentinel).encode(), STDERR: ('\n%s\n' % sentinel).encode()}
+        buffers = {STDOUT: bytearray(), STDERR: bytearray()}
+        found = {}
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        def _is_done() -> bool:
+            # 标准输出的标记后面还有退出代码，需要读到换行符为止
+            return STDERR in found and STDOUT in found \
+                and buffers[STDOUT].find(b'\n', found[STDOUT] + len(markers[STDOUT])) != -1
+
+        with selectors.DefaultSelector() as sel:
+            sel.register(self._proc.stdout, selectors.EVENT_READ, STDOUT)
+            sel.register(self._proc.stderr, selectors.EVENT_READ, STDERR)
+
+            while not _is_done():
+                if not sel.get_map():
+                    # 常驻进程已退出，返回已读取的输出和进程退出代码
+                    returncode = self._proc.wait()
+                    self._cleanup()
+
+                    return returncode, \
+                        bytes(buffers[STDOUT][:found.get(STDOUT)]), bytes(buffers[STDERR][:found.get(STDERR)])
+
+                remaining = None if deadline is None else deadline - time.monotonic()
+
+                if remaining is not None and remaining <= 0:
+                    raise subprocess.TimeoutExpired('', timeout)
+
+                for key, _ in sel.select(remaining):
+                    name = key.data
+                    data = os.read(key.fd, READ_CHUNK_SIZE)
+
+                    if not data:
+                        sel.unregister(key.fileobj)
+                        continue
+
+                    buf = buffers[name]
+                    # 只需从上次数据末尾往前一个标记长度的位置开始查找
+                    start = max(0, len(buf) - len(markers[name]))
+                    buf += data
+
+                    if name not in found:
+                        i = buf.find(markers[name], start)
+
+                        if i != -1:
+                            found[name] = i
+
+        out = buffers[STDOUT]
+        i = found[STDOUT] + len(markers[STDOUT])
+        returncode = int(out[i:out.index(b'\n', i)])
+
+        return returncode, bytes(out[:found[STDOUT]]), bytes(buffers[STDERR][:found[STDERR]])
+
+    def _run(self, cmd: CmdLine, timeout: Optional[float]) -> tuple[int, bytes, bytes, float]:
+        sentinel = '__HAPPY_SHELL_%s_%d__' % (self._token, next(self._counter))
+        script = self._build_script(cmd, sentinel)
+
+        with self._lock:
+            start = time.perf_counter()
+
+            for attempt in range(2):
+                self._ensure_started()
+
+                try:
+                    self._proc.stdin.write(script)
+                    break
+                except BrokenPipeError:
+                    # 常驻进程已退出，命令尚未执行，重启后重试一次
+                    if attempt:
+                        raise
+
+                    self._proc.wait()
+
+            try:
+                returncode, stdout, stderr = self._communicate(sentinel, timeout)
+            except subprocess.TimeoutExpired:
+                self._kill()
+                hlog.error('Command timed out after %s seconds: %s' % (timeout, cmd))
+                raise subprocess.TimeoutExpired(cmd, timeout)
+            except BaseException:
+                # 输出流状态未知，丢弃常驻进程
+                self._kill()
+                raise
+
+            return returncode, stdout, stderr, time.perf_counter() - start
+
+    def run_cmd(self,
+                cmd: CmdLine,
+                encoding='UTF-8',
+                remove_white_char=False,
+                is_raise_exception=False,
+                timeout: Optional[float] = None) -> CmdResult:
+        """
+        执行命令，返回包含退出代码、标准输出、标准错误和执行时长的结果对象，不输出错误日志
+        :cmd: 命令行，字符串或参数列表
+        :encoding: 指定返回字符串编码
+        :remove_white_char: 是否移除标准输出最后的空白字符，比如换行符
+        :is_raise_exception: 执行失败时，抛出异常
+        :timeout: 超时时间（秒）
+        :return:
+        """
+        returncode, stdout, stderr, duration = self._run(cmd, timeout)
+
+        if returncode != 0 and is_raise_exception:
+            raise subprocess.CalledProcessError(returncode, cmd, stdout, stderr)
+
+        stdout = str(stdout, encoding)
+
+        if remove_white_char:
+            stdout = stdout.strip()
+
+        return CmdResult(cmd=cmd, returncode=returncode, stdout=stdout, stderr=str(stderr, encoding),
+                         duration=duration)
+
+    def get_exit_code_of_cmd(self,
+                             cmd: CmdLine,
+                             encoding='UTF-8',
+                             is_show_error=True,
+                             is_show_output=False,
+                             is_raise_exception=False,
+                             timeout: Optional[float] = None) -> int:
+        """
+        执行命令，屏蔽标准输出，返回命令退出代码
+        :cmd: 命令行，字符串或参数列表
+        :encoding: 指定编码
+        :is_show_error: 显示错误提示信息
+        :is_show_output: 打印命令输出
+        :is_raise_exception: 执行失败时，抛出异常
+        :timeout: 超时时间（秒）
+        :return:
+        """
+        func_name = inspect.currentframe().f_code.co_name
+        hlog.enter_func(func_name)
+
+        hlog.debug("cmd=%s" % cmd)
+
+        if not cmd:
+            hlog.critical('"cmd" 参数不能为空')
+            return 1
+
+        result, stdout, stderr, _ = self._run(cmd, timeout)
+
+        if result != 0 and is_raise_exception:
+            raise subprocess.CalledProcessError(result, cmd, stdout, stderr)
+
+        if result != 0 and is_show_error:
+            hlog.error('error code: %d, error message: %s' % (result, str(stderr, encoding=encoding).strip()))
+
+        if is_show_output:
+            hlog.info('Command output:%s%s' % (os.linesep, str(stdout, encoding=encoding).strip()))
+
+        hlog.debug("result=%d" % result)
+        hlog.exit_func(func_name)
+
+        return result
+
+    def get_exit_status_of_cmd(self,
+                               cmd: CmdLine,
+                               encoding='UTF-8',
+                               is_show_error=True,
+                               is_show_output=False,
+                               is_raise_exception=False,
+                               timeout: Optional[float] = None) -> bool:
+        """
+        执行命令，屏蔽标准输出，根据命令退出代码返回布尔值，参数同 get_exit_code_of_cmd
+        :return:
+        """
+        return self.get_exit_code_of_cmd(cmd, encoding, is_show_error, is_show_output, is_raise_exception,
+                                         timeout) == 0
+
+    def execute_cmd(self,
+                    cmd: CmdLine,
+                    encoding='UTF-8',
+                    remove_white_char=False,
+                    is_raise_exception=False,
+                    timeout: Optional[float] = None) -> (int, str):
+        """
+        执行命令，返回 命令执行结果字符串和返回代码
+        :cmd: 命令行，字符串或参数列表
+        :encoding: 指定返回字符串编码
+        :remove_white_char: 是否移除返回字符串最后的空白字符，比如换行符
+        :is_raise_exception: 执行失败时，抛出异常
+        :timeout: 超时时间（秒）
+        :return:
+        """
+        func_name = inspect.currentframe().f_code.co_name
+        hlog.enter_func(func_name)
+
+        hlog.debug("cmd=%s" % cmd)
+
+        cr = self.run_cmd(cmd, encoding, remove_white_char, is_raise_exception, timeout)
+        result = cr.stdout
+
+        if cr.returncode != 0:
+            hlog.error('error code: %d, error message: %s' % (cr.returncode, cr.stderr))
+            hlog.error(result)
+
+        if hlog.is_enabled(HappyLogLevel.DEBUG):
+            hlog.debug("result=%s" % result)
+        hlog.exit_func(func_name)
+
+        return cr.returncode, result
+
+    def get_output_of_cmd(self,
+                          cmd: CmdLine,
+                          encoding='UTF-8',
+                          remove_white_char=False,
+                          is_raise_exception=False,
+                          timeout: Optional[float] = None) -> str:
+        """
+        执行命令，返回命令执行结果字符串，参数同 execute_cmd
+        :return:
+        """
+        _, result = self.execute_cmd(cmd, encoding, remove_white_char, is_raise_exception, timeout)
+
+        return result
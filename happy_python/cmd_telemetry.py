@@ -0,0 +1,248 @@
+"""
+系统命令执行统计
+
+启用后，happy_python.cmd 中基于 run_cmd 的函数（run_cmd、execute_cmd、get_output_of_cmd、get_exit_code_of_cmd、
+get_exit_status_of_cmd、execute_cmd_batch）使用 os.wait4 回收子进程，取得子进程（及其已回收的后代进程）的资源使用情况：
+
+    - CmdUsage: 用户态/内核态 CPU 时间、最大常驻内存、块设备读写次数，保存在 CmdResult.usage 中
+    - CmdTelemetry: 按命令名（可执行文件名）汇总执行时长、CPU 时间、最大常驻内存的直方图，
+      可以导出为 JSON 或 Prometheus 文本格式
+
+快速开始
+    >>> from happy_python import CmdTelemetry, set_cmd_telemetry, execute_cmd
+
+    >>> telemetry = set_cmd_telemetry(CmdTelemetry())
+    >>> execute_cmd('grep -r foo /etc')
+    >>> print(telemetry.to_prometheus())
+    >>> set_cmd_telemetry(None)
+"""
+import os
+import resource
+import shlex
+import sys
+import threading
+from bisect import bisect_left
+from dataclasses import dataclass
+from typing import Optional, Sequence, Union
+
+from happy_python.json import dict_to_pretty_json
+
+# 执行时长、CPU 时间直方图的桶上限，单位秒
+TIME_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 60.0, 300.0)
+
+# 最大常驻内存直方图的桶上限，单位字节
+RSS_BUCKETS = tuple(1 << n for n in range(20, 35, 2))
+
+# Prometheus 指标名前缀
+METRIC_PREFIX = 'happy_cmd'
+
+# ru_maxrss 在 macOS 上单位为字节，在 Linux 等系统上为 KiB
+_MAXRSS_SCALE = 1 if sys.platform == 'darwin' else 1024
+
+
+@dataclass(frozen=True, slots=True)
+class CmdUsage:
+    """
+    子进程资源使用情况
+    """
+    # 用户态 CPU 时间，单位秒
+    user_time: float
+    # 内核态 CPU 时间，单位秒
+    system_time: float
+    # 最大常驻内存，单位字节
+    max_rss: int
+    # 块设备读、写次数
+    block_input: int
+    block_output: int
+
+    @property
+    def cpu_time(self) -> float:
+        return self.user_time + self.system_time
+
+    @classmethod
+    def from_rusage(cls, ru: resource.struct_rusage) -> 'CmdUsage':
+        return cls(user_time=ru.ru_utime,
+                   system_time=ru.ru_stime,
+                   max_rss=ru.ru_maxrss * _MAXRSS_SCALE,
+                   block_input=ru.ru_inblock,
+                   block_output=ru.ru_oublock)
+
+
+def command_name(cmd: Union[str, Sequence[str]]) -> str:
+    """
+    命令名：命令行中第一个可执行文件的文件名，跳过开头的环境变量赋值（比如 LANG=C grep）
+    :param cmd: 命令行，字符串或参数列表
+    :return:
+    """
+    if isinstance(cmd, str):
+        try:
+            argv = shlex.split(cmd)
+        except ValueError:
+            argv = cmd.split()
+    else:
+        argv = list(cmd)
+
+    for arg in argv:
+        if '=' not in arg or arg.startswith('='):
+            return os.path.basename(arg)
+
+    return ''
+
+
+class _Histogram:
+    __slots__ = ('bounds', 'counts', 'sum')
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = bounds
+        # 最后一个桶为 +Inf
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0
+
+    def observe(self, value: float) -> None:
+        # 桶上限包含边界值（le）
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    def cumulative(self) -> list[int]:
+        result = []
+        total = 0
+
+        for n in self.counts:
+            total += n
+            result.append(total)
+
+        return result
+
+    def to_dict(self) -> dict:
+        return {
+            'buckets': dict(zip([str(b) for b in self.bounds] + ['+Inf'], self.cumulative())),
+            'sum': self.sum,
+        }
+
+
+class _CmdStats:
+    __slots__ = ('count', 'failures', 'timeouts', 'duration', 'cpu_time', 'max_rss', 'block_input', 'block_output')
+
+    def __init__(self):
+        self.count = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.duration = _Histogram(TIME_BUCKETS)
+        self.cpu_time = _Histogram(TIME_BUCKETS)
+        self.max_rss = _Histogram(RSS_BUCKETS)
+        self.block_input = 0
+        self.block_output = 0
+
+
+def _escape_label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class CmdTelemetry:
+    """
+    按命令名汇总的执行统计，线程安全
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: dict[str, _CmdStats] = {}
+
+    def record(self,
+               cmd: Union[str, Sequence[str]],
+               returncode: int,
+               duration: float,
+               usage: Optional[CmdUsage] = None,
+               timed_out: bool = False) -> None:
+        """
+        记录一次命令执行。超时被结束的命令没有资源使用情况，只记录执行时长
+        """
+        name = command_name(cmd)
+
+        with self._lock:
+            stats = self._stats.get(name)
+
+            if stats is None:
+                stats = self._stats[name] = _CmdStats()
+
+            stats.count += 1
+            stats.duration.observe(duration)
+
+            if returncode != 0:
+                stats.failures += 1
+
+            if timed_out:
+                stats.timeouts += 1
+
+            if usage is not None:
+                stats.cpu_time.observe(usage.cpu_time)
+                stats.max_rss.observe(usage.max_rss)
+                stats.block_input += usage.block_input
+                stats.block_output += usage.block_output
+
+    def clear(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                name: {
+                    'count': stats.count,
+                    'failures': stats.failures,
+                    'timeouts': stats.timeouts,
+                    'duration_seconds': stats.duration.to_dict(),
+                    'cpu_seconds': stats.cpu_time.to_dict(),
+                    'max_rss_bytes': stats.max_rss.to_dict(),
+                    'block_input': stats.block_input,
+                    'block_output': stats.block_output,
+                } for name, stats in self._stats.items()
+            }
+
+    def to_json(self, indent=4) -> str:
+        return dict_to_pretty_json(self.to_dict(), indent=indent)
+
+    def to_prometheus(self, prefix: str = METRIC_PREFIX) -> str:
+        """
+        导出为 Prometheus 文本格式（text/plain; version=0.0.4）
+        :param prefix: 指标名前缀
+        :return:
+        """
+        with self._lock:
+            items = sorted((name, stats) for name, stats in self._stats.items())
+            lines = []
+
+            for metric, attr, help_text in (('duration_seconds', 'duration', 'Command wall time in seconds.'),
+                                            ('cpu_seconds', 'cpu_time', 'Command user plus system CPU time.'),
+                                            ('max_rss_bytes', 'max_rss', 'Command maximum resident set size.')):
+                metric = '%s_%s' % (prefix, metric)
+                lines.append('# HELP %s %s' % (metric, help_text))
+                lines.append('# TYPE %s histogram' % metric)
+
+                for name, stats in items:
+                    hist = getattr(stats, attr)
+                    label = _escape_label(name)
+
+                    for bound, n in zip(list(hist.bounds) + ['+Inf'], hist.cumulative()):
+                        le = bound if isinstance(bound, str) else _format_value(bound)
+                        lines.append('%s_bucket{cmd="%s",le="%s"} %d' % (metric, label, le, n))
+
+                    lines.append('%s_sum{cmd="%s"} %s' % (metric, label, _format_value(hist.sum)))
+                    lines.append('%s_count{cmd="%s"} %d' % (metric, label, hist.cumulative()[-1]))
+
+            for metric, attr, help_text in (('runs_total', 'count', 'Commands executed.'),
+                                            ('failures_total', 'failures', 'Commands exited with non-zero code.'),
+                                            ('timeouts_total', 'timeouts', 'Commands killed after timeout.'),
+                                            ('block_input_total', 'block_input', 'Block input operations.'),
+                                            ('block_output_total', 'block_output', 'Block output operations.')):
+                metric = '%s_%s' % (prefix, metric)
+                lines.append('# HELP %s %s' % (metric, help_text))
+                lines.append('# TYPE %s counter' % metric)
+
+                for name, stats in items:
+                    lines.append('%s{cmd="%s"} %d' % (metric, _escape_label(name), getattr(stats, attr)))
+
+        return '\n'.join(lines) + '\n'
@@ -4,26 +4,149 @@
 import base64
 import hashlib
 import hmac
+import mmap
+import os
+import stat
+from typing import BinaryIO, Sequence, Union
+
+# 流和文件摘要每次读取的字节数
+DIGEST_CHUNK_SIZE = 1 << 20
+
+# 默认的文件摘要算法
+DIGEST_ALGORITHMS = ('md5', 'sha256')
 
 
 def gen_md5_32_hexdigest(s):
     """
     # 获取字符串的MD5值
-    :param s:
+    :param s: 字符串（按 UTF-8 编码）或字节串
     :return:
     """
 
     m = hashlib.md5()
-    m.update(s.encode('utf-8'))
+    m.update(_to_bytes(s))
     return m.hexdigest()
 
 
 def gen_sha1_hexdigest(s):
-    return hashlib.sha1(s.encode('utf-8')).hexdigest()
+    return hashlib.sha1(_to_bytes(s)).hexdigest()
 
 
 def gen_sha512_hexdigest(s):
-    return hashlib.sha512(s.encode('utf-8')).hexdigest()
+    return hashlib.sha512(_to_bytes(s)).hexdigest()
+
+
+def _to_bytes(s: Union[str, bytes]) -> bytes:
+    return s.encode('utf-8') if isinstance(s, str) else s
+
+
+def _update_all(hashes: list, data) -> None:
+    # 数据块较大时 hashlib 释放 GIL
+    for h in hashes:
+        h.update(data)
+
+
+def _hexdigests(algorithms: Sequence[str], hashes: list) -> dict[str, str]:
+    return {algorithm: h.hexdigest() for algorithm, h in zip(algorithms, hashes)}
+
+
+def _stream_hexdigests(f: BinaryIO, algorithms: Sequence[str], chunk_size: int) -> tuple[dict[str, str], int]:
+    """
+    :return: 算法名称 -> 十六进制摘要、读取的字节数
+    """
+    hashes = [hashlib.new(algorithm) for algorithm in algorithms]
+    buf = bytearray(chunk_size)
+    view = memoryview(buf)
+    size = 0
+
+    readinto = getattr(f, 'readinto', None)
+
+    while True:
+        if readinto is not None:
+            n = readinto(buf)
+
+            if not n:
+                break
+
+            _update_all(hashes, view[:n])
+        else:
+            data = f.read(chunk_size)
+            n = len(data)
+
+            if not n:
+                break
+
+            _update_all(hashes, data)
+
+        size += n
+
+    return _hexdigests(algorithms, hashes), size
+
+
+def gen_stream_hexdigests(f: BinaryIO,
+                          algorithms: Sequence[str] = DIGEST_ALGORITHMS,
+                          chunk_size: int = DIGEST_CHUNK_SIZE) -> dict[str, str]:
+    """
+    读取二进制流，一次读取同时计算多种摘要
+    :param f: 二进制流，比如 open(path, 'rb')、io.BytesIO、socket.makefile('rb')
+    :param algorithms: hashlib 支持的算法名称，比如 ('md5', 'sha256')
+    :param chunk_size: 每次读取的字节数
+    :return: 算法名称 -> 十六进制摘要
+    """
+    return _stream_hexdigests(f, algorithms, chunk_size)[0]
+
+
+def _mmap_hexdigests(f: BinaryIO, size: int, algorithms: Sequence[str], chunk_size: int) -> dict[str, str]:
+    hashes = [hashlib.new(algorithm) for algorithm in algorithms]
+
+    with mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as mm:
+        if hasattr(mm, 'madvise'):
+            mm.madvise(mmap.MADV_SEQUENTIAL)
+
+        with memoryview(mm) as view:
+            # 按块交替更新各个摘要，每块数据读入 CPU 缓存后被所有算法使用
+            for offset in range(0, size, chunk_size):
+                _update_all(hashes, view[offset:offset + chunk_size])
+
+    return _hexdigests(algorithms, hashes)
+
+
+def gen_file_hexdigests(path: Union[str, os.PathLike],
+                        algorithms: Sequence[str] = DIGEST_ALGORITHMS,
+                        chunk_size: int = DIGEST_CHUNK_SIZE,
+                        use_mmap: bool = False) -> dict[str, str]:
+    """
+    计算文件的多种摘要，只读取一次文件。
+    单个算法时使用 hashlib.file_digest（Python 3.11+），否则分块读取到复用的缓冲区
+    :param path: 文件路径
+    :param algorithms: hashlib 支持的算法名称，比如 ('md5', 'sha256')
+    :param chunk_size: 每次读取的字节数
+    :param use_mmap: 是否使用 mmap 读取，默认不使用。
+                     计算过程中文件被其他进程截断时，访问映射中超出文件末尾的页面会触发 SIGBUS 导致进程退出，
+                     只用于确定不会被修改的文件
+    :return: 算法名称 -> 十六进制摘要
+    """
+    with open(path, 'rb') as f:
+        st = os.fstat(f.fileno())
+
+        # 空文件无法 mmap
+        if use_mmap and stat.S_ISREG(st.st_mode) and st.st_size > 0:
+            return _mmap_hexdigests(f, st.st_size, algorithms, chunk_size)
+
+        if len(algorithms) == 1 and hasattr(hashlib, 'file_digest'):
+            return {algorithms[0]: hashlib.file_digest(f, algorithms[0]).hexdigest()}
+
+        return gen_stream_hexdigests(f, algorithms, chunk_size)
+
+
+def gen_file_hexdigest(path: Union[str, os.PathLike], algorithm: str = 'sha256', **kwargs) -> str:
+    """
+    计算文件摘要，参数见 gen_file_hexdigests
+    :param path: 文件路径
+    :param algorithm: hashlib 支持的算法名称
+    :return: 十六进制摘要
+    """
+    return gen_file_hexdigests(path, (algorithm,), **kwargs)[algorithm]
 
 
 def _sign_shax_digest(algorithm, secret: str, s: str, is_base64=False):
@@ -0,0 +1,400 @@
+"""
+目录摘要清单
+
+build_manifest 使用 os.scandir 遍历目录，在线程池中计算文件摘要（hashlib 处理大块数据时释放 GIL），生成按路径排序的清单；
+verify_manifest 并行比较目录与清单，只对大小相同的文件计算摘要。
+
+    - 小文件（小于 MANIFEST_BATCH_FILE_SIZE）按批次提交，每批最多 MANIFEST_BATCH_SIZE 字节、MANIFEST_BATCH_FILES 个文件，
+      减少任务调度开销
+    - 大文件（不小于 piece_size）按 piece_size 分块并行计算，文件摘要为各分块摘要依次拼接后的摘要（树形摘要），
+      与 sha256sum 等工具的结果不同；小于 piece_size 的文件摘要与 sha256sum 相同
+    - 只记录普通文件，不跟随符号链接
+    - 清单记录实际计算摘要的字节数；遍历后被删除的文件 build_manifest 不记录，verify_manifest 报告为 missing，
+      其他无法读取的文件 build_manifest 抛出 OSError，verify_manifest 报告为 changed
+
+清单文件格式（UTF-8 文本）：
+    # happy-python manifest algorithm=sha256 piece_size=67108864
+    <摘要>\t<大小>\t<相对路径>
+
+相对路径使用 / 分隔，其中的 \\、制表符、换行符转义为 \\\\、\\t、\\n。
+
+快速开始
+    >>> from happy_python import Manifest, build_manifest, verify_manifest
+
+    >>> manifest = build_manifest('/srv/app')
+    >>> manifest.save('/srv/app.manifest')
+    >>> diff = verify_manifest('/srv/app', Manifest.load('/srv/app.manifest'))
+    >>> diff.ok
+    True
+"""
+import hashlib
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Iterator, NamedTuple, Optional, Union
+
+from happy_python.digest import DIGEST_CHUNK_SIZE, _stream_hexdigests
+
+# 默认摘要算法
+MANIFEST_ALGORITHM = 'sha256'
+
+# 大文件分块大小
+MANIFEST_PIECE_SIZE = 64 << 20
+
+# 小于该大小的文件按批次提交
+MANIFEST_BATCH_FILE_SIZE = 256 << 10
+
+# 每批小文件的总字节数、文件数量上限
+MANIFEST_BATCH_SIZE = 4 << 20
+MANIFEST_BATCH_FILES = 64
+
+_HEADER_PREFIX = '# happy-python manifest'
+_ESCAPES = (('\\', '\\\\'), ('\t', '\\t'), ('\n', '\\n'))
+
+
+class ManifestEntry(NamedTuple):
+    # 相对路径，使用 / 分隔
+    path: str
+    size: int
+    digest: str
+
+
+class _Unreadable(NamedTuple):
+    # 遍历后无法读取的文件
+    path: str
+    error: OSError
+
+
+@dataclass
+class ManifestDiff:
+    """
+    目录与清单的差异，路径均已排序
+    """
+    # 清单中有，目录中没有
+    missing: list[str] = field(default_factory=list)
+    # 目录中有，清单中没有
+    extra: list[str] = field(default_factory=list)
+    # 大小或摘要不同
+    changed: list[str] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return not (self.missing or self.extra or self.changed)
+
+
+def _escape(path: str) -> str:
+    for src, dst in _ESCAPES:
+        path = path.replace(src, dst)
+
+    return path
+
+
+def _unescape(path: str) -> str:
+    if '\\' not in path:
+        return path
+
+    result = []
+    i = 0
+
+    while i < len(path):
+        c = path[i]
+
+        if c == '\\' and i + 1 < len(path):
+            result.append({'\\': '\\', 't': '\t', 'n': '\n'}.get(path[i + 1], path[i + 1]))
+            i += 2
+        else:
+            result.append(c)
+            i += 1
+
+    return ''.join(result)
+
+
+class Manifest:
+    """
+    按相对路径排序的文件摘要清单
+    """
+
+    def __init__(self,
+                 entries: list[ManifestEntry],
+                 algorithm: str = MANIFEST_ALGORITHM,
+                 piece_size: int = MANIFEST_PIECE_SIZE):
+        self.entries = sorted(entries)
+        self.algorithm = algorithm
+        self.piece_size = piece_size
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __iter__(self) -> Iterator[ManifestEntry]:
+        return iter(self.entries)
+
+    def __eq__(self, other):
+        if not isinstance(other, Manifest):
+            return NotImplemented
+
+        return (self.entries, self.algorithm, self.piece_size) == (other.entries, other.algorithm, other.piece_size)
+
+    def to_dict(self) -> dict[str, ManifestEntry]:
+        return {entry.path: entry for entry in self.entries}
+
+    def save(self, filename: str) -> None:
+        """
+        保存清单，先写入临时文件再替换
+        :param filename:
+        :return:
+        """
+        tmp = '%s.%d.tmp' % (filename, os.getpid())
+
+        with open(tmp, 'w', encoding='UTF-8', errors='surrogateescape', newline='\n') as f:
+            f.write('%s algorithm=%s piece_size=%d\n' % (_HEADER_PREFIX, self.algorithm, self.piece_size))
+
+            for entry in self.entries:
+                f.write('%s\t%d\t%s\n' % (entry.digest, entry.size, _escape(entry.path)))
+
+        os.replace(tmp, filename)
+
+    @classmethod
+    def load(cls, filename: str) -> 'Manifest':
+        """
+        载入清单
+        :param filename:
+        :return:
+        """
+        with open(filename, encoding='UTF-8', errors='surrogateescape', newline='\n') as f:
+            header = f.readline().rstrip('\n')
+
+            if not header.startswith(_HEADER_PREFIX):
+                raise ValueError('无效的清单文件：%s' % filename)
+
+            options = dict(tmp.split('=', 1) for tmp in header[len(_HEADER_PREFIX):].split())
+            entries = []
+
+            for line in f:
+                digest, size, path = line.rstrip('\n').split('\t', 2)
+                entries.append(ManifestEntry(_unescape(path), int(size), digest))
+
+        return cls(entries, options['algorithm'], int(options['piece_size']))
+
+
+def scan_files(root: Union[str, os.PathLike]) -> Iterator[tuple[str, str, int]]:
+    """
+    遍历目录中的普通文件，不跟随符号链接
+    :param root: 目录
+    :return: 生成器：(绝对路径, 使用 / 分隔的相对路径, 大小)
+    """
+    stack = [(os.fspath(root), '')]
+
+    while stack:
+        path, prefix = stack.pop()
+
+        try:
+            it = os.scandir(path)
+        except FileNotFoundError:
+            # 遍历过程中被删除的子目录
+            if not prefix:
+                raise
+
+            continue
+
+        with it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append((entry.path, prefix + entry.name + '/'))
+                elif entry.is_file(follow_symlinks=False):
+                    try:
+                        size = entry.stat(follow_symlinks=False).st_size
+                    except FileNotFoundError:
+                        continue
+
+                    yield entry.path, prefix + entry.name, size
+
+
+def _hash_batch(algorithm: str, files: list[tuple[str, str, int]]) -> list[Union[ManifestEntry, _Unreadable]]:
+    entries = []
+
+    for path, rel_path, _ in files:
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError as e:
+            entries.append(_Unreadable(rel_path, e))
+            continue
+
+        entries.append(ManifestEntry(rel_path, len(data), hashlib.new(algorithm, data).hexdigest()))
+
+    return entries
+
+
+def _hash_file(algorithm: str, path: str, rel_path: str) -> list[Union[ManifestEntry, _Unreadable]]:
+    try:
+        with open(path, 'rb', buffering=0) as f:
+            digests, size = _stream_hexdigests(f, (algorithm,), DIGEST_CHUNK_SIZE)
+    except OSError as e:
+        return [_Unreadable(rel_path, e)]
+
+    return [ManifestEntry(rel_path, size, digests[algorithm])]
+
+
+def _hash_piece(algorithm: str, path: str, offset: int, length: int) -> tuple[bytes, int]:
+    """
+    :return: 分块摘要、实际读取的字节数，文件被截断时小于 length
+    """
+    h = hashlib.new(algorithm)
+    fd = os.open(path, os.O_RDONLY)
+    start = offset
+
+    try:
+        end = offset + length
+
+        while offset < end:
+            data = os.pread(fd, min(DIGEST_CHUNK_SIZE, end - offset), offset)
+
+            if not data:
+                break
+
+            h.update(data)
+            offset += len(data)
+    finally:
+        os.close(fd)
+
+    return h.digest(), offset - start
+
+
+def _combine_pieces(algorithm: str, rel_path: str, pieces: list[Future]) -> list[Union[ManifestEntry, _Unreadable]]:
+    h = hashlib.new(algorithm)
+    size = 0
+
+    try:
+        for piece in pieces:
+            digest, n = piece.result()
+            h.update(digest)
+            size += n
+    except OSError as e:
+        return [_Unreadable(rel_path, e)]
+
+    return [ManifestEntry(rel_path, size, h.hexdigest())]
+
+
+def _submit_all(executor: ThreadPoolExecutor,
+                files: Iterator[tuple[str, str, int]],
+                algorithm: str,
+                piece_size: int) -> list[Union[Future, tuple[str, list[Future]]]]:
+    """
+    提交摘要任务
+    :return: Future（结果为 ManifestEntry 或 _Unreadable 列表）或大文件的 (相对路径, 分块 Future 列表)
+    """
+    futures = []
+    batch = []
+    batch_size = 0
+
+    for path, rel_path, size in files:
+        if size < MANIFEST_BATCH_FILE_SIZE:
+            batch.append((path, rel_path, size))
+            batch_size += size
+
+            if batch_size >= MANIFEST_BATCH_SIZE or len(batch) >= MANIFEST_BATCH_FILES:
+                futures.append(executor.submit(_hash_batch, algorithm, batch))
+                batch = []
+                batch_size = 0
+        elif size < piece_size:
+            futures.append(executor.submit(_hash_file, algorithm, path, rel_path))
+        else:
+            pieces = [executor.submit(_hash_piece, algorithm, path, offset, piece_size)
+                      for offset in range(0, size, piece_size)]
+
+            # 分块在线程池中计算，合并在收集结果时进行，避免合并任务占用线程等待分块任务
+            futures.append((rel_path, pieces))
+
+    if batch:
+        futures.append(executor.submit(_hash_batch, algorithm, batch))
+
+    return futures
+
+
+def _collect(futures: list[Union[Future, tuple[str, list[Future]]]],
+             algorithm: str) -> tuple[list[ManifestEntry], list[_Unreadable]]:
+    entries = []
+    unreadable = []
+
+    for future in futures:
+        results = _combine_pieces(algorithm, *future) if isinstance(future, tuple) else future.result()
+
+        for result in results:
+            (unreadable if isinstance(result, _Unreadable) else entries).append(result)
+
+    return entries, unreadable
+
+
+def _hash_files(files: Iterator[tuple[str, str, int]],
+                algorithm: str,
+                piece_size: int,
+                workers: Optional[int]) -> tuple[list[ManifestEntry], list[_Unreadable]]:
+    """
+    :return: 清单条目、遍历后无法读取的文件
+    """
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return _collect(_submit_all(executor, files, algorithm, piece_size), algorithm)
+
+
+def build_manifest(root: Union[str, os.PathLike],
+                   algorithm: str = MANIFEST_ALGORITHM,
+                   piece_size: int = MANIFEST_PIECE_SIZE,
+                   workers: Optional[int] = None) -> Manifest:
+    """
+    并行计算目录中全部普通文件的摘要
+    :param root: 目录
+    :param algorithm: hashlib 支持的算法名称
+    :param piece_size: 大文件分块大小，不小于该大小的文件按分块计算树形摘要
+    :param workers: 线程数量，默认同 ThreadPoolExecutor
+    :return:
+    :raise OSError: 文件无法读取，遍历后被删除的文件不记录
+    """
+    entries, unreadable = _hash_files(scan_files(root), algorithm, piece_size, workers)
+
+    for tmp in unreadable:
+        if not isinstance(tmp.error, FileNotFoundError):
+            raise tmp.error
+
+    return Manifest(entries, algorithm, piece_size)
+
+
+def verify_manifest(root: Union[str, os.PathLike], manifest: Manifest, workers: Optional[int] = None) -> ManifestDiff:
+    """
+    并行比较目录与清单，大小不同的文件不计算摘要
+    :param root: 目录
+    :param manifest: 清单
+    :param workers: 线程数量，默认同 ThreadPoolExecutor
+    :return:
+    """
+    entries = manifest.to_dict()
+    expected = dict(entries)
+    diff = ManifestDiff()
+    to_hash = []
+
+    for path, rel_path, size in scan_files(root):
+        entry = expected.pop(rel_path, None)
+
+        if entry is None:
+            diff.extra.append(rel_path)
+        elif entry.size != size:
+            diff.changed.append(rel_path)
+        else:
+            to_hash.append((path, rel_path, size))
+
+    diff.missing.extend(expected)
+
+    hashed, unreadable = _hash_files(iter(to_hash), manifest.algorithm, manifest.piece_size, workers)
+
+    for entry in hashed:
+        # 计算摘要时文件可能已被修改，条目记录的是实际读取的字节数，大小同样需要比较
+        if entry != entries[entry.path]:
+            diff.changed.append(entry.path)
+
+    for tmp in unreadable:
+        (diff.missing if isinstance(tmp.error, FileNotFoundError) else diff.changed).append(tmp.path)
+
+    diff.missing.sort()
+    diff.extra.sort()
+    diff.changed.sort()
+
+    return diff
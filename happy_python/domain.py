@@ -1,13 +1,24 @@
 """
 域名相关
 """
+import os
+import re
+import sys
+from collections import Counter, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from enum import Enum, unique
+from functools import lru_cache
+from itertools import islice
+from threading import RLock
+from typing import Container, Iterable, Iterator, NamedTuple, Optional, Sequence, Union
+
+from happy_python import HappyLog
+from happy_python.tld_db import MmapSuffixIndex, SuffixTrie, TLD_DB_ENV, TLD_DB_FILE, TLD_DB_MMAP_ENV, \
+    TLD_TEXT_FILES, is_tld_db, load_suffix_trie, read_suffix_text
 
 # 2.3.4. Size limits https://tools.ietf.org/html/rfc1035
 # 域名最大长度
-from pathlib import PurePath
-
-from happy_python import HappyLog, is_ascii_str
-
 DOMAIN_NAME_MAX_SIZE = 253
 
 # 字段最大长度
@@ -19,10 +30,17 @@ TLD_MIN_SIZE = 3
 # 域名分隔符
 DOMAIN_SEPARATOR = '.'
 
+# 域名解析结果缓存数量
+DOMAIN_CACHE_SIZE = 65536
+
 hlog = HappyLog()
 
-# 顶级域列表
-TLDs = []
+# 顶级域数据：顶级域集合（用于单个字段的哈希查找）和公共后缀索引（包含顶级域和多级公共后缀，比如 .co.uk），
+# 首次验证域名时载入
+_tld_db: Optional[tuple[Container[str], Union[SuffixTrie, MmapSuffixIndex]]] = None
+_tld_db_lock = RLock()
+# 已载入的顶级域数据的 (文件路径, 是否使用 mmap)，传给批量解析的工作进程
+_tld_db_source: Optional[tuple[str, bool]] = None
 
 
 def _top_level_domain_feild_builder(feild: str) -> str:
@@ -30,25 +48,88 @@ def _top_level_domain_feild_builder(feild: str) -> str:
     return DOMAIN_SEPARATOR + feild
 
 
-def _load_tlds_db() -> None:
+def _build_tld_db(suffixes: list[str]) -> tuple[frozenset[str], SuffixTrie]:
+    trie = SuffixTrie()
+
+    for suffix in suffixes:
+        trie.add(suffix)
+
+    return frozenset(suffix for suffix in suffixes if suffix.count(DOMAIN_SEPARATOR) == 1), trie
+
+
+def _read_tld_text_files() -> list[str]:
+    return [suffix for tmp in TLD_TEXT_FILES for suffix in read_suffix_text(tmp)]
+
+
+def load_tld_db(filename: Optional[str] = None, use_mmap: Optional[bool] = None) -> int:
     """
-    从指定顶级域数据文件载入顶级域数据
-    :return:
+    载入顶级域数据，替换已载入的数据并清空域名解析结果缓存。
+    不调用时，首次验证域名时按默认参数自动载入
+    :param filename: 索引文件（python -m happy_python.tld_db 编译）或文本文件（每行一个后缀），
+                     默认使用环境变量 HAPPY_PYTHON_TLD_DB 指定的文件，未指定时使用内置索引文件
+    :param use_mmap: 以只读 mmap 方式使用索引文件，多个进程共享同一份内存，查找比载入内存慢，
+                     默认由环境变量 HAPPY_PYTHON_TLD_DB_MMAP 决定
+    :return: 后缀数量
     """
-    tlds_resource_file = str(PurePath(__file__).parent / 'resource' / 'tlds.txt')
+    global _tld_db, _tld_db_source
 
-    try:
-        with open(tlds_resource_file, encoding='UTF-8') as f:
-            for line in f.readlines():
-                TLDs.append(line.strip())
-    except FileNotFoundError:
-        hlog.error('TLDs数据文件不存在：%s' % tlds_resource_file)
-    except FileExistsError:
-        hlog.error('无法打开TLDs数据文件：%s' % tlds_resource_file)
+    filename = filename or os.environ.get(TLD_DB_ENV) or TLD_DB_FILE
+
+    if use_mmap is None:
+        use_mmap = os.environ.get(TLD_DB_MMAP_ENV) == '1'
+
+    with _tld_db_lock:
+        try:
+            if filename == TLD_DB_FILE and not os.path.exists(filename):
+                # 未编译内置索引时（比如源码目录中）使用文本文件
+                _tld_db = _build_tld_db(_read_tld_text_files())
+            elif not is_tld_db(filename):
+                _tld_db = _build_tld_db(read_suffix_text(filename))
+            elif use_mmap:
+                index = MmapSuffixIndex(filename)
+                _tld_db = (index, index)
+            else:
+                _tld_db = load_suffix_trie(filename)
+        except (OSError, ValueError) as e:
+            if isinstance(e, FileNotFoundError):
+                hlog.error('TLDs数据文件不存在：%s' % filename)
+            else:
+                hlog.error('无法载入TLDs数据文件（%s）：%s' % (filename, e))
 
+            # 内置索引损坏时使用文本文件，不能载入空数据使全部域名无效
+            if filename == TLD_DB_FILE:
+                _tld_db = _build_tld_db(_read_tld_text_files())
+            else:
+                _tld_db = (frozenset(), SuffixTrie())
 
-# 载入顶级域列表
-_load_tlds_db()
+        _tld_db_source = (filename, use_mmap)
+        clear_domain_cache()
+
+        return len(_tld_db[1])
+
+
+def _init_tld_db() -> tuple[Container[str], Union[SuffixTrie, MmapSuffixIndex]]:
+    with _tld_db_lock:
+        if _tld_db is None:
+            load_tld_db()
+
+        return _tld_db
+
+
+def __getattr__(name: str):
+    # 兼容原有的模块属性：顶级域列表 TLDs、顶级域集合 _TLD_SET、公共后缀树 TLD_TRIE
+    if name in ('TLDs', '_TLD_SET', 'TLD_TRIE'):
+        tld_set, index = _tld_db or _init_tld_db()
+
+        if name == 'TLD_TRIE':
+            return index
+
+        if name == '_TLD_SET':
+            return tld_set
+
+        return sorted(suffix for suffix in tld_set if suffix.count(DOMAIN_SEPARATOR) == 1)
+
+    raise AttributeError('module %r has no attribute %r' % (__name__, name))
 
 
 class Domain:
@@ -83,12 +164,84 @@ class Domain:
         return DOMAIN_SEPARATOR.join(self.feild_hosts)
 
 
+class DomainName:
+    """
+    不可变的紧凑域名对象，只保存域名、主机、注册域名、公共后缀四个字符串，公共后缀字符串被驻留（intern），
+    相同后缀的对象共享同一字符串。提供与 Domain 相同的只读接口
+    """
+    __slots__ = ('name', 'host_name', 'domain_name', 'suffix')
+
+    def __init__(self, name: str, host_name: str, domain_name: str, suffix: str):
+        """
+        :param name: 域名字符串，比如 www.foo.com.cn
+        :param host_name: 主机，比如 www
+        :param domain_name: 注册域名，比如 foo.com.cn
+        :param suffix: 公共后缀，比如 .com.cn
+        """
+        setattr_ = object.__setattr__
+        setattr_(self, 'name', name)
+        setattr_(self, 'host_name', host_name)
+        # 没有主机字段时与域名字符串共享同一对象
+        setattr_(self, 'domain_name', name if domain_name == name else domain_name)
+        setattr_(self, 'suffix', sys.intern(suffix))
+
+    def __setattr__(self, key, value):
+        raise AttributeError('DomainName 对象不可修改')
+
+    def __delattr__(self, key):
+        raise AttributeError('DomainName 对象不可修改')
+
+    def __eq__(self, other):
+        if isinstance(other, DomainName):
+            return self.name == other.name
+
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.name)
+
+    def __repr__(self):
+        return 'DomainName(%r)' % self.name
+
+    def __reduce__(self):
+        return DomainName, (self.name, self.host_name, self.domain_name, self.suffix)
+
+    @property
+    def feild_hosts(self) -> tuple[str, ...]:
+        return tuple(self.host_name.split(DOMAIN_SEPARATOR)) if self.host_name else ()
+
+    @property
+    def feild_domain_name(self) -> str:
+        return self.domain_name[:len(self.domain_name) - len(self.suffix)]
+
+    @property
+    def feild_top_level_domains(self) -> tuple[str, ...]:
+        return tuple(sys.intern(_top_level_domain_feild_builder(tmp))
+                     for tmp in self.suffix[1:].split(DOMAIN_SEPARATOR))
+
+    def get_domain_name(self) -> str:
+        return self.domain_name
+
+    def get_host_name(self) -> str:
+        return self.host_name
+
+    @classmethod
+    def from_domain(cls, domain_obj: Domain) -> 'DomainName':
+        return cls(domain_obj.name,
+                   domain_obj.get_host_name(),
+                   domain_obj.get_domain_name(),
+                   ''.join(domain_obj.feild_top_level_domains))
+
+
 def _is_valid_tld(s: str) -> bool:
     """
     验证顶级域字段是否有效，在载入的顶级域数据数组中，查找存在的顶级域
     :param s:
     :return:
     """
+    # 空字段（比如 foo. 的末尾字段）不是顶级域
+    if not s:
+        return False
 
     tld = _top_level_domain_feild_builder(s)
     tld_len = len(tld)
@@ -96,128 +249,503 @@ def _is_valid_tld(s: str) -> bool:
     if tld_len < TLD_MIN_SIZE or tld_len > FEILD_MAX_SIZE:
         return False
 
-    # tld是否在顶级域列表中
-    return tld in TLDs
+    # tld是否在顶级域集合中
+    return tld in (_tld_db or _init_tld_db())[0]
 
 
-def _is_valid_host(s: str) -> bool:
+# 国际化域名字段的 punycode 前缀
+IDNA_PREFIX = 'xn--'
+
+# 主机字段：字母、数字、下划线以及中横线（“-”），不能以中横线（“-”）开头或结尾
+_HOST_LABEL_RE = re.compile(r'(?!-)[a-z0-9_-]{1,63}(?<!-)')
+
+# 域名字段：字母、数字以及中横线（“-”），长度不能为1，不能以中横线（“-”）开头或结尾
+_DN_LABEL_RE = re.compile(r'(?!-)[a-z0-9-]{2,63}(?<!-)')
+
+# 整个域名：所有字段都符合主机字段的规则，最后一个字段（顶级域）不能包含下划线
+_DOMAIN_RE = re.compile(r'(?:(?!-)[a-z0-9_-]{1,63}(?<!-)\.)+(?!-)[a-z0-9-]{2,63}(?<!-)')
+
+
+@lru_cache(maxsize=DOMAIN_CACHE_SIZE)
+def _idna_to_ascii(label: str) -> str:
     """
-    验证主机字段，主机字段由字母、数字、下划线以及中横线（“-”）组成，但不能为空或中横线（“-”），不能以中横线（“-”）开头或结尾
-    :param s:
-    :return:
+    国际化域名字段转换为 punycode，比如 中国 转换为 xn--fiqs8s
+    :param label:
+    :return: 无法转换时返回空字符串
     """
-    s_len = len(s)
+    try:
+        return label.encode('idna').decode('ascii')
+    except UnicodeError:
+        return ''
 
-    if s_len == 0 or s_len > FEILD_MAX_SIZE:
-        return False
 
-    if s == '-':
-        return False
+@lru_cache(maxsize=DOMAIN_CACHE_SIZE)
+def _idna_to_unicode(label: str) -> str:
+    """
+    punycode 字段转换为国际化域名字段，比如 xn--fiqs8s 转换为 中国
+    :param label:
+    :return: 无法转换时返回空字符串
+    """
+    try:
+        return label.encode('ascii').decode('idna')
+    except UnicodeError:
+        return ''
 
-    if s_len >= 2 and (s[0] == '-' or s[-1] == '-'):
-        return False
 
-    # 只对标准代码做正则匹配，忽略类似中文编码
-    if is_ascii_str(s):
-        import re
+def _to_ascii_feilds(feilds: tuple[str, ...]) -> tuple[str, ...]:
+    return tuple(tmp if tmp.isascii() else _idna_to_ascii(tmp) for tmp in feilds)
 
-        return bool(re.match(r'[a-z0-9-_]+', s))
 
-    return True
+def _to_unicode_feilds(feilds: tuple[str, ...]) -> tuple[str, ...]:
+    return tuple(_idna_to_unicode(tmp) or tmp if tmp.startswith(IDNA_PREFIX) else tmp for tmp in feilds)
+
+
+def _is_valid_host(s: str) -> bool:
+    """
+    验证主机字段，主机字段由字母、数字、下划线以及中横线（“-”）组成，但不能为空或中横线（“-”），不能以中横线（“-”）开头或结尾。
+    国际化域名字段转换为 punycode 后验证
+    :param s:
+    :return:
+    """
+    if not s.isascii():
+        s = _idna_to_ascii(s)
+
+    return _HOST_LABEL_RE.fullmatch(s) is not None
 
 
 def _is_valid_dn(s: str) -> bool:
     """
-    验证域名字段，域名字段由字母、数字、下划线以及中横线（“-”）组成，但长度不能为1，不能以中横线（“-”）开头或结尾
+    验证域名字段，域名字段由字母、数字以及中横线（“-”）组成，但长度不能为1，不能以中横线（“-”）开头或结尾。
+    国际化域名字段转换为 punycode 后验证
     :param s:
     :return:
     """
-    s_len = len(s)
+    if not s.isascii():
+        s = _idna_to_ascii(s)
 
-    if s_len <= 1 or s_len > FEILD_MAX_SIZE:
-        return False
+    return _DN_LABEL_RE.fullmatch(s) is not None
 
-    if s == '-':
-        return False
 
-    if s[0] == '-' or s[-1] == '-':
-        return False
+@unique
+class DomainError(Enum):
+    """
+    域名无效的原因
+    """
+    # 空字符串
+    EMPTY = 'empty'
+    # 超过域名最大长度
+    TOO_LONG = 'too_long'
+    # 以点开头
+    LEADING_DOT = 'leading_dot'
+    # 只有一个字段
+    TOO_FEW_LABELS = 'too_few_labels'
+    # 存在空字段，比如 foo..com、foo.com.
+    EMPTY_LABEL = 'empty_label'
+    # 字段超过最大长度
+    LABEL_TOO_LONG = 'label_too_long'
+    # 国际化域名字段无法转换为 punycode
+    BAD_IDN_LABEL = 'bad_idn_label'
+    # 顶级域不存在
+    UNKNOWN_TLD = 'unknown_tld'
+    # 只有公共后缀，没有域名字段
+    SUFFIX_ONLY = 'suffix_only'
+    # 域名字段无效
+    BAD_DOMAIN_LABEL = 'bad_domain_label'
+    # 主机字段无效
+    BAD_HOST_LABEL = 'bad_host_label'
+
+
+class DomainValidation(NamedTuple):
+    """
+    域名验证结果
+    """
+    # 无效原因，有效时为 None
+    error: Optional[DomainError]
+    # 无效的字段，与具体字段无关的原因（比如 TOO_LONG）为空字符串
+    label: str = ''
 
-    # 只对标准代码做正则匹配，忽略类似中文编码
-    if is_ascii_str(s):
-        import re
+    @property
+    def is_valid(self) -> bool:
+        return self.error is None
 
-        return bool(re.match(r'^[a-z0-9-]+$', s))
+    def __bool__(self) -> bool:
+        return self.error is None
 
-    return True
 
+_VALID = DomainValidation(None)
+_INVALID = {error: DomainValidation(error) for error in DomainError}
 
-def to_domain_obj(domain: str):
+
+@lru_cache(maxsize=DOMAIN_CACHE_SIZE)
+def _check_domain(domain: str) -> tuple[Optional[DomainError], str, tuple[str, ...], int]:
     """
-    转换域名字符串为Domain对象
+    验证域名字符串，不创建 Domain 对象，不输出日志。结果被缓存，重复的输入只验证一次
     :param domain:
-    :return:
+    :return: 无效原因、无效的字段、域名字段、公共后缀字段数量
     """
-    if not domain or len(domain) > DOMAIN_NAME_MAX_SIZE or domain[0] == DOMAIN_SEPARATOR:
-        return None
+    if not domain:
+        return DomainError.EMPTY, '', (), 0
 
-    domain_obj = Domain(domain)
-    feilds = domain.split(DOMAIN_SEPARATOR)
+    if len(domain) > DOMAIN_NAME_MAX_SIZE:
+        return DomainError.TOO_LONG, '', (), 0
+
+    if domain[0] == DOMAIN_SEPARATOR:
+        return DomainError.LEADING_DOT, '', (), 0
+
+    feilds = tuple(domain.split(DOMAIN_SEPARATOR))
     feilds_len = len(feilds)
 
     if feilds_len < 2:
-        hlog.error('无效的域名（%s）' % domain)
-        return None
+        return DomainError.TOO_FEW_LABELS, '', feilds, 0
+
+    # 国际化域名字段转换为 punycode 后验证，ascii_feilds 与 feilds 一一对应
+    if domain.isascii():
+        ascii_feilds = feilds
+        ascii_name = domain
+    else:
+        ascii_feilds = _to_ascii_feilds(feilds)
+        ascii_name = DOMAIN_SEPARATOR.join(ascii_feilds)
+
+    # 顶级域数据中同时存在国际化域名和 punycode 两种形式的顶级域，按原始形式找不到时按另一种形式查找
+    if ascii_feilds is not feilds:
+        alt_feilds = ascii_feilds
+    elif IDNA_PREFIX in domain:
+        alt_feilds = _to_unicode_feilds(feilds)
+    else:
+        alt_feilds = None
 
     # foo.com
-    if feilds_len == 2:
-        if _is_valid_dn(feilds[0]) and _is_valid_tld(feilds[1]):
-            domain_obj.feild_domain_name = feilds[0]
-            domain_obj.add_feild_top_level_domain(_top_level_domain_feild_builder(feilds[1]))
+    if feilds_len == 2 and _is_valid_dn(ascii_feilds[0]) and \
+            (_is_valid_tld(feilds[1]) or alt_feilds is not None and _is_valid_tld(alt_feilds[1])):
+        return None, '', feilds, 1
 
-            return domain_obj
+    # www.foo.com foo.com.cn foo.co.uk
 
-    # www.foo.com foo.com.cn
+    # 最长的公共后缀
+    index = (_tld_db or _init_tld_db())[1]
+    suffix_len = index.match(feilds)
 
-    tmp = feilds[-1]
-    if not _is_valid_tld(tmp):
-        hlog.error('无效的域名（%s）：%s' % (domain, tmp))
-        return None
+    if suffix_len == 0 and alt_feilds is not None:
+        suffix_len = index.match(alt_feilds)
 
-    tmp = feilds[-2]
-    if _is_valid_tld(tmp):
-        # foo.com.cn
+    # 一次正则匹配验证全部字段，匹配时跳过逐个字段的验证
+    is_syntax_valid = suffix_len > 0 and len(ascii_name) <= DOMAIN_NAME_MAX_SIZE and \
+        _DOMAIN_RE.fullmatch(ascii_name) is not None
 
-        # .com
-        domain_obj.add_feild_top_level_domain(_top_level_domain_feild_builder(tmp))
-        host_index = 3
-    else:
-        # www.foo.com
-        host_index = 2
+    if not is_syntax_valid:
+        for tmp, ascii_tmp in zip(feilds, ascii_feilds):
+            if not tmp:
+                return DomainError.EMPTY_LABEL, '', feilds, 0
+
+            if len(tmp) > FEILD_MAX_SIZE:
+                return DomainError.LABEL_TOO_LONG, tmp, feilds, 0
+
+            if not ascii_tmp or len(ascii_tmp) > FEILD_MAX_SIZE:
+                return DomainError.BAD_IDN_LABEL, tmp, feilds, 0
+
+        if len(ascii_name) > DOMAIN_NAME_MAX_SIZE:
+            return DomainError.TOO_LONG, '', feilds, 0
+
+    if suffix_len == 0:
+        return DomainError.UNKNOWN_TLD, feilds[-1], feilds, 0
+
+    # 后缀数据中没有的二级后缀，倒数第二个字段也是顶级域时视为二级后缀，比如 foo.com.tw
+    if suffix_len == 1 and (_is_valid_tld(feilds[-2]) or alt_feilds is not None and _is_valid_tld(alt_feilds[-2])):
+        suffix_len = 2
 
-    # .cn
-    tmp = feilds[-1]
-    domain_obj.add_feild_top_level_domain(_top_level_domain_feild_builder(tmp))
+    host_index = suffix_len + 1
+
+    if host_index > feilds_len:
+        return DomainError.SUFFIX_ONLY, '', feilds, suffix_len
 
     # 检查域名字段
     # foo
-    tmp = feilds[feilds_len - host_index]
+    i = feilds_len - host_index
+
+    if not _is_valid_dn(ascii_feilds[i]):
+        return DomainError.BAD_DOMAIN_LABEL, feilds[i], feilds, suffix_len
+
+    if not is_syntax_valid:
+        for tmp, ascii_tmp in zip(feilds[:i], ascii_feilds[:i]):
+            if not _is_valid_host(ascii_tmp):
+                return DomainError.BAD_HOST_LABEL, tmp, feilds, suffix_len
 
-    if _is_valid_dn(tmp):
-        domain_obj.feild_domain_name = tmp
+    return None, '', feilds, suffix_len
+
+
+def _parse_domain(domain: str) -> tuple[Optional[Domain], Optional[DomainError], str]:
+    """
+    解析域名字符串，不输出日志
+    :param domain:
+    :return: Domain 对象（无效时为 None）、无效原因、无效的字段
+    """
+    error, feild, feilds, suffix_len = _check_domain(domain)
+
+    if error is not None:
+        return None, error, feild
+
+    host_len = len(feilds) - suffix_len - 1
+
+    domain_obj = Domain(domain)
+    domain_obj.feild_hosts = list(feilds[:host_len])
+    domain_obj.feild_domain_name = feilds[host_len]
+    domain_obj.feild_top_level_domains = [_top_level_domain_feild_builder(tmp) for tmp in feilds[host_len + 1:]]
+
+    return domain_obj, None, ''
+
+
+def validate_domain(domain: str) -> DomainValidation:
+    """
+    验证域名字符串，返回无效原因，不输出日志
+    :param domain:
+    :return:
+    """
+    error, feild, _, _ = _check_domain(domain)
+
+    if error is None:
+        return _VALID
+
+    return DomainValidation(error, feild) if feild else _INVALID[error]
+
+
+def is_valid_domain(domain: str) -> bool:
+    """
+    域名字符串是否有效，不输出日志
+    :param domain:
+    :return:
+    """
+    return _check_domain(domain)[0] is None
+
+
+def normalize_domain(domain: str) -> Optional[str]:
+    """
+    规范化域名：去除首尾空白字符和末尾的点，转换为小写，国际化域名字段转换为 punycode，比如 WWW.时尚.中国. 转换为
+    www.xn--9et52u.xn--fiqs8s
+    :param domain:
+    :return: 规范化的 ASCII 域名，无效时返回 None
+    """
+    domain = domain.strip().rstrip(DOMAIN_SEPARATOR).lower()
+
+    if not domain.isascii():
+        feilds = _to_ascii_feilds(tuple(domain.split(DOMAIN_SEPARATOR)))
+
+        if not all(feilds):
+            return None
+
+        domain = DOMAIN_SEPARATOR.join(feilds)
+
+    return domain if _check_domain(domain)[0] is None else None
+
+
+def domain_to_unicode(domain: str) -> str:
+    """
+    punycode 字段转换为国际化域名字段，比如 www.xn--9et52u.xn--fiqs8s 转换为 www.时尚.中国，无法转换的字段保持不变
+    :param domain:
+    :return:
+    """
+    if IDNA_PREFIX not in domain:
+        return domain
+
+    return DOMAIN_SEPARATOR.join(_to_unicode_feilds(tuple(domain.split(DOMAIN_SEPARATOR))))
+
+
+def to_domain_obj(domain: str):
+    """
+    转换域名字符串为Domain对象
+    :param domain:
+    :return:
+    """
+    domain_obj, error, feild = _parse_domain(domain)
+
+    if error is None or error in (DomainError.EMPTY, DomainError.TOO_LONG, DomainError.LEADING_DOT):
+        return domain_obj
+
+    if feild:
+        hlog.error('无效的域名（%s）：%s' % (domain, feild))
     else:
-        hlog.error('无效的域名（%s）：%s' % (domain, tmp))
+        hlog.error('无效的域名（%s）' % domain)
+
+    return None
+
+
+def _to_domain_name(domain: str, feilds: tuple[str, ...], suffix_len: int) -> DomainName:
+    host_len = len(feilds) - suffix_len - 1
+    suffix = DOMAIN_SEPARATOR + DOMAIN_SEPARATOR.join(feilds[host_len + 1:])
+
+    return DomainName(domain, DOMAIN_SEPARATOR.join(feilds[:host_len]), feilds[host_len] + suffix, suffix)
+
+
+@lru_cache(maxsize=DOMAIN_CACHE_SIZE)
+def parse_domain_name(domain: str) -> Optional[DomainName]:
+    """
+    转换域名字符串为不可变的 DomainName 对象，不输出日志。结果被缓存，重复的输入返回同一对象
+    :param domain:
+    :return: 无效时返回 None，原因通过 validate_domain 获取
+    """
+    error, _, feilds, suffix_len = _check_domain(domain)
+
+    if error is not None:
         return None
 
-    host_len = feilds_len - host_index
+    return _to_domain_name(domain, feilds, suffix_len)
+
+
+def clear_domain_cache() -> None:
+    """
+    清空域名解析结果缓存，顶级域数据变化后需要调用
+    :return:
+    """
+    _check_domain.cache_clear()
+    parse_domain_name.cache_clear()
+
+
+# 批量解析时每个任务包含的域名数量
+DOMAIN_CHUNK_SIZE = 10000
+
+
+class DomainRecord(NamedTuple):
+    """
+    批量解析结果，无效域名的 host、domain_name、suffix 为空字符串
+    """
+    # 输入的域名字符串
+    name: str
+    # 主机，比如 www.test
+    host: str
+    # 注册域名，比如 foo.com.cn
+    domain_name: str
+    # 公共后缀，比如 .com.cn
+    suffix: str
+    # 无效原因，有效时为 None
+    error: Optional[DomainError]
+
+    @property
+    def is_valid(self) -> bool:
+        return self.error is None
+
+
+@dataclass
+class DomainParseStats:
+    total: int = 0
+    valid: int = 0
+    invalid: int = 0
+    # 按无效原因统计的数量
+    by_reason: Counter = field(default_factory=Counter)
+
+
+def _init_parse_worker(source: Optional[tuple[str, bool]]) -> None:
+    """
+    工作进程初始化：载入与父进程相同的顶级域数据。spawn、forkserver 方式启动的进程重新导入模块，
+    不会继承父进程中 load_tld_db() 载入的数据
+    :param source: 父进程的 (文件路径, 是否使用 mmap)，None 表示父进程尚未载入
+    """
+    if source is not None and source != _tld_db_source:
+        load_tld_db(*source)
+
+
+def _parse_chunk(domains: list[str]) -> list[DomainRecord]:
+    records = []
+
+    for domain in domains:
+        error, _, feilds, suffix_len = _check_domain(domain)
 
-    for i in range(0, host_len):
-        tmp = feilds[i]
+        if error is not None:
+            records.append(DomainRecord(domain, '', '', '', error))
+            continue
 
-        if _is_valid_host(tmp):
-            domain_obj.add_feild_host(tmp)
+        domain_obj = _to_domain_name(domain, feilds, suffix_len)
+        records.append(DomainRecord(domain, domain_obj.host_name, domain_obj.domain_name, domain_obj.suffix, None))
+
+    return records
+
+
+class DomainBulkParser:
+    """
+    批量解析域名，按输入顺序以生成器方式返回 DomainRecord，迭代过程中更新 stats。
+    输入按 chunk_size 分块，分发到进程池并行解析，同时提交的任务数量不超过进程数的两倍。
+    无效域名不输出错误日志，通过 DomainRecord.error 和 stats.by_reason 获取原因。
+    """
+
+    def __init__(self,
+                 source: Union[Iterable[str], str, os.PathLike],
+                 workers: Optional[int] = None,
+                 chunk_size: int = DOMAIN_CHUNK_SIZE,
+                 encoding: str = 'UTF-8',
+                 mp_context=None):
+        """
+        :param source: 域名字符串序列，或每行一个域名的文件路径（逐行读取，去除首尾空白字符）
+        :param workers: 进程数量，默认为 CPU 核数，小于等于 1 时在当前进程中解析
+        :param chunk_size: 每个任务包含的域名数量
+        :param encoding: 文件编码
+        :param mp_context: 进程池使用的 multiprocessing 上下文，默认同 ProcessPoolExecutor。
+                           工作进程使用当前 load_tld_db() 载入的顶级域数据
+        """
+        self.source = source
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.encoding = encoding
+        self.mp_context = mp_context
+        self.stats = DomainParseStats()
+
+    def _iter_source(self) -> Iterator[str]:
+        if isinstance(self.source, (str, os.PathLike)):
+            with open(self.source, encoding=self.encoding, errors='replace') as f:
+                for line in f:
+                    yield line.strip()
         else:
-            hlog.error('无效的域名（%s）：%s' % (domain, tmp))
-            return None
+            yield from self.source
+
+    def _iter_chunks(self) -> Iterator[list[str]]:
+        it = self._iter_source()
+
+        while chunk := list(islice(it, self.chunk_size)):
+            yield chunk
+
+    def _iter_record_chunks(self) -> Iterator[list[DomainRecord]]:
+        if self.workers <= 1:
+            yield from map(_parse_chunk, self._iter_chunks())
+            return
 
-    return domain_obj
+        chunks = self._iter_chunks()
+        pending: deque[Future] = deque()
+
+        with ProcessPoolExecutor(max_workers=self.workers,
+                                 mp_context=self.mp_context,
+                                 initializer=_init_parse_worker,
+                                 initargs=(_tld_db_source,)) as executor:
+            try:
+                for chunk in islice(chunks, self.workers * 2):
+                    pending.append(executor.submit(_parse_chunk, chunk))
+
+                while pending:
+                    records = pending.popleft().result()
+
+                    for chunk in islice(chunks, 1):
+                        pending.append(executor.submit(_parse_chunk, chunk))
+
+                    yield records
+            finally:
+                executor.shutdown(wait=True, cancel_futures=True)
+
+    def __iter__(self) -> Iterator[DomainRecord]:
+        stats = self.stats
+
+        for records in self._iter_record_chunks():
+            for record in records:
+                stats.total += 1
+
+                if record.error is None:
+                    stats.valid += 1
+                else:
+                    stats.invalid += 1
+                    stats.by_reason[record.error] += 1
+
+                yield record
+
+
+def parse_domains(source: Union[Iterable[str], str, os.PathLike], **kwargs) -> DomainBulkParser:
+    """
+    批量解析域名，参数见 DomainBulkParser
+    :param source: 域名字符串序列，或每行一个域名的文件路径
+    :return: 可迭代的 DomainBulkParser，迭代结束后 stats 为统计结果
+    """
+    return DomainBulkParser(source, **kwargs)
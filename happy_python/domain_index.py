@@ -0,0 +1,345 @@
+"""
+按字段反向存储的域名索引
+
+将 to_domain_obj、parse_domain_name、parse_domains 的解析结果按反向字段（比如 www.foo.com.cn 存储为
+cn -> com -> foo -> www）存入树中，每个节点记录子树中的域名数量：
+
+    - 去重：重复添加同一域名不改变索引
+    - 子树查询：count('foo.com.cn') 只与查询的字段数 k 有关，为 O(k)；find('foo.com.cn') 为 O(k + 结果数量)
+    - 按下一级字段计数：children('com.cn') 返回 .com.cn 下每个注册域名的域名数量
+    - 按注册域名计数：domain_counts() 返回每个注册域名（比如 foo.com.cn）下的域名数量
+
+索引可以通过 save() 保存到文件，通过 DomainIndex.load() 载入，在多次运行之间复用。
+索引文件为 UTF-8 文本，与 Python 版本无关，载入时先检查首行再读取数据，由域名列表重建各节点的计数：
+    # happy-python domain-index version=2 names=<域名数量> domains=<注册域名数量>
+    <域名>                    （每行一个）
+    <注册域名>\t<域名数量>     （每行一个）
+
+快速开始
+    >>> from happy_python import DomainIndex, to_domain_obj
+
+    >>> index = DomainIndex(to_domain_obj(d) for d in ('www.foo.com.cn', 'mail.foo.com.cn', 'bar.com.cn'))
+    >>> index.count('foo.com.cn')
+    2
+    >>> index.children('com.cn')
+    {'foo': 2, 'bar': 1}
+"""
+import gc
+import os
+from itertools import islice
+from typing import Iterable, Iterator, Union
+
+from happy_python.domain import DOMAIN_SEPARATOR, Domain, DomainName, DomainRecord, parse_domain_name
+
+# 索引文件格式版本
+DOMAIN_INDEX_VERSION = 2
+
+_HEADER_PREFIX = '# happy-python domain-index'
+
+# 节点为字典：下一级字段 -> 子节点，键 _META（域名字段不能为空，不会与字段冲突）的值为
+# 子树中的域名数量 << 1 | 是否为已添加的域名。每个节点只有一个字典对象，减少内存占用和序列化耗时
+_META = ''
+
+DomainLike = Union[Domain, DomainName, DomainRecord, str]
+
+
+def _new_node() -> dict:
+    return {_META: 0}
+
+
+def _count(node: dict) -> int:
+    return node[_META] >> 1
+
+
+def _is_terminal(node: dict) -> bool:
+    return bool(node[_META] & 1)
+
+
+def _children(node: dict) -> Iterator[tuple[str, dict]]:
+    return ((feild, child) for feild, child in node.items() if feild)
+
+
+def _reversed_feilds(suffix: str) -> list[str]:
+    suffix = suffix.strip(DOMAIN_SEPARATOR)
+    return suffix.split(DOMAIN_SEPARATOR)[::-1] if suffix else []
+
+
+def _to_names(domain: DomainLike) -> tuple[str, str]:
+    """
+    :return: 域名字符串、注册域名
+    """
+    if isinstance(domain, Domain):
+        return domain.name, domain.get_domain_name()
+
+    if isinstance(domain, str):
+        domain_obj = parse_domain_name(domain)
+
+        if domain_obj is None:
+            raise ValueError('无效的域名：%s' % domain)
+
+        return domain_obj.name, domain_obj.domain_name
+
+    if isinstance(domain, DomainRecord) and not domain.is_valid:
+        raise ValueError('无效的域名（%s）：%s' % (domain.name, domain.error.value))
+
+    return domain.name, domain.domain_name
+
+
+class DomainIndex:
+    """
+    按字段反向存储的域名索引，非线程安全
+    """
+
+    def __init__(self, domains: Iterable[DomainLike] = ()):
+        """
+        :param domains: Domain、DomainName、DomainRecord 对象或域名字符串，忽略 None（to_domain_obj 的无效结果）
+                        和无效的 DomainRecord
+        """
+        self._root = _new_node()
+        # 注册域名 -> 域名数量
+        self._domains: dict[str, int] = {}
+
+        self.update(domains)
+
+    def add(self, domain: DomainLike) -> bool:
+        """
+        添加域名
+        :param domain: Domain、DomainName、DomainRecord 对象或域名字符串
+        :return: 域名是否为新添加的，已存在时返回 False
+        """
+        name, domain_name = _to_names(domain)
+
+        if not self._insert(_reversed_feilds(name)):
+            return False
+
+        self._domains[domain_name] = self._domains.get(domain_name, 0) + 1
+
+        return True
+
+    def _insert(self, feilds: list[str]) -> bool:
+        """
+        插入反向字段，不修改注册域名计数
+        :return: 是否为新添加的域名
+        """
+        # 先查找，已存在时不修改计数
+        node = self._root
+
+        for feild in feilds:
+            node = node.get(feild)
+
+            if node is None:
+                break
+        else:
+            if _is_terminal(node):
+                return False
+
+        node = self._root
+        node[_META] += 2
+
+        for feild in feilds:
+            child = node.get(feild)
+
+            if child is None:
+                child = node[feild] = _new_node()
+
+            node = child
+            node[_META] += 2
+
+        node[_META] |= 1
+
+        return True
+
+    def update(self, domains: Iterable[DomainLike]) -> int:
+        """
+        批量添加域名，忽略 None 和无效的 DomainRecord（parse_domains 的无效结果）
+        :param domains: 同 __init__
+        :return: 新添加的域名数量
+        """
+        added = 0
+
+        for domain in domains:
+            if domain is None or isinstance(domain, DomainRecord) and not domain.is_valid:
+                continue
+
+            if self.add(domain):
+                added += 1
+
+        return added
+
+    def _find_node(self, suffix: str):
+        node = self._root
+
+        for feild in _reversed_feilds(suffix):
+            node = node.get(feild)
+
+            if node is None:
+                return None
+
+        return node
+
+    def __len__(self) -> int:
+        return _count(self._root)
+
+    def __contains__(self, name: str) -> bool:
+        node = self._find_node(name)
+        return node is not None and _is_terminal(node)
+
+    def __iter__(self) -> Iterator[str]:
+        return self.find('')
+
+    def count(self, suffix: str) -> int:
+        """
+        后缀下的域名数量（包含后缀本身）
+        :param suffix: 比如 foo.com.cn、.com.cn，空字符串表示全部
+        :return:
+        """
+        node = self._find_node(suffix)
+        return 0 if node is None else _count(node)
+
+    def find(self, suffix: str) -> Iterator[str]:
+        """
+        后缀下的全部域名（包含后缀本身），深度优先顺序
+        :param suffix: 比如 foo.com.cn、.com.cn，空字符串表示全部
+        :return:
+        """
+        node = self._find_node(suffix)
+
+        if node is None:
+            return
+
+        stack = [(node, _reversed_feilds(suffix))]
+
+        while stack:
+            node, feilds = stack.pop()
+
+            if _is_terminal(node):
+                yield DOMAIN_SEPARATOR.join(reversed(feilds))
+
+            for feild, child in _children(node):
+                stack.append((child, feilds + [feild]))
+
+    def children(self, suffix: str = '') -> dict[str, int]:
+        """
+        后缀下一级字段及其子树中的域名数量，比如 children('com.cn') 返回 .com.cn 下每个注册域名的域名数量
+        :param suffix: 比如 com.cn，空字符串表示顶级域
+        :return: 字段 -> 域名数量
+        """
+        node = self._find_node(suffix)
+
+        if node is None:
+            return {}
+
+        return {feild: _count(child) for feild, child in _children(node)}
+
+    def domain_counts(self) -> dict[str, int]:
+        """
+        每个注册域名（比如 foo.com.cn）下的域名数量
+        :return:
+        """
+        return dict(self._domains)
+
+    def save(self, filename: str) -> None:
+        """
+        保存索引到文件，先写入临时文件再替换
+        :param filename:
+        :return:
+        """
+        tmp = '%s.%d.tmp' % (filename, os.getpid())
+
+        with open(tmp, 'w', encoding='UTF-8', newline='\n') as f:
+            f.write('%s version=%d names=%d domains=%d\n' % (_HEADER_PREFIX, DOMAIN_INDEX_VERSION, len(self),
+                                                            len(self._domains)))
+
+            # 深度优先遍历，每个节点只拼接一次字符串
+            stack = [(child, feild) for feild, child in _children(self._root)]
+            lines = []
+            append = stack.append
+
+            while stack:
+                node, name = stack.pop()
+
+                for feild, child in node.items():
+                    if feild:
+                        append((child, feild + DOMAIN_SEPARATOR + name))
+                    elif child & 1:
+                        # 键 _META 的值
+                        lines.append(name)
+
+            if lines:
+                f.write('\n'.join(lines))
+                f.write('\n')
+
+            for domain_name, count in self._domains.items():
+                f.write('%s\t%d\n' % (domain_name, count))
+
+        os.replace(tmp, filename)
+
+    @classmethod
+    def load(cls, filename: str) -> 'DomainIndex':
+        """
+        从文件载入索引
+        :param filename:
+        :return:
+        :raise ValueError: 文件格式或版本无效
+        """
+        with open(filename, encoding='UTF-8', newline='\n') as f:
+            # 先检查首行，不是索引文件时不读取其余内容
+            header = f.readline(len(_HEADER_PREFIX) + 128).rstrip('\n')
+
+            if not header.startswith(_HEADER_PREFIX + ' '):
+                raise ValueError('无效的域名索引文件：%s' % filename)
+
+            try:
+                options = dict(tmp.split('=', 1) for tmp in header[len(_HEADER_PREFIX):].split())
+                version, names, domains = int(options['version']), int(options['names']), int(options['domains'])
+            except (KeyError, ValueError):
+                raise ValueError('无效的域名索引文件：%s' % filename) from None
+
+            if version != DOMAIN_INDEX_VERSION:
+                raise ValueError('不支持的域名索引文件版本（%d）：%s' % (version, filename))
+
+            index = cls()
+
+            # 创建大量字典时暂停垃圾回收，避免反复触发的全量扫描
+            gc_enabled = gc.isenabled()
+            gc.disable()
+
+            try:
+                root = index._root
+                added = 0
+
+                # 文件中的域名不重复，直接沿路径增加计数
+                for line in islice(f, names):
+                    feilds = _reversed_feilds(line.rstrip('\n'))
+
+                    if not feilds:
+                        break
+
+                    node = root
+                    node[_META] += 2
+
+                    for feild in feilds:
+                        child = node.get(feild)
+
+                        if child is None:
+                            child = node[feild] = {_META: 0}
+
+                        node = child
+                        node[_META] += 2
+
+                    node[_META] |= 1
+                    added += 1
+
+                for line in islice(f, domains):
+                    domain_name, count = line.rstrip('\n').split('\t')
+                    index._domains[domain_name] = int(count)
+            except ValueError:
+                raise ValueError('域名索引文件不完整：%s' % filename) from None
+            finally:
+                if gc_enabled:
+                    gc.enable()
+
+        if added != names or len(index._domains) != domains:
+            raise ValueError('域名索引文件不完整：%s' % filename)
+
+        return index
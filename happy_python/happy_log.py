@@ -35,6 +35,14 @@
     >>> hlog.var('item_count', len(['a']))
     >>> hlog.exit_func('process_data')
 
+    # 6) 区间计时（上下文管理器或装饰器），可导出 Chrome trace_event JSON
+    >>> with hlog.span('load_data', source='db'):
+    ...     pass
+
+    # 7) 性能剖析（cProfile 或 tracemalloc），结果输出到日志
+    >>> with hlog.profile('load_data', top_n=10):
+    ...     pass
+
 构造函数参数
     reset: bool
         是否重置单例。传 True 时会丢弃旧实例并重新创建。
@@ -63,7 +71,7 @@ import weakref
 from dataclasses import dataclass, field
 from enum import Enum, unique
 from functools import lru_cache
-from threading import Lock, Thread
+from threading import Lock, RLock, Thread
 from typing import TypeVar, Optional, Any, Type
 
 from varname import argname
@@ -92,17 +100,30 @@ class SafeQueueListener(logging.handlers.QueueListener):
 
 @dataclass(init=False)
 class AsyncLogManager:
-    """异步日志全局管理器（线程安全单例）"""
+    """
+    异步日志全局管理器（线程安全单例）
+
+    读多写少：active_handlers、handler_pool 采用写时复制（copy-on-write），
+    写操作在 _state_lock 内生成新的字典并整体替换引用，读操作直接读取当前引用，
+    因此每条日志记录的处理路径（enqueue/fallback）不需要加锁。
+    """
     _instance: Optional['AsyncLogManager'] = None
     _lock: Lock = Lock()
+    _state_lock: RLock = RLock()
 
     log_queue: queue.Queue = field(init=False)
     queue_listener: Optional[SafeQueueListener] = field(init=False, default=None)
-    active_handlers: dict[str, list[logging.Handler]] = field(init=False, default_factory=dict)
+    active_handlers: dict[str, tuple[logging.Handler, ...]] = field(init=False, default_factory=dict)
     handler_pool: dict[str, logging.Handler] = field(init=False, default_factory=dict)
     async_enabled: bool = field(init=False, default=True)
 
     def __new__(cls) -> 'AsyncLogManager':
+        # 快速路径：实例已存在时无需加锁
+        inst = cls._instance
+
+        if inst is not None:
+            return inst
+
         with cls._lock:
             if cls._instance is None:
                 cls._instance = super().__new__(cls)
@@ -138,8 +159,8 @@ class AsyncLogManager:
             time.sleep(QUEUE_MONITOR_INTERVAL)
 
     def fallback(self, record: logging.LogRecord) -> None:
-        # 异步关闭或队列满时，同步处理
-        handlers = self.active_handlers.get(record.name, [])
+        # 异步关闭或队列满时，同步处理（读取不可变的 handler 元组快照，无需加锁）
+        handlers = self.active_handlers.get(record.name, ())
         for h in handlers:
             # noinspection PyBroadException
             try:
@@ -171,32 +192,52 @@ class AsyncLogManager:
                 self.queue_listener = None
 
     def register_handlers(self, logger_name: str, handlers: list[logging.Handler]) -> None:
-        self.active_handlers[logger_name] = handlers
+        with self._state_lock:
+            active_handlers = dict(self.active_handlers)
+            active_handlers[logger_name] = tuple(handlers)
+            self.active_handlers = active_handlers
 
     def unregister_handlers(self, logger_name: str) -> None:
-        if logger_name in self.active_handlers:
-            for h in self.active_handlers[logger_name]:
+        with self._state_lock:
+            active_handlers = dict(self.active_handlers)
+            handlers = active_handlers.pop(logger_name, ())
+            self.active_handlers = active_handlers
+
+            for h in handlers:
                 # noinspection PyBroadException
                 try:
                     h.close()
                 except Exception:
                     pass
-            del self.active_handlers[logger_name]
 
-        if not self.active_handlers:
-            self.stop_listener()
+            if not active_handlers:
+                self.stop_listener()
 
     def get_or_create_handler(self, key: str, factory: Any) -> logging.Handler:
-        if key not in self.handler_pool:
-            self.handler_pool[key] = factory()
+        # 快速路径：无锁读取
+        handler = self.handler_pool.get(key)
+
+        if handler is not None:
+            return handler
+
+        with self._state_lock:
+            # 双重检查，避免多个线程重复创建 handler
+            handler = self.handler_pool.get(key)
 
-        return self.handler_pool[key]
+            if handler is None:
+                handler = factory()
+                handler_pool = dict(self.handler_pool)
+                handler_pool[key] = handler
+                self.handler_pool = handler_pool
+
+        return handler
 
     def set_async_enabled(self, enabled: bool) -> None:
-        self.async_enabled = enabled
+        with self._state_lock:
+            self.async_enabled = enabled
 
-        if not enabled:
-            self.stop_listener()
+            if not enabled:
+                self.stop_listener()
 
 
 class FallbackQueueHandler(logging.handlers.QueueHandler):
@@ -267,7 +308,7 @@ def to_happy_log_level(level: int) -> HappyLogLevel:
 
 class SingletonMeta(type):
     _instances: weakref.WeakValueDictionary = weakref.WeakValueDictionary()
-    _lock = Lock()
+    _lock = RLock()
     _log_ini = None
     _logger_name = None
 
@@ -276,11 +317,19 @@ class SingletonMeta(type):
         log_ini = kwargs.get('log_ini')
         logger_name = kwargs.get('logger_name')
 
-        # 已经初始化过，但是配置文件发生变化
-        if not reset_flag and cls._instances.get(cls) and (cls._log_ini != log_ini or cls._logger_name != logger_name):
-            reset_flag = True
+        # 快速路径：实例已存在且配置未变化时无需加锁
+        if not reset_flag:
+            inst = cls._instances.get(cls)
+
+            if inst is not None and inst._singleton_key == (log_ini, logger_name):
+                return inst
 
         with cls._lock:
+            # 已经初始化过，但是配置文件发生变化
+            if not reset_flag and cls._instances.get(cls) and (cls._log_ini != log_ini or
+                                                               cls._logger_name != logger_name):
+                reset_flag = True
+
             if reset_flag:
                 # 删除旧实例，下次创建新的
                 cls._instances.pop(cls, None)
@@ -290,6 +339,8 @@ class SingletonMeta(type):
             if inst is None:
                 # 第一次创建或被 reset 后重新创建
                 inst = super().__call__(*args, **kwargs)
+                # 实例上保存创建时的配置，供快速路径一次性读取比较
+                inst._singleton_key = (log_ini, logger_name)
                 cls._instances[cls] = inst
                 cls._log_ini = log_ini
                 cls._logger_name = logger_name
@@ -306,6 +357,8 @@ class HappyLog(metaclass=SingletonMeta):
     logger: logging.Logger | None = field(default=None, init=False)
     _async_mgr: AsyncLogManager = field(default_factory=AsyncLogManager, init=False, repr=False)
     _is_default_config: bool = False
+    _config_lock: RLock = field(default_factory=RLock, init=False, repr=False, compare=False)
+    _singleton_key: tuple = field(default=(None, None), init=False, repr=False, compare=False)
 
     def __post_init__(self) -> None:
         self._update_logger()
@@ -343,19 +396,29 @@ class HappyLog(metaclass=SingletonMeta):
         if isinstance(log_level, int):
             log_level = to_happy_log_level(log_level)
 
-        self.log_level = log_level
+        with self._config_lock:
+            self.log_level = log_level
 
-        if self.logger:
-            self.logger.setLevel(log_level.value)
+            if self.logger:
+                self.logger.setLevel(log_level.value)
 
-        if self._is_default_config:
-            self._load_default_config()
+            if self._is_default_config:
+                self._load_default_config()
+
+    def is_enabled(self, log_level: HappyLogLevel) -> bool:
+        """
+        指定日志级别是否启用，用于避免为不会输出的日志拼接大字符串
+        :param log_level:
+        :return:
+        """
+        return self.logger.isEnabledFor(log_level.value)
 
     def load_config(self) -> None:
-        if self.log_ini:
-            self._load_ini_config()
-        else:
-            self._load_default_config()
+        with self._config_lock:
+            if self.log_ini:
+                self._load_ini_config()
+            else:
+                self._load_default_config()
 
     def _load_ini_config(self) -> None:
         self._is_default_config = False
@@ -436,6 +499,28 @@ class HappyLog(metaclass=SingletonMeta):
     def exit_func(self, func_name: str) -> None:
         self.logger.trace('Exit function: %s', func_name)
 
+    def span(self, name: str, **attrs: Any) -> 'HappySpan':
+        """
+        创建跟踪区间，可作为上下文管理器或装饰器使用，详见 happy_python.happy_trace
+        :param name: 区间名称
+        :param attrs: 附加属性，导出到 trace_event 的 args 中
+        :return:
+        """
+        from happy_python.happy_trace import HappySpan
+
+        return HappySpan(self.logger, name, attrs)
+
+    def profile(self, name: str = '', **kwargs: Any) -> 'HappyProfiler':
+        """
+        创建性能剖析器，可作为上下文管理器或装饰器使用，详见 happy_python.happy_profile
+        :param name: 剖析名称
+        :param kwargs: HappyProfiler 的其他参数，比如 mode、top_n、level
+        :return:
+        """
+        from happy_python.happy_profile import HappyProfiler
+
+        return HappyProfiler(self, name, **kwargs)
+
     def var(self, var_name: str, var_value: Any) -> None:
         self.logger.trace('var->%s=%s', var_name, var_value)
 
@@ -0,0 +1,246 @@
+"""
+HappyLog 的 asyncio 集成
+
+    - LoopSafeQueueHandler: 只把日志记录放入非阻塞队列，队列满时丢弃并计数，从不阻塞事件循环
+    - HappyAsyncLog: 可等待的日志接口。install() 后 logger 原有的 handler 都转移到后台线程中执行，
+      flush() 通过 loop.call_soon_threadsafe 通知事件循环，等待已提交的日志全部输出
+    - LoopLagMonitor: 事件循环延迟监控，循环被阻塞超过阈值时输出警告日志
+
+快速开始
+    >>> from happy_python import HappyLog
+    >>> from happy_python.happy_log_asyncio import HappyAsyncLog, LoopLagMonitor
+    >>> hlog = HappyLog()
+
+    >>> async def main():
+    ...     async with HappyAsyncLog(hlog) as alog, LoopLagMonitor(hlog, threshold=0.1):
+    ...         await alog.info('Service started.')
+    ...         await alog.flush()
+"""
+import asyncio
+import logging
+import logging.handlers
+import queue
+from typing import Any, Optional
+
+from happy_python.happy_log import HappyLog, SafeQueueListener, TRACE_LEVEL_NUM
+
+# 非阻塞队列默认最大长度
+ASYNCIO_QUEUE_MAXSIZE = 10000
+
+# 事件循环延迟监控默认阈值和检测间隔（秒）
+LOOP_LAG_THRESHOLD = 0.1
+LOOP_LAG_INTERVAL = 0.5
+
+
+class _FlushMarker:
+    """放入队列的刷新标记，后台线程处理到该标记时通知事件循环"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, future: asyncio.Future):
+        self.loop = loop
+        self.future = future
+
+    def done(self) -> None:
+        self.loop.call_soon_threadsafe(self._set_result)
+
+    def _set_result(self) -> None:
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class LoopSafeQueueHandler(logging.handlers.QueueHandler):
+    """
+    非阻塞 QueueHandler：使用 queue.SimpleQueue（put 从不阻塞），
+    队列长度超过 maxsize 时丢弃日志记录并计数，不回退到同步处理。
+    """
+
+    def __init__(self, log_queue: queue.SimpleQueue, maxsize: int = ASYNCIO_QUEUE_MAXSIZE):
+        super().__init__(log_queue)
+        self.maxsize = maxsize
+        self.dropped = 0
+
+    def enqueue(self, record: Any) -> None:
+        if self.maxsize > 0 and self.queue.qsize() >= self.maxsize:
+            self.dropped += 1
+            return
+
+        self.queue.put_nowait(record)
+
+
+class _LoopSafeQueueListener(SafeQueueListener):
+    def handle(self, record: Any) -> None:
+        if isinstance(record, _FlushMarker):
+            for h in self.handlers:
+                # noinspection PyBroadException
+                try:
+                    h.flush()
+                except Exception:
+                    pass
+
+            record.done()
+            return
+
+        super().handle(record)
+
+
+class HappyAsyncLog:
+    """
+    可等待的日志接口。
+
+    install() 把 logger 当前的 handler（同步模式下为实际输出的 handler，异步模式下为 FallbackQueueHandler）
+    转移到后台线程执行，logger 上只保留 LoopSafeQueueHandler，因此在事件循环中记录日志不会发生 I/O 阻塞。
+    uninstall() 输出剩余日志并恢复原有 handler。
+    """
+
+    def __init__(self, hlog: HappyLog, maxsize: int = ASYNCIO_QUEUE_MAXSIZE):
+        self.hlog = hlog
+        self.maxsize = maxsize
+        self.handler: Optional[LoopSafeQueueHandler] = None
+        self._listener: Optional[_LoopSafeQueueListener] = None
+        self._saved_handlers: list[logging.Handler] = []
+        self._dropped = 0
+
+    @property
+    def dropped(self) -> int:
+        """
+        队列满时丢弃的日志记录数量（累计）
+        :return:
+        """
+        return self._dropped + (self.handler.dropped if self.handler else 0)
+
+    def install(self) -> None:
+        if self.handler is not None:
+            return
+
+        logger = self.hlog.logger
+        log_queue = queue.SimpleQueue()
+        self._saved_handlers = list(logger.handlers)
+
+        for h in self._saved_handlers:
+            logger.removeHandler(h)
+
+        self._listener = _LoopSafeQueueListener(log_queue, *self._saved_handlers, respect_handler_level=True)
+        self._listener.start()
+        self.handler = LoopSafeQueueHandler(log_queue, self.maxsize)
+        logger.addHandler(self.handler)
+
+    def uninstall(self) -> None:
+        if self.handler is None:
+            return
+
+        logger = self.hlog.logger
+        logger.removeHandler(self.handler)
+        # stop() 会先处理完队列中剩余的日志记录
+        self._listener.stop()
+
+        for h in self._saved_handlers:
+            logger.addHandler(h)
+
+        self._dropped += self.handler.dropped
+        self.handler = None
+        self._listener = None
+        self._saved_handlers = []
+
+    async def __aenter__(self) -> 'HappyAsyncLog':
+        self.install()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> bool:
+        await self.flush()
+        self.uninstall()
+        return False
+
+    async def flush(self) -> None:
+        """
+        等待已提交的日志记录全部输出
+        :return:
+        """
+        if self.handler is None:
+            return
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        # 刷新标记不受队列长度限制
+        self.handler.queue.put_nowait(_FlushMarker(loop, future))
+        await future
+
+    def _log(self, level: int, args: tuple, sep: str) -> None:
+        logger = self.hlog.logger
+
+        if logger.isEnabledFor(level):
+            logger.log(level, sep.join(str(arg) for arg in args), stacklevel=3)
+
+    async def critical(self, *args: Any, sep: str = ' ') -> None:
+        self._log(logging.CRITICAL, args, sep)
+
+    async def error(self, *args: Any, sep: str = ' ') -> None:
+        self._log(logging.ERROR, args, sep)
+
+    async def warning(self, *args: Any, sep: str = ' ') -> None:
+        self._log(logging.WARNING, args, sep)
+
+    async def info(self, *args: Any, sep: str = ' ') -> None:
+        self._log(logging.INFO, args, sep)
+
+    async def debug(self, *args: Any, sep: str = ' ') -> None:
+        self._log(logging.DEBUG, args, sep)
+
+    async def trace(self, *args: Any, sep: str = ' ') -> None:
+        self._log(TRACE_LEVEL_NUM, args, sep)
+
+
+class LoopLagMonitor:
+    """
+    事件循环延迟监控：每隔 interval 秒调度一次，实际唤醒时间比预期晚 threshold 秒以上时输出警告日志
+    """
+
+    def __init__(self, hlog: HappyLog, threshold: float = LOOP_LAG_THRESHOLD, interval: float = LOOP_LAG_INTERVAL):
+        self.hlog = hlog
+        self.threshold = threshold
+        self.interval = interval
+        self.stall_count = 0
+        self.max_lag = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """
+        必须在运行中的事件循环内调用
+        :return:
+        """
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run(), name='LoopLagMonitor')
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+
+        self._task.cancel()
+
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+        self._task = None
+
+    async def __aenter__(self) -> 'LoopLagMonitor':
+        self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> bool:
+        await self.stop()
+        return False
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = loop.time() - start - self.interval
+
+            if lag > self.max_lag:
+                self.max_lag = lag
+
+            if lag > self.threshold:
+                self.stall_count += 1
+                self.hlog.warning('Event loop lag %.3fs exceeds threshold %.3fs' % (lag, self.threshold))
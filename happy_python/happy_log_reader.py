@@ -0,0 +1,297 @@
+"""
+HappyLog 日志文件读取
+
+针对默认日志格式 '%(asctime)s %(process)d [%(levelname)s] %(module)s: %(message)s'
+（时间格式 '%Y-%m-%d %H:%M:%S'）的日志文件：
+
+    - 使用 mmap 映射文件，不把整个文件读入内存
+    - 按时间戳前缀二分查找起始位置（要求日志基本按时间顺序写入）
+    - 可选地生成稀疏旁路索引文件（每隔 N 秒记录一次偏移量），缩小二分查找范围
+    - 按时间范围、日志级别、进程号、模块名过滤，以生成器方式逐条返回日志记录
+
+不以时间戳开头的行（比如异常堆栈）属于上一条日志记录。
+
+快速开始
+    >>> from happy_python.happy_log_reader import HappyLogReader
+
+    >>> with HappyLogReader('app.log') as reader:
+    ...     reader.build_index(interval=60)
+    ...     for entry in reader.read(start='2024-05-01 10:00', end='2024-05-01 10:30', levels={'ERROR'}):
+    ...         print(entry.timestamp, entry.message)
+"""
+import mmap
+import os
+import re
+import struct
+from bisect import bisect_left
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterable, Iterator, Optional
+
+from happy_python.datetime import HappyDatetimeFormat
+from happy_python.happy_log import HappyLogLevel
+
+# 时间戳长度，比如 2024-05-01 10:00:00
+TIMESTAMP_SIZE = 19
+
+# 默认稀疏索引间隔（秒）
+INDEX_INTERVAL = 60
+
+# 旁路索引文件后缀
+INDEX_FILE_SUFFIX = '.hidx'
+
+_INDEX_MAGIC = b'HLIDX1\n'
+# 已索引的文件大小、索引条目数量
+_INDEX_HEADER = struct.Struct('<qq')
+# 时间戳、偏移量
+_INDEX_ENTRY = struct.Struct('<%dsq' % TIMESTAMP_SIZE)
+
+_RECORD_HEADER_RE = re.compile(rb'(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d) (\d+) \[([A-Z]+)\] ([^:\n]*): ')
+
+
+@dataclass(frozen=True, slots=True)
+class LogEntry:
+    timestamp: str
+    pid: int
+    level: str
+    module: str
+    # 包含续行（比如异常堆栈），不含末尾换行符
+    message: str
+    # 记录在文件中的起始偏移量
+    offset: int
+
+
+def _to_bytes(s: Optional[str]) -> Optional[bytes]:
+    return s.encode('ascii') if s else None
+
+
+class HappyLogReader:
+    def __init__(self, filename: str, encoding: str = 'UTF-8'):
+        """
+        :param filename: 日志文件
+        :param encoding: 日志文件编码
+        """
+        self.filename = filename
+        self.encoding = encoding
+        self.index_filename = filename + INDEX_FILE_SUFFIX
+        self._file = None
+        self._mm: Optional[mmap.mmap] = None
+        self._size = 0
+        self._index_ts: list[bytes] = []
+        self._index_offsets: list[int] = []
+
+    def open(self) -> None:
+        if self._file is not None:
+            return
+
+        self._file = open(self.filename, 'rb')
+        self._size = os.fstat(self._file.fileno()).st_size
+
+        # 空文件无法映射
+        if self._size:
+            self._mm = mmap.mmap(self._file.fileno(), self._size, access=mmap.ACCESS_READ)
+
+        self.load_index()
+
+    def close(self) -> None:
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self) -> 'HappyLogReader':
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> bool:
+        self.close()
+        return False
+
+    def _is_record_start(self, pos: int) -> bool:
+        return _RECORD_HEADER_RE.match(self._mm, pos) is not None
+
+    def _next_line(self, pos: int) -> int:
+        """
+        pos 之后（不含 pos 所在行）下一行的起始偏移量
+        """
+        i = self._mm.find(b'\n', pos)
+        return self._size if i == -1 else i + 1
+
+    def _next_record(self, pos: int) -> int:
+        """
+        起始偏移量不小于 pos 的第一条日志记录的偏移量，不存在时返回文件大小
+        """
+        if pos > 0 and self._mm[pos - 1] != 0x0a:
+            pos = self._next_line(pos)
+
+        while pos < self._size and not self._is_record_start(pos):
+            pos = self._next_line(pos)
+
+        return pos
+
+    def _timestamp_at(self, pos: int) -> bytes:
+        return self._mm[pos:pos + TIMESTAMP_SIZE]
+
+    def seek_time(self, start: str) -> int:
+        """
+        二分查找时间戳不小于 start 的第一条日志记录
+        :param start: 时间戳前缀，比如 2024-05-01 10、2024-05-01 10:00:00
+        :return: 记录偏移量，不存在时返回文件大小
+        """
+        if self._mm is None:
+            return self._size
+
+        target = start.encode('ascii')
+        lo, hi = 0, self._size
+
+        # 使用稀疏索引缩小查找范围
+        if self._index_ts:
+            i = bisect_left(self._index_ts, target)
+
+            if i > 0:
+                lo = self._index_offsets[i - 1]
+
+            if i < len(self._index_offsets):
+                hi = self._index_offsets[i]
+
+        while lo < hi:
+            mid = (lo + hi) // 2
+            pos = self._next_record(mid)
+
+            if pos >= self._size or self._timestamp_at(pos) >= target:
+                hi = mid
+            else:
+                lo = mid + 1
+
+        return self._next_record(lo)
+
+    def build_index(self, interval: int = INDEX_INTERVAL) -> int:
+        """
+        顺序扫描日志文件，每隔 interval 秒记录一次日志记录的偏移量，写入旁路索引文件
+        :param interval: 索引间隔，单位秒
+        :return: 索引条目数量
+        """
+        self._index_ts = []
+        self._index_offsets = []
+
+        if self._mm is not None:
+            last_ts = b''
+            next_seconds = None
+            ts_format = HappyDatetimeFormat.Ymd_HMS.value
+            pos = self._next_record(0)
+
+            while pos < self._size:
+                ts = self._timestamp_at(pos)
+
+                # 同一秒内的日志记录只解析一次时间
+                if ts != last_ts:
+                    last_ts = ts
+                    seconds = datetime.strptime(ts.decode('ascii'), ts_format).timestamp()
+
+                    if next_seconds is None or seconds >= next_seconds:
+                        self._index_ts.append(ts)
+                        self._index_offsets.append(pos)
+                        next_seconds = seconds + interval
+
+                pos = self._next_record(self._next_line(pos))
+
+        with open(self.index_filename, 'wb') as f:
+            f.write(_INDEX_MAGIC)
+            f.write(_INDEX_HEADER.pack(self._size, len(self._index_ts)))
+
+            for ts, offset in zip(self._index_ts, self._index_offsets):
+                f.write(_INDEX_ENTRY.pack(ts, offset))
+
+        return len(self._index_ts)
+
+    def load_index(self) -> bool:
+        """
+        载入旁路索引文件。日志文件比索引时更小（比如被轮转）时，索引失效
+        :return: 是否载入成功
+        """
+        self._index_ts = []
+        self._index_offsets = []
+
+        try:
+            with open(self.index_filename, 'rb') as f:
+                if f.read(len(_INDEX_MAGIC)) != _INDEX_MAGIC:
+                    return False
+
+                indexed_size, count = _INDEX_HEADER.unpack(f.read(_INDEX_HEADER.size))
+
+                if indexed_size > self._size:
+                    return False
+
+                data = f.read(_INDEX_ENTRY.size * count)
+        except (FileNotFoundError, struct.error):
+            return False
+
+        for ts, offset in _INDEX_ENTRY.iter_unpack(data):
+            self._index_ts.append(ts)
+            self._index_offsets.append(offset)
+
+        return True
+
+    def read(self,
+             start: Optional[str] = None,
+             end: Optional[str] = None,
+             levels: Optional[Iterable[str | HappyLogLevel]] = None,
+             pid: Optional[int] = None,
+             module: Optional[str] = None) -> Iterator[LogEntry]:
+        """
+        按条件逐条返回日志记录
+        :param start: 起始时间戳前缀（包含）
+        :param end: 结束时间戳前缀（包含），比如 2024-05-01 10 包含 10 点内的所有记录
+        :param levels: 日志级别名称或 HappyLogLevel 集合
+        :param pid: 进程号
+        :param module: 模块名
+        :return:
+        """
+        if self._mm is None:
+            return
+
+        end_b = _to_bytes(end)
+        end_len = len(end_b) if end_b else 0
+        level_set = None if levels is None else {
+            (lvl.name if isinstance(lvl, HappyLogLevel) else lvl).encode('ascii') for lvl in levels
+        }
+        pid_b = None if pid is None else str(pid).encode('ascii')
+        module_b = _to_bytes(module)
+
+        pos = self.seek_time(start) if start else self._next_record(0)
+        mm = self._mm
+
+        while pos < self._size:
+            m = _RECORD_HEADER_RE.match(mm, pos)
+            next_pos = self._next_record(self._next_line(pos))
+            ts, record_pid, level, record_module = m.groups()
+
+            if end_b and ts[:end_len] > end_b:
+                break
+
+            if (level_set is None or level in level_set) \
+                    and (pid_b is None or record_pid == pid_b) \
+                    and (module_b is None or record_module == module_b):
+                message = mm[m.end():next_pos].rstrip(b'\r\n')
+
+                yield LogEntry(timestamp=ts.decode('ascii'),
+                               pid=int(record_pid),
+                               level=level.decode('ascii'),
+                               module=record_module.decode(self.encoding, errors='replace'),
+                               message=message.decode(self.encoding, errors='replace'),
+                               offset=pos)
+
+            pos = next_pos
+
+
+def read_log(filename: str, **kwargs) -> Iterator[LogEntry]:
+    """
+    打开日志文件并按条件逐条返回日志记录，参数同 HappyLogReader.read
+    :param filename: 日志文件
+    :return:
+    """
+    with HappyLogReader(filename) as reader:
+        yield from reader.read(**kwargs)
@@ -0,0 +1,285 @@
+"""
+性能剖析相关，剖析结果通过 HappyLog 输出
+
+    - HappyProfiler: 上下文管理器兼装饰器，使用 cProfile 或 tracemalloc 剖析代码块，输出前 N 条统计
+    - HappySampler: 可选的采样剖析线程，定期采集忙碌线程的调用栈，低开销地统计热点
+
+快速开始
+    >>> from happy_python import HappyLog
+    >>> hlog = HappyLog()
+
+    >>> with hlog.profile('load_data', top_n=10):
+    ...     load_data()
+
+    >>> @hlog.profile('parse', mode=ProfileMode.TRACEMALLOC)
+    ... def parse():
+    ...     pass
+
+    >>> with HappySampler(hlog, interval=0.01) as sampler:
+    ...     run_workload()
+    >>> sampler.report(top_n=5)
+"""
+import cProfile
+import functools
+import io
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from enum import Enum, unique
+from typing import Callable, Optional
+
+from happy_python.happy_log import HappyLog, HappyLogLevel
+
+# 单条剖析日志的最大字符数，超出部分截断
+PROFILE_MAX_CHARS = 8192
+
+# 采样剖析默认最多记录的不同调用栈数量，超出部分计入其他
+SAMPLER_MAX_STACKS = 10000
+
+# 栈顶函数名属于以下集合时视为空闲线程（等待锁、I/O 或队列），不计入采样
+SAMPLER_IDLE_FUNC_NAMES = frozenset({
+    'wait', '_wait_for_tstate_lock', 'select', 'poll', 'epoll', 'accept', 'recv', 'recv_into', 'readinto',
+})
+
+
+@unique
+class ProfileMode(Enum):
+    CPROFILE = 'cprofile'
+    TRACEMALLOC = 'tracemalloc'
+
+
+def _truncate(s: str, max_chars: int) -> str:
+    if max_chars <= 0 or len(s) <= max_chars:
+        return s
+
+    return '%s\n...(truncated %d chars)' % (s[:max_chars], len(s) - max_chars)
+
+
+class HappyProfiler:
+    """
+    使用 cProfile 或 tracemalloc 剖析代码块，结束后通过 HappyLog 输出前 top_n 条统计。
+    日志级别未启用时不做剖析。
+    """
+
+    def __init__(self,
+                 hlog: HappyLog,
+                 name: str = '',
+                 mode: ProfileMode = ProfileMode.CPROFILE,
+                 top_n: int = 20,
+                 sort_by: str = 'cumulative',
+                 level: HappyLogLevel = HappyLogLevel.INFO,
+                 max_chars: int = PROFILE_MAX_CHARS,
+                 tracemalloc_frames: int = 1):
+        """
+        :param hlog: 日志对象
+        :param name: 剖析名称，用于日志输出
+        :param mode: 剖析方式
+        :param top_n: 输出的统计条数
+        :param sort_by: cProfile 统计排序方式，参考 pstats.SortKey
+        :param level: 输出日志级别
+        :param max_chars: 单条日志的最大字符数
+        :param tracemalloc_frames: tracemalloc 保存的调用栈帧数
+        """
+        self.hlog = hlog
+        self.name = name
+        self.mode = mode
+        self.top_n = top_n
+        self.sort_by = sort_by
+        self.level = level
+        self.max_chars = max_chars
+        self.tracemalloc_frames = tracemalloc_frames
+        self._profiler: Optional[cProfile.Profile] = None
+        self._snapshot: Optional[tracemalloc.Snapshot] = None
+        self._is_tracemalloc_owner = False
+        self._start = 0.0
+        self._active = False
+
+    def __enter__(self) -> 'HappyProfiler':
+        self._active = self.hlog.logger.isEnabledFor(self.level.value)
+
+        if not self._active:
+            return self
+
+        if self.mode == ProfileMode.CPROFILE:
+            self._profiler = cProfile.Profile()
+
+            try:
+                self._profiler.enable()
+            except ValueError as e:
+                # 同一线程中已有其他剖析工具在运行
+                self.hlog.warning('Profile %s skipped: %s' % (self.name, e))
+                self._profiler = None
+                self._active = False
+                return self
+        else:
+            self._is_tracemalloc_owner = not tracemalloc.is_tracing()
+
+            if self._is_tracemalloc_owner:
+                tracemalloc.start(self.tracemalloc_frames)
+
+            self._snapshot = tracemalloc.take_snapshot()
+
+        self._start = time.perf_counter()
+
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> bool:
+        if not self._active:
+            return False
+
+        elapsed = time.perf_counter() - self._start
+
+        if self.mode == ProfileMode.CPROFILE:
+            self._profiler.disable()
+            report = self._cprofile_report()
+            self._profiler = None
+        else:
+            report = self._tracemalloc_report()
+            self._snapshot = None
+
+            if self._is_tracemalloc_owner:
+                tracemalloc.stop()
+
+        self._active = False
+
+        msg = 'Profile %s (%s, %.3fs):%s%s' % (self.name, self.mode.value, elapsed, '\n', report)
+        self.hlog.logger.log(self.level.value, _truncate(msg, self.max_chars))
+
+        return False
+
+    def _cprofile_report(self) -> str:
+        stream = io.StringIO()
+        stats = pstats.Stats(self._profiler, stream=stream)
+        stats.sort_stats(self.sort_by).print_stats(self.top_n)
+
+        return stream.getvalue().strip()
+
+    def _tracemalloc_report(self) -> str:
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ))
+        stats = snapshot.compare_to(self._snapshot, 'lineno')[:self.top_n]
+
+        return '\n'.join(str(stat) for stat in stats)
+
+    def __call__(self, func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            # 每次调用使用独立的剖析对象，支持多线程
+            with HappyProfiler(self.hlog, self.name or func.__qualname__, self.mode, self.top_n, self.sort_by,
+                               self.level, self.max_chars, self.tracemalloc_frames):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+
+class HappySampler:
+    """
+    采样剖析线程，每隔 interval 秒通过 sys._current_frames() 采集一次其他线程的调用栈。
+    栈顶处于等待状态的线程视为空闲，不计入采样。
+    """
+
+    def __init__(self,
+                 hlog: HappyLog,
+                 interval: float = 0.01,
+                 max_depth: int = 32,
+                 max_stacks: int = SAMPLER_MAX_STACKS,
+                 level: HappyLogLevel = HappyLogLevel.INFO,
+                 max_chars: int = PROFILE_MAX_CHARS):
+        """
+        :param hlog: 日志对象
+        :param interval: 采样间隔，单位秒
+        :param max_depth: 每个调用栈最多记录的帧数
+        :param max_stacks: 最多记录的不同调用栈数量
+        :param level: 输出日志级别
+        :param max_chars: 单条日志的最大字符数
+        """
+        self.hlog = hlog
+        self.interval = interval
+        self.max_depth = max_depth
+        self.max_stacks = max_stacks
+        self.level = level
+        self.max_chars = max_chars
+        self.samples: Counter = Counter()
+        self.sample_count = 0
+        self.dropped_count = 0
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._sample_loop, daemon=True, name='HappySampler')
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+
+    def __enter__(self) -> 'HappySampler':
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> bool:
+        self.stop()
+        return False
+
+    def _sample_loop(self) -> None:
+        own_tid = threading.get_ident()
+
+        while not self._stop_event.wait(self.interval):
+            self._sample_once(own_tid)
+
+    def _sample_once(self, own_tid: int) -> None:
+        # 帧引用只保存在局部变量中，函数返回后即释放
+        for tid, frame in sys._current_frames().items():
+            if tid == own_tid or frame.f_code.co_name in SAMPLER_IDLE_FUNC_NAMES:
+                continue
+
+            stack = []
+
+            while frame is not None and len(stack) < self.max_depth:
+                code = frame.f_code
+                stack.append('%s:%d(%s)' % (code.co_filename, frame.f_lineno, code.co_name))
+                frame = frame.f_back
+
+            key = tuple(stack)
+            self.sample_count += 1
+
+            if key in self.samples or len(self.samples) < self.max_stacks:
+                self.samples[key] += 1
+            else:
+                self.dropped_count += 1
+
+    def report(self, top_n: int = 10) -> None:
+        """
+        输出采样次数最多的前 top_n 个调用栈，栈顶在前
+        :param top_n:
+        :return:
+        """
+        if not self.hlog.logger.isEnabledFor(self.level.value):
+            return
+
+        lines = ['Sampler: %d samples, %d distinct stacks, %d dropped' %
+                 (self.sample_count, len(self.samples), self.dropped_count)]
+
+        for stack, n in self.samples.most_common(top_n):
+            lines.append('%d (%.1f%%):' % (n, n * 100 / self.sample_count))
+            lines.extend('    %s' % s for s in stack)
+
+        self.hlog.logger.log(self.level.value, _truncate('\n'.join(lines), self.max_chars))
+
+    def clear(self) -> None:
+        self.samples.clear()
+        self.sample_count = 0
+        self.dropped_count = 0
@@ -0,0 +1,222 @@
+"""
+区间（span）跟踪相关
+
+    - HappySpan: 上下文管理器兼装饰器（支持协程函数），使用 perf_counter_ns 记录嵌套区间耗时，
+      区间栈保存在 contextvars 中，每个线程、每个 asyncio 任务维护独立的区间栈
+    - SpanEvent: 区间结束后产生的紧凑事件，作为 LogRecord 的附加属性进入日志管道（同步或异步）
+    - ChromeTraceHandler: 收集日志管道中的区间事件，输出 Chrome trace_event JSON，
+      可直接在 chrome://tracing 或 Perfetto 中打开
+
+快速开始
+    >>> from happy_python import HappyLog
+    >>> hlog = HappyLog()
+    >>> hlog.set_level(HappyLogLevel.TRACE)
+
+    >>> with hlog.span('load_data', source='db'):
+    ...     pass
+
+    >>> @hlog.span('process')
+    ... def process():
+    ...     pass
+
+    在日志配置文件中添加 handler 即可导出：
+        [handler_traceHandler]
+        class=happy_python.happy_trace.ChromeTraceHandler
+        args=('trace.json',)
+"""
+import functools
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable, Optional
+
+from happy_python.happy_log import TRACE_LEVEL_NUM
+
+# LogRecord 上保存区间事件的属性名
+SPAN_RECORD_ATTR = 'happy_span'
+
+# 区间事件默认日志级别，与 enter_func/exit_func 保持一致
+SPAN_LOG_LEVEL = TRACE_LEVEL_NUM
+
+# 当前上下文的区间栈（区间名称），使用不可变元组，asyncio 任务创建时复制的上下文互不影响
+_span_stack: ContextVar[tuple[str, ...]] = ContextVar('happy_span_stack', default=())
+
+
+@dataclass(frozen=True, slots=True)
+class SpanEvent:
+    name: str
+    # perf_counter_ns 时间戳，只用于同一进程内的相对比较
+    start_ns: int
+    duration_ns: int
+    pid: int
+    tid: int
+    depth: int
+    parent: str = ''
+    attrs: dict = field(default_factory=dict)
+
+    def to_chrome_event(self) -> dict:
+        """
+        转换为 Chrome trace_event 的完整事件（ph=X），时间单位为微秒
+        :return:
+        """
+        args = dict(self.attrs)
+
+        if self.parent:
+            args['parent'] = self.parent
+
+        return {
+            'name': self.name,
+            'cat': 'happy_python',
+            'ph': 'X',
+            'ts': self.start_ns / 1000,
+            'dur': self.duration_ns / 1000,
+            'pid': self.pid,
+            'tid': self.tid,
+            'args': args,
+        }
+
+
+class HappySpan:
+    """
+    跟踪区间，可作为上下文管理器或装饰器使用。
+
+    日志级别未启用时不计时、不产生事件，开销只有一次 isEnabledFor 判断。
+    """
+
+    def __init__(self, logger: logging.Logger, name: str, attrs: Optional[dict] = None, level: int = SPAN_LOG_LEVEL):
+        self.logger = logger
+        self.name = name
+        self.attrs = attrs or {}
+        self.level = level
+        self._start_ns: Optional[int] = None
+        self._parent = ''
+        self._depth = 0
+        self._outer: tuple[str, ...] = ()
+
+    def __enter__(self) -> 'HappySpan':
+        if not self.logger.isEnabledFor(self.level):
+            self._start_ns = None
+            return self
+
+        stack = self._outer = _span_stack.get()
+        self._parent = stack[-1] if stack else ''
+        self._depth = len(stack)
+        _span_stack.set(stack + (self.name,))
+        self._start_ns = time.perf_counter_ns()
+
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> bool:
+        if self._start_ns is None:
+            return False
+
+        end_ns = time.perf_counter_ns()
+        _span_stack.set(self._outer)
+
+        attrs = self.attrs
+
+        if exc_type is not None:
+            attrs = dict(attrs, error=exc_type.__name__)
+
+        event = SpanEvent(name=self.name,
+                          start_ns=self._start_ns,
+                          duration_ns=end_ns - self._start_ns,
+                          pid=os.getpid(),
+                          tid=threading.get_ident(),
+                          depth=self._depth,
+                          parent=self._parent,
+                          attrs=attrs)
+        self._start_ns = None
+
+        self.logger.log(self.level, 'Span: %s %.3fms', self.name, event.duration_ns / 1000000,
+                        extra={SPAN_RECORD_ATTR: event}, stacklevel=2)
+
+        return False
+
+    def __call__(self, func: Callable) -> Callable:
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                # 区间覆盖协程的整个执行过程，而不是创建协程对象
+                with HappySpan(self.logger, self.name, self.attrs, self.level):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            # 每次调用使用独立的区间对象，支持递归和多线程
+            with HappySpan(self.logger, self.name, self.attrs, self.level):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+
+def export_chrome_trace(events: Iterable[SpanEvent], filename: str, thread_names: Optional[dict] = None) -> None:
+    """
+    将区间事件写入 Chrome trace_event JSON 文件
+    :param events: 区间事件
+    :param filename: 输出文件
+    :param thread_names: 线程ID和线程名称的映射，用于生成 thread_name 元数据事件
+    :return:
+    """
+    trace_events = [e.to_chrome_event() for e in events]
+    pid = os.getpid()
+
+    for tid, thread_name in (thread_names or {}).items():
+        trace_events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid,
+                             'args': {'name': thread_name}})
+
+    # 先写临时文件再替换，避免查看器读到写了一半的文件
+    tmp_filename = '%s.tmp' % filename
+
+    with open(tmp_filename, 'w', encoding='UTF-8') as f:
+        json.dump({'traceEvents': trace_events, 'displayTimeUnit': 'ms'}, f, ensure_ascii=False)
+
+    os.replace(tmp_filename, filename)
+
+
+class ChromeTraceHandler(logging.Handler):
+    """
+    收集日志记录中的区间事件，在 flush/close 时输出 Chrome trace_event JSON 文件。
+    非区间日志记录会被忽略；最多保留 max_events 个最新事件。
+    """
+
+    def __init__(self, filename: str, max_events: int = 1000000, level: int = logging.NOTSET):
+        super().__init__(level)
+        self.filename = os.path.abspath(filename)
+        self._events: deque[SpanEvent] = deque(maxlen=max_events)
+        self._thread_names: dict[int, str] = {}
+
+    def emit(self, record: logging.LogRecord) -> None:
+        event = getattr(record, SPAN_RECORD_ATTR, None)
+
+        if event is None:
+            return
+
+        self._events.append(event)
+        self._thread_names[event.tid] = record.threadName
+
+    def get_events(self) -> list[SpanEvent]:
+        return list(self._events)
+
+    def flush(self) -> None:
+        self.acquire()
+
+        try:
+            if self._events:
+                export_chrome_trace(self._events, self.filename, self._thread_names)
+        finally:
+            self.release()
+
+    def close(self) -> None:
+        try:
+            self.flush()
+        finally:
+            super().close()
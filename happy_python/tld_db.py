@@ -0,0 +1,335 @@
+"""
+预编译的公共后缀（顶级域）数据库
+
+将文本格式的后缀列表（每行一个后缀，比如 .com、.com.cn）编译为二进制索引文件，
+happy_python.domain 首次验证域名时载入，不再在导入时逐行读取文本文件。
+
+索引文件格式（小端字节序）：
+    - 8 字节魔数 TLD_DB_MAGIC
+    - uint32 后缀数量 n
+    - uint32 偏移量数组，n + 1 个，相对于键数据起始位置
+    - 键数据：按字段反向、点分隔的 UTF-8 字符串（.com.cn 存储为 cn.com），按字节排序后依次存放
+
+索引文件与 Python 版本无关，整体载入内存时由键数据重建 SuffixTrie。
+
+索引可以整体载入内存，也可以通过 MmapSuffixIndex 以只读 mmap 方式直接查找，
+多个工作进程映射同一文件时共享操作系统的页缓存。
+
+重新编译（在项目根目录）：
+    python -m happy_python.tld_db [-o 输出文件] [后缀文本文件 ...]
+"""
+import argparse
+import mmap
+import os
+import struct
+import sys
+from pathlib import PurePath
+from typing import Iterable, Iterator, Sequence
+
+TLD_DB_MAGIC = b'HPTLD\x00\x00\x01'
+
+# 环境变量：后缀数据文件路径（索引文件或文本文件），用于不发布新版本更新后缀数据
+TLD_DB_ENV = 'HAPPY_PYTHON_TLD_DB'
+
+# 环境变量：值为 1 时以只读 mmap 方式使用索引文件
+TLD_DB_MMAP_ENV = 'HAPPY_PYTHON_TLD_DB_MMAP'
+
+RESOURCE_DIR = PurePath(__file__).parent / 'resource'
+
+# 默认的索引文件和编译索引使用的文本文件
+TLD_DB_FILE = str(RESOURCE_DIR / 'tlds.idx')
+TLD_TEXT_FILES = (str(RESOURCE_DIR / 'tlds.txt'), str(RESOURCE_DIR / 'public_suffixes.txt'))
+
+_SEPARATOR = '.'
+_HEADER = struct.Struct('<8sI')
+
+# 后缀树中标记后缀结束的键，域名字段不能为空，不会与字段冲突
+_SUFFIX_END = ''
+
+
+class SuffixTrie:
+    """
+    按字段反向存储的公共后缀树，比如 .com.cn 存储为 cn -> com。
+    查找最长后缀的时间只与域名的字段数有关，与后缀数量无关，支持任意层级的后缀。
+    """
+    __slots__ = ('_root', '_size')
+
+    def __init__(self):
+        self._root = {}
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, suffix: str) -> None:
+        """
+        :param suffix: 后缀，比如 .com、.co.uk，开头的点可以省略
+        :return:
+        """
+        node = self._root
+
+        for feild in reversed(suffix.strip(_SEPARATOR).split(_SEPARATOR)):
+            node = node.setdefault(feild, {})
+
+        if _SUFFIX_END not in node:
+            node[_SUFFIX_END] = True
+            self._size += 1
+
+    def __contains__(self, suffix: str) -> bool:
+        feilds = suffix.strip(_SEPARATOR).split(_SEPARATOR)
+        return self.match(feilds) == len(feilds)
+
+    def match(self, feilds: Sequence[str]) -> int:
+        """
+        查找域名字段末尾最长的后缀
+        :param feilds: 域名字段，比如 ['www', 'foo', 'com', 'cn']
+        :return: 后缀包含的字段数，不存在时返回 0
+        """
+        node = self._root
+        matched = 0
+
+        for i in range(len(feilds) - 1, -1, -1):
+            # 空字段与后缀结束标记相同，不是有效的字段
+            node = node.get(feilds[i]) if feilds[i] else None
+
+            if node is None:
+                break
+
+            if _SUFFIX_END in node:
+                matched = len(feilds) - i
+
+        return matched
+
+
+def suffix_to_key(suffix: str) -> str:
+    """
+    后缀转换为索引键，比如 .com.cn 转换为 cn.com
+    :param suffix:
+    :return:
+    """
+    return _SEPARATOR.join(reversed(suffix.strip(_SEPARATOR).split(_SEPARATOR)))
+
+
+def key_to_suffix(key: str) -> str:
+    """
+    索引键转换为后缀，比如 cn.com 转换为 .com.cn
+    :param key:
+    :return:
+    """
+    return _SEPARATOR + _SEPARATOR.join(reversed(key.split(_SEPARATOR)))
+
+
+def read_suffix_text(filename: str) -> list[str]:
+    """
+    读取文本格式的后缀列表，忽略空行和 # 开头的注释行
+    :param filename:
+    :return:
+    """
+    with open(filename, encoding='UTF-8') as f:
+        return [line for line in (line.strip() for line in f) if line and not line.startswith('#')]
+
+
+def is_tld_db(filename: str) -> bool:
+    """
+    文件是否为索引文件
+    :param filename:
+    :return:
+    """
+    with open(filename, 'rb') as f:
+        return f.read(len(TLD_DB_MAGIC)) == TLD_DB_MAGIC
+
+
+def compile_tld_db(suffixes: Iterable[str], output: str) -> int:
+    """
+    编译后缀列表为索引文件，先写入临时文件再替换，正在使用旧文件的进程不受影响
+    :param suffixes: 后缀，比如 .com、.com.cn
+    :param output: 索引文件路径
+    :return: 后缀数量
+    """
+    suffixes = {_SEPARATOR + suffix.strip(_SEPARATOR) for suffix in suffixes if suffix.strip(_SEPARATOR)}
+    keys = sorted(suffix_to_key(suffix).encode('UTF-8') for suffix in suffixes)
+    offsets = [0]
+
+    for key in keys:
+        offsets.append(offsets[-1] + len(key))
+
+    tmp = '%s.%d.tmp' % (output, os.getpid())
+
+    with open(tmp, 'wb') as f:
+        f.write(_HEADER.pack(TLD_DB_MAGIC, len(keys)))
+        f.write(struct.pack('<%dI' % len(offsets), *offsets))
+        f.write(b''.join(keys))
+
+    os.replace(tmp, output)
+
+    return len(keys)
+
+
+def _read_header(data) -> tuple[int, int]:
+    if len(data) < _HEADER.size:
+        raise ValueError('无效的后缀索引文件')
+
+    magic, count = _HEADER.unpack_from(data)
+
+    if magic != TLD_DB_MAGIC or len(data) < _HEADER.size + 4 * (count + 1):
+        raise ValueError('无效的后缀索引文件')
+
+    # 后缀数量，偏移量数组起始位置
+    return count, _HEADER.size
+
+
+def _read_keys(filename: str) -> list[str]:
+    with open(filename, 'rb') as f:
+        data = f.read()
+
+    count, pos = _read_header(data)
+    offsets = struct.unpack_from('<%dI' % (count + 1), data, pos)
+    base = pos + 4 * (count + 1)
+
+    if len(data) < base + offsets[-1]:
+        raise ValueError('后缀索引文件不完整：%s' % filename)
+
+    blob = data[base:base + offsets[-1]]
+
+    return [blob[offsets[i]:offsets[i + 1]].decode('UTF-8') for i in range(count)]
+
+
+def read_tld_db(filename: str) -> list[str]:
+    """
+    读取索引文件中的全部后缀
+    :param filename:
+    :return: 后缀，比如 .com、.com.cn，按索引键排序
+    """
+    return [key_to_suffix(key) for key in _read_keys(filename)]
+
+
+def load_suffix_trie(filename: str) -> tuple[frozenset[str], SuffixTrie]:
+    """
+    将索引文件整体载入内存，由键数据重建公共后缀树
+    :param filename:
+    :return: 顶级域集合、公共后缀树
+    """
+    keys = _read_keys(filename)
+    trie = SuffixTrie()
+    tlds = []
+
+    # 键已按反向字段存放且不重复，直接插入，不再转换为后缀
+    for key in keys:
+        node = trie._root
+
+        for feild in key.split(_SEPARATOR):
+            node = node.setdefault(feild, {})
+
+        node[_SUFFIX_END] = True
+
+        if _SEPARATOR not in key:
+            tlds.append(_SEPARATOR + key)
+
+    trie._size = len(keys)
+
+    return frozenset(tlds), trie
+
+
+class MmapSuffixIndex:
+    """
+    以只读 mmap 方式使用的后缀索引，提供与 SuffixTrie 相同的查找接口，
+    每次查找在排序的键上做二分查找
+    """
+    __slots__ = ('_mm', '_offsets', '_base', '_count')
+
+    def __init__(self, filename: str):
+        with open(filename, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self._count, pos = _read_header(self._mm)
+        self._base = pos + 4 * (self._count + 1)
+
+        if len(self._mm) < self._base + struct.unpack_from('<I', self._mm, self._base - 4)[0]:
+            self._mm.close()
+            raise ValueError('后缀索引文件不完整：%s' % filename)
+
+        if sys.byteorder == 'little':
+            self._offsets = memoryview(self._mm)[pos:self._base].cast('I')
+        else:
+            self._offsets = struct.unpack_from('<%dI' % (self._count + 1), self._mm, pos)
+
+    def close(self) -> None:
+        if isinstance(self._offsets, memoryview):
+            self._offsets.release()
+
+        self._mm.close()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _key(self, i: int) -> bytes:
+        return self._mm[self._base + self._offsets[i]:self._base + self._offsets[i + 1]]
+
+    def _bisect(self, key: bytes) -> int:
+        lo = 0
+        hi = self._count
+
+        while lo < hi:
+            mid = (lo + hi) // 2
+
+            if self._key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        return lo
+
+    def __iter__(self) -> Iterator[str]:
+        for i in range(self._count):
+            yield key_to_suffix(self._key(i).decode('UTF-8'))
+
+    def __contains__(self, suffix: str) -> bool:
+        key = suffix_to_key(suffix).encode('UTF-8')
+        i = self._bisect(key)
+
+        return i < self._count and self._key(i) == key
+
+    def match(self, feilds: Sequence[str]) -> int:
+        """
+        查找域名字段末尾最长的后缀
+        :param feilds: 域名字段，比如 ['www', 'foo', 'com', 'cn']
+        :return: 后缀包含的字段数，不存在时返回 0
+        """
+        matched = 0
+        key = b''
+
+        for n in range(1, len(feilds) + 1):
+            feild = feilds[-n].encode('UTF-8')
+            key = key + b'.' + feild if key else feild
+            i = self._bisect(key)
+
+            if i < self._count and self._key(i) == key:
+                matched = n
+
+            # 不存在以当前键为前缀的更长后缀时结束查找，前缀相同的键在排序后相邻
+            prefix = key + b'.'
+            i = self._bisect(prefix)
+
+            if i >= self._count or not self._key(i).startswith(prefix):
+                break
+
+        return matched
+
+
+def main(argv: Sequence[str] = None) -> None:
+    parser = argparse.ArgumentParser(prog='python -m happy_python.tld_db', description='编译公共后缀索引文件')
+    parser.add_argument('files', nargs='*', default=TLD_TEXT_FILES, help='后缀文本文件，每行一个后缀')
+    parser.add_argument('-o', '--output', default=TLD_DB_FILE, help='索引文件路径')
+    args = parser.parse_args(argv)
+
+    suffixes = []
+
+    for filename in args.files:
+        suffixes.extend(read_suffix_text(filename))
+
+    count = compile_tld_db(suffixes, args.output)
+    print('%d suffixes -> %s' % (count, args.output))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+import asyncio
+import contextlib
+import io
+import os
+import subprocess
+import tempfile
+import time
+import unittest
+
+from happy_python import async_get_exit_code_of_cmd, async_get_exit_status_of_cmd, async_get_output_of_cmd, \
+    async_execute_cmd, async_exe_cmd_and_poll_output
+
+
+class TestCmdAsyncio(unittest.IsolatedAsyncioTestCase):
+    async def test_async_get_exit_code_of_cmd(self):
+        self.assertEqual(await async_get_exit_code_of_cmd('exit 0'), 0)
+        self.assertEqual(await async_get_exit_code_of_cmd('exit 3', is_show_error=False), 3)
+
+        with self.assertRaises(subprocess.CalledProcessError):
+            await async_get_exit_code_of_cmd('exit 1', is_raise_exception=True)
+
+    async def test_async_get_exit_status_of_cmd(self):
+        self.assertTrue(await async_get_exit_status_of_cmd('exit 0'))
+        self.assertFalse(await async_get_exit_status_of_cmd('exit 1', is_show_error=False))
+
+    async def test_async_execute_cmd(self):
+        code, result = await async_execute_cmd('echo foo')
+        self.assertEqual(code, 0)
+        self.assertEqual(result, 'foo' + os.linesep)
+
+        result = await async_get_output_of_cmd('echo bar', remove_white_char=True)
+        self.assertEqual(result, 'bar')
+
+    async def test_argv(self):
+        self.assertEqual(await async_execute_cmd(['echo', 'a; b']), (0, 'a; b' + os.linesep))
+        self.assertEqual(await async_get_output_of_cmd('echo "a  b"', remove_white_char=True, use_shell=False),
+                         'a  b')
+
+    async def test_concurrency(self):
+        semaphore = asyncio.Semaphore(10)
+        start = time.perf_counter()
+        results = await asyncio.gather(*(async_execute_cmd('sleep 0.2; echo %d' % i, remove_white_char=True,
+                                                           semaphore=semaphore) for i in range(10)))
+        self.assertLess(time.perf_counter() - start, 1.5)
+        self.assertEqual([r for _, r in results], [str(i) for i in range(10)])
+
+    async def test_timeout(self):
+        start = time.perf_counter()
+
+        with self.assertRaises(subprocess.TimeoutExpired):
+            await async_execute_cmd('sleep 5', timeout=0.2)
+
+        self.assertLess(time.perf_counter() - start, 2)
+
+    async def test_cancel(self):
+        with tempfile.TemporaryDirectory() as d:
+            pid_file = os.path.join(d, 'pids')
+            # shell 及其启动的后台进程
+            task = asyncio.ensure_future(async_execute_cmd('sleep 5 & echo $$ $! > %s; wait' % pid_file))
+            await asyncio.sleep(0.2)
+            task.cancel()
+
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+            with open(pid_file) as f:
+                pids = [int(pid) for pid in f.read().split()]
+
+        self.assertEqual(len(pids), 2)
+        shell_pid, child_pid = pids
+
+        # 子进程已退出并被回收
+        with self.assertRaises(ProcessLookupError):
+            os.kill(shell_pid, 0)
+
+        # 孙进程由 init 回收，回收前为僵尸进程
+        try:
+            with open('/proc/%d/stat' % child_pid) as f:
+                self.assertEqual(f.read().rsplit(')', 1)[1].split()[0], 'Z')
+        except FileNotFoundError:
+            pass
+
+    async def test_async_exe_cmd_and_poll_output(self):
+        output = await async_exe_cmd_and_poll_output('echo -n ok', is_capture_output=True)
+        self.assertEqual(output, ['ok'])
+
+        # 超过 StreamReader 默认 limit（64 KiB）的行
+        with contextlib.redirect_stdout(io.StringIO()):
+            output = await async_exe_cmd_and_poll_output(['python3', '-c', 'print("a" * 200000); print("b", end="")'],
+                                                         is_capture_output=True)
+
+        self.assertEqual(output, ['a' * 200000 + '\n', 'b'])
+
+
+if __name__ == '__main__':
+    unittest.main()
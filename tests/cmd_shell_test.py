@@ -0,0 +1,56 @@
+import os
+import subprocess
+import unittest
+
+from happy_python import CmdShell, execute_cmd
+
+
+class TestCmdShell(unittest.TestCase):
+    def setUp(self) -> None:
+        self.shell = CmdShell()
+        self.shell.start()
+
+    def tearDown(self) -> None:
+        self.shell.close()
+
+    def test_execute_cmd(self):
+        for cmd in ('echo foo', 'printf abc', 'echo "a  b" \'c\'', 'echo bar >&2; exit 3', 'seq 1 100000'):
+            self.assertEqual(self.shell.execute_cmd(cmd), execute_cmd(cmd))
+
+        cr = self.shell.run_cmd('echo foo; echo bar >&2; exit 2', remove_white_char=True)
+        self.assertEqual((cr.returncode, cr.stdout, cr.stderr), (2, 'foo', 'bar' + os.linesep))
+
+        self.assertEqual(self.shell.get_output_of_cmd(['echo', 'a; b'], remove_white_char=True), 'a; b')
+        self.assertEqual(self.shell.get_exit_code_of_cmd('if then', is_show_error=False), 2)
+        self.assertTrue(self.shell.get_exit_status_of_cmd('test -d /'))
+
+        with self.assertRaises(subprocess.CalledProcessError):
+            self.shell.get_exit_code_of_cmd('false', is_raise_exception=True)
+
+    def test_isolated(self):
+        self.shell.execute_cmd('cd /; X=1; exit 5')
+        self.assertNotEqual(self.shell.get_output_of_cmd('pwd', remove_white_char=True), '/')
+        self.assertEqual(self.shell.get_output_of_cmd('echo "$X"', remove_white_char=True), '')
+        self.assertEqual(self.shell.start_count, 1)
+
+        with CmdShell(isolated=False) as shell:
+            shell.execute_cmd('X=1')
+            self.assertEqual(shell.get_output_of_cmd('echo "$X"', remove_white_char=True), '1')
+            # exit 结束常驻进程，下一次调用时自动重启
+            self.assertEqual(shell.execute_cmd('echo x; exit 4'), (4, 'x\n'))
+            self.assertEqual(shell.get_output_of_cmd('echo "$X"', remove_white_char=True), '')
+            self.assertEqual(shell.start_count, 2)
+
+    def test_restart(self):
+        pid = self.shell.pid
+        os.kill(pid, 9)
+        # 等待常驻进程退出，避免命令写入即将被杀死的进程
+        self.shell._proc.wait(timeout=5)
+
+        self.assertEqual(self.shell.get_output_of_cmd('echo foo'), 'foo\n')
+        self.assertNotEqual(self.shell.pid, pid)
+
+        with self.assertRaises(subprocess.TimeoutExpired):
+            self.shell.run_cmd('sleep 5', timeout=0.1)
+
+        self.assertEqual(self.shell.get_output_of_cmd('echo bar'), 'bar\n')
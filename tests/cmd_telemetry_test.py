@@ -0,0 +1,53 @@
+import json
+import unittest
+
+from happy_python import CmdTelemetry, execute_cmd, execute_cmd_batch, run_cmd, set_cmd_telemetry
+from happy_python.cmd_telemetry import command_name
+
+
+class TestCmdTelemetry(unittest.TestCase):
+    def setUp(self) -> None:
+        self.telemetry = set_cmd_telemetry(CmdTelemetry())
+
+    def tearDown(self) -> None:
+        set_cmd_telemetry(None)
+
+    def test_command_name(self):
+        self.assertEqual(command_name('LANG=C /usr/bin/grep -q foo | wc'), 'grep')
+        self.assertEqual(command_name(['python3', '-c', 'pass']), 'python3')
+        self.assertEqual(command_name('echo "unterminated'), 'echo')
+
+    def test_usage(self):
+        cr = run_cmd(['python3', '-c', 'b = bytearray(64 << 20); sum(range(10 ** 6))'])
+        self.assertEqual(cr.returncode, 0)
+        self.assertGreater(cr.usage.cpu_time, 0)
+        self.assertGreater(cr.usage.max_rss, 64 << 20)
+
+        execute_cmd('exit 3')
+        list(execute_cmd_batch(['sleep 0.01'] * 3, is_show_error=False))
+
+        stats = self.telemetry.to_dict()
+        self.assertEqual(stats['python3']['count'], 1)
+        self.assertEqual(stats['python3']['max_rss_bytes']['buckets']['+Inf'], 1)
+        self.assertEqual(stats['exit']['failures'], 1)
+        self.assertEqual(stats['sleep']['count'], 3)
+        self.assertEqual(json.loads(self.telemetry.to_json())['sleep']['duration_seconds']['buckets']['+Inf'], 3)
+
+    def test_prometheus(self):
+        run_cmd('echo foo')
+        run_cmd(['sh', '-c', 'exit 1'])
+        text = self.telemetry.to_prometheus()
+
+        self.assertIn('# TYPE happy_cmd_duration_seconds histogram', text)
+        self.assertIn('happy_cmd_duration_seconds_bucket{cmd="echo",le="+Inf"} 1', text)
+        self.assertIn('happy_cmd_duration_seconds_count{cmd="echo"} 1', text)
+        self.assertIn('happy_cmd_failures_total{cmd="sh"} 1', text)
+        self.assertTrue(text.endswith('\n'))
+
+        self.telemetry.clear()
+        self.assertEqual(self.telemetry.to_dict(), {})
+
+    def test_disabled(self):
+        set_cmd_telemetry(None)
+        self.assertIsNone(run_cmd('echo foo').usage)
+        self.assertEqual(self.telemetry.to_dict(), {})
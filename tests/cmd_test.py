@@ -1,14 +1,23 @@
 import os
+import shutil
+import signal
+import subprocess
 import tempfile
 import unittest
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import PurePath
+import time
 from time import sleep
 
-from happy_python import exe_cmd_and_poll_output, execute_cmd
+from happy_python import exe_cmd_and_poll_output, execute_cmd, execute_cmd_batch, run_cmd, start_cmd, \
+    iter_cmd_output, CmdCache, CmdCapture, CmdLimits, CmdPipeline, SpilledOutput, resolve_executable, \
+    set_cmd_close_fds
 from happy_python import get_exit_code_of_cmd
 from happy_python import get_exit_status_of_cmd
 from happy_python import get_output_of_cmd
 from happy_python import non_blocking_exe_cmd
+from happy_python.cmd import LOG_OUTPUT_MAX_SIZE, hlog
 
 
 class TestUtils(unittest.TestCase):
@@ -59,16 +68,359 @@ class TestUtils(unittest.TestCase):
         self.assertEqual(code, 0)
         self.assertEqual(result, 'foo')
 
+    def test_run_cmd(self):
+        cr = run_cmd('echo foo; echo bar >&2; exit 2', remove_white_char=True)
+        self.assertEqual(cr.returncode, 2)
+        self.assertEqual(cr.stdout, 'foo')
+        self.assertEqual(cr.stderr, 'bar' + os.linesep)
+        self.assertGreater(cr.duration, 0)
+
+    def test_run_cmd_capture(self):
+        expected = ''.join('%d\n' % i for i in range(1, 100001))
+
+        cr = run_cmd('seq 1 100000', capture=CmdCapture(max_bytes=1000))
+        self.assertEqual(len(cr.stdout), 1000)
+        self.assertEqual(cr.stdout, expected[:500] + expected[-500:])
+        self.assertEqual(cr.stdout_truncated, len(expected) - 1000)
+
+        cr = run_cmd('seq 1 100000; echo err >&2', capture=CmdCapture(spill_threshold=4096))
+        self.assertIsInstance(cr.stdout, SpilledOutput)
+        self.assertEqual(cr.stderr, 'err\n')
+
+        with cr.stdout as spilled:
+            self.assertEqual(len(spilled), len(expected))
+            view = spilled.memoryview()
+            self.assertEqual(bytes(view[:8]), b'1\n2\n3\n4\n')
+            view.release()
+            self.assertEqual(spilled.decode(), expected)
+
+        code, result = execute_cmd('printf "\\377ok"', capture=CmdCapture(decode=False))
+        self.assertEqual(code, 0)
+        self.assertEqual(result, b'\xffok')
+
+        with self.assertRaises(ValueError):
+            CmdCapture(max_bytes=1, spill_threshold=1)
+
+        for kwargs in ({'max_bytes': 0}, {'max_bytes': -1}, {'spill_threshold': -1}):
+            with self.assertRaises(ValueError):
+                CmdCapture(**kwargs)
+
+        # 最小的限制：只保留最后 1 个字节
+        cr = run_cmd('seq 1 100000', capture=CmdCapture(max_bytes=1))
+        self.assertEqual((cr.stdout, cr.stdout_truncated), ('\n', len(expected) - 1))
+
+        with run_cmd('echo', capture=CmdCapture(spill_threshold=0)).stdout as spilled:
+            self.assertEqual(len(spilled), 1)
+
+        # 执行失败时日志中只保留输出的开头和结尾
+        with self.assertLogs(hlog.logger, 'ERROR') as cm:
+            code, result = execute_cmd('seq 1 100000; seq 1 100000 >&2; exit 2',
+                                       capture=CmdCapture(spill_threshold=4096))
+
+        with result:
+            self.assertEqual(code, 2)
+            self.assertEqual(len(result), len(expected))
+            self.assertTrue(all(len(msg) < LOG_OUTPUT_MAX_SIZE + 100 for msg in cm.output))
+            self.assertIn('100000', cm.output[0])
+            self.assertIn('truncated', cm.output[1])
+
+    def test_execute_cmd_batch(self):
+        cmds = ['sleep 0.%d; echo %d' % (5 - i, i) for i in range(5)]
+
+        results = list(execute_cmd_batch(cmds, workers=5, remove_white_char=True))
+        self.assertEqual([cr.stdout for cr in results], ['0', '1', '2', '3', '4'])
+        self.assertEqual([cr.index for cr in results], [0, 1, 2, 3, 4])
+
+        results = list(execute_cmd_batch(cmds, workers=5, ordered=False, remove_white_char=True))
+        self.assertEqual([cr.stdout for cr in results], ['4', '3', '2', '1', '0'])
+
+        cmds = ['exit 0', 'exit 1', 'exit 0', 'exit 0']
+        results = list(execute_cmd_batch(cmds, workers=1, fail_fast=True, is_show_error=False))
+        self.assertEqual([cr.returncode for cr in results], [0, 1])
+
+        results = list(execute_cmd_batch(iter(cmds), workers=2, is_show_error=False))
+        self.assertEqual([cr.returncode for cr in results], [0, 1, 0, 0])
+
+        # 无法启动的命令不中断批量执行
+        cmds = ['echo a', 'happy-no-such-cmd --foo', 'echo b']
+        results = list(execute_cmd_batch(cmds, workers=2, is_show_error=False, use_shell=False))
+        self.assertEqual([cr.returncode for cr in results], [0, 127, 0])
+        self.assertEqual([cr.index for cr in results], [0, 1, 2])
+        self.assertEqual(results[2].stdout, 'b\n')
+        self.assertIn('happy-no-such-cmd', results[1].stderr)
+
+        with self.assertRaises(FileNotFoundError):
+            list(execute_cmd_batch(cmds, workers=1, fail_fast=True, is_show_error=False, use_shell=False))
+
     def test_non_blocking_exe_cmd(self):
         non_blocking_exe_cmd('mkdir ' + self.test_dir)
         sleep(1)
         self.assertTrue(os.path.exists(self.test_dir))
 
+    def test_argv(self):
+        self.assertTrue(os.path.isabs(resolve_executable('echo')))
+
+        cr = run_cmd(['echo', 'foo; exit 1'], remove_white_char=True)
+        self.assertEqual(cr.returncode, 0)
+        self.assertEqual(cr.stdout, 'foo; exit 1')
+
+        self.assertEqual(execute_cmd('echo "a  b" $HOME', use_shell=False, remove_white_char=True), (0, 'a  b $HOME'))
+        self.assertEqual(get_exit_code_of_cmd(['false'], is_show_error=False), 1)
+        self.assertTrue(get_exit_status_of_cmd(['true']))
+
+        with self.assertRaises(FileNotFoundError):
+            run_cmd(['happy-python-no-such-command'])
+
+        handle = start_cmd(['sleep', '5'])
+        handle.kill()
+        self.assertNotEqual(handle.wait(timeout=5), 0)
+
+        # 可继承的文件描述符默认不泄漏到子进程，set_cmd_close_fds(False) 时继承
+        r, w = os.pipe()
+        os.set_inheritable(w, True)
+
+        try:
+            cmd = ['test', '-e', '/proc/self/fd/%d' % w]
+            self.assertEqual(run_cmd(cmd).returncode, 1)
+
+            set_cmd_close_fds(False)
+
+            try:
+                self.assertEqual(run_cmd(cmd).returncode, 0)
+            finally:
+                set_cmd_close_fds(True)
+        finally:
+            os.close(r)
+            os.close(w)
+
+    def test_timeout(self):
+        # 超时后 shell 启动的孙进程也被结束，不会一直占用输出管道
+        start = time.perf_counter()
+
+        with self.assertRaises(subprocess.TimeoutExpired) as cm:
+            run_cmd('echo foo; sleep 5; echo bar', timeout=0.2)
+
+        self.assertEqual(cm.exception.output, 'foo\n')
+
+        with self.assertRaises(subprocess.TimeoutExpired):
+            execute_cmd('sleep 5 | cat', timeout=0.2)
+
+        with self.assertRaises(subprocess.TimeoutExpired):
+            list(iter_cmd_output('sleep 5', timeout=0.2))
+
+        with self.assertRaises(subprocess.TimeoutExpired):
+            start_cmd('sleep 5', timeout=0.2).result(timeout=5)
+
+        results = list(execute_cmd_batch(['sleep 5', 'echo ok'], timeout=0.2, is_show_error=False))
+        self.assertEqual([cr.timed_out for cr in results], [True, False])
+        self.assertLess(time.perf_counter() - start, 4)
+
+        self.assertEqual(get_output_of_cmd('echo ok', remove_white_char=True, timeout=5), 'ok')
+
+    def test_timeout_escalation(self):
+        # 忽略 SIGTERM 的进程在 KILL_GRACE_PERIOD 秒后被 SIGKILL 结束
+        start = time.perf_counter()
+
+        with self.assertRaises(subprocess.TimeoutExpired):
+            run_cmd('trap "" TERM; sleep 30', timeout=0.2)
+
+        self.assertLess(time.perf_counter() - start, 10)
+
+        handle = start_cmd('trap "" TERM; sleep 30')
+        self.assertNotEqual(handle.stop(grace=0.2), 0)
+
+    def test_limits(self):
+        limits = CmdLimits(cpu_seconds=10, address_space=1 << 30, open_files=64)
+        self.assertEqual(get_output_of_cmd('ulimit -t; ulimit -v; ulimit -n', limits=limits).split(),
+                         ['10', str(1 << 20), '64'])
+        self.assertEqual(get_output_of_cmd(['sh', '-c', 'ulimit -n'], remove_white_char=True,
+                                           limits=CmdLimits(open_files=32)), '32')
+
+        cr = run_cmd('while :; do :; done', limits=CmdLimits(cpu_seconds=1), timeout=30)
+        self.assertLess(cr.returncode, 0)
+
+        # 多线程批量执行
+        results = execute_cmd_batch(['ulimit -n'] * 4, workers=4, remove_white_char=True,
+                                    limits=CmdLimits(open_files=48))
+        self.assertEqual([cr.stdout for cr in results], ['48'] * 4)
+
+        # 没有 prlimit 时使用 Python 包装进程
+        with mock.patch('happy_python.cmd._which', lambda name, path: None if name == 'prlimit' else
+                        shutil.which(name, path=path)):
+            self.assertEqual(get_output_of_cmd('ulimit -t; ulimit -n', limits=limits).split(), ['10', '64'])
+
+    def test_pipeline(self):
+        result = CmdPipeline().pipe(['printf', 'b\\na\\nc\\n']).pipe('sort').run()
+        self.assertEqual(result.returncodes, [0, 0])
+        self.assertEqual(result.stdout, 'a\nb\nc\n')
+
+        sizes = []
+        result = CmdPipeline().pipe('seq 1 100000') \
+            .filter(lambda b: b.replace(b'1', b'x')) \
+            .progress(sizes.append) \
+            .pipe('grep -c x') \
+            .run()
+        self.assertEqual(result.returncodes, [0, 0, 0, 0])
+        self.assertEqual(result.stdout, '40952\n')
+        self.assertEqual(sizes[-1], len(''.join('%d\n' % i for i in range(1, 100001))))
+
+        # 各阶段的退出代码和标准错误
+        result = CmdPipeline().pipe(['sh', '-c', 'echo err >&2; exit 3']).pipe('cat').run()
+        self.assertEqual((result.returncodes, result.stderr), ([3, 0], ['err\n', '']))
+        self.assertEqual((result.returncode, result.pipefail_returncode), (0, 3))
+
+        # 下游提前退出时，上游收到 SIGPIPE
+        result = CmdPipeline().pipe('seq 1 1000000').filter(lambda b: b).pipe('head -n 1').run()
+        self.assertEqual(result.returncodes, [-signal.SIGPIPE, -signal.SIGPIPE, 0])
+        self.assertEqual(result.stdout, '1\n')
+
+        result = CmdPipeline().filter(lambda b: 1 / 0).pipe('cat').run(input=b'abc')
+        self.assertEqual(result.returncodes, [1, 0])
+        self.assertIsInstance(result.errors[0], ZeroDivisionError)
+
+        self.assertEqual(CmdPipeline().pipe('tr a-z A-Z').run(input='hello').stdout, 'HELLO')
+
+        with tempfile.TemporaryFile() as f, tempfile.TemporaryFile() as out:
+            f.write(b'x' * 3000000)
+            f.seek(0)
+            result = CmdPipeline().progress(sizes.append).run(input=f, stdout=out)
+            self.assertEqual(result.returncodes, [0])
+            self.assertEqual(out.seek(0, os.SEEK_END), 3000000)
+
+        with self.assertRaises(subprocess.TimeoutExpired):
+            CmdPipeline().pipe('sleep 5').pipe('cat').run(timeout=0.2)
+
+        # 中间阶段启动失败时关闭已创建的全部管道
+        fds = os.listdir('/proc/self/fd')
+
+        with self.assertRaises(FileNotFoundError):
+            CmdPipeline().pipe('cat').filter(lambda b: b).pipe('happy-no-such-cmd').pipe('cat').run(input=b'abc')
+
+        self.assertEqual(os.listdir('/proc/self/fd'), fds)
+
+    def test_cmd_cache(self):
+        cache = CmdCache(ttl=60, maxsize=2)
+        cmd = 'echo $$'
+
+        pid = cache.get_output_of_cmd(cmd, remove_white_char=True)
+        self.assertEqual(cache.get_output_of_cmd(cmd, remove_white_char=True), pid)
+        self.assertEqual(cache.execute_cmd(cmd), (0, pid + '\n'))
+        self.assertEqual((cache.stats().hits, cache.stats().misses), (2, 1))
+
+        # 环境变量不同时重新执行
+        os.environ['HAPPY_CMD_CACHE_TEST'] = '1'
+
+        try:
+            self.assertNotEqual(cache.get_output_of_cmd(cmd, remove_white_char=True), pid)
+        finally:
+            del os.environ['HAPPY_CMD_CACHE_TEST']
+
+        self.assertEqual(cache.invalidate(cmd), 2)
+        self.assertNotEqual(cache.get_output_of_cmd(cmd, remove_white_char=True), pid)
+
+        # 失败的结果默认不缓存
+        self.assertEqual(cache.execute_cmd('exit 3')[0], 3)
+        self.assertEqual(cache.execute_cmd('exit 3')[0], 3)
+        self.assertEqual(cache.stats().hits, 2)
+
+        with self.assertRaises(subprocess.CalledProcessError):
+            cache.run_cmd('exit 1', is_raise_exception=True)
+
+        cache.get_output_of_cmd('echo 1')
+        cache.get_output_of_cmd('echo 2')
+        self.assertEqual(cache.stats().size, 2)
+        self.assertGreater(cache.stats().evictions, 0)
+
+        # 有效期
+        cache = CmdCache(ttl=0)
+        self.assertNotEqual(cache.get_output_of_cmd(cmd), cache.get_output_of_cmd(cmd))
+
+    def test_cmd_cache_invalidate(self):
+        cache = CmdCache()
+        pid = cache.get_output_of_cmd('echo $$')
+        other = cache.get_output_of_cmd('echo $PPID $$')
+
+        # 只删除指定命令的条目
+        self.assertEqual(cache.invalidate('echo $$'), 1)
+        self.assertEqual(cache.get_output_of_cmd('echo $PPID $$'), other)
+        self.assertNotEqual(cache.get_output_of_cmd('echo $$'), pid)
+
+        # 执行期间使其他命令失效不影响结果写入缓存，使该命令失效时不写入
+        cmd = 'sleep 0.3; echo $$'
+
+        for invalidated, cached in (('echo $$', True), (cmd, False)):
+            cache = CmdCache()
+
+            with ThreadPoolExecutor(1) as executor:
+                future = executor.submit(cache.get_output_of_cmd, cmd)
+                sleep(0.1)
+                cache.invalidate(invalidated)
+                pid = future.result()
+
+            self.assertEqual(cache.get_output_of_cmd(cmd) == pid, cached)
+
+    def test_cmd_cache_single_flight(self):
+        cache = CmdCache()
+
+        with ThreadPoolExecutor(8) as executor:
+            outputs = list(executor.map(lambda _: cache.get_output_of_cmd('sleep 0.2; echo $$'), range(8)))
+
+        self.assertEqual(len(set(outputs)), 1)
+        stats = cache.stats()
+        self.assertEqual((stats.misses, stats.hits + stats.coalesced), (1, 7))
+
     def test_exe_cmd_and_poll_output(self):
         output = exe_cmd_and_poll_output('echo -n ok', is_capture_output=True)
         sleep(1)
         self.assertEqual(output[0], 'ok')
 
+    def test_start_cmd(self):
+        handle = start_cmd('sleep 0.2; echo foo', remove_white_char=True)
+        self.assertIsNone(handle.poll())
+        self.assertFalse(handle.done())
+        self.assertEqual(handle.wait(), 0)
+        self.assertEqual(handle.result().stdout, 'foo')
+        self.assertEqual(handle.returncode, 0)
+
+        handle = start_cmd('sleep 5')
+
+        with self.assertRaises(subprocess.TimeoutExpired):
+            handle.wait(timeout=0.1)
+
+        handle.kill()
+        self.assertNotEqual(handle.wait(timeout=5), 0)
+
+        # is_show_error=False 时超时不输出错误日志
+        with self.assertNoLogs(hlog.logger, 'ERROR'):
+            handle = start_cmd('sleep 5', timeout=0.1, is_show_error=False)
+
+            with self.assertRaises(subprocess.TimeoutExpired):
+                handle.result(timeout=10)
+
+        handles = [start_cmd('echo %d; exit %d' % (i, i), is_show_error=False) for i in range(3)]
+        results = sorted(f.result().returncode for f in as_completed(handles, timeout=5))
+        self.assertEqual(results, [0, 1, 2])
+
+    def test_iter_cmd_output(self):
+        script = 'import sys; print("a"); sys.stderr.write("e1\\n"); print("b"); sys.stdout.write("中文"); ' \
+                 'sys.exit(3)'
+        stream = iter_cmd_output('python3 -c \'%s\'' % script)
+        events = list(stream)
+
+        self.assertEqual(stream.returncode, 3)
+        self.assertEqual([line for name, line in events if name == 'stdout'], ['a\n', 'b\n', '中文'])
+        self.assertEqual([line for name, line in events if name == 'stderr'], ['e1\n'])
+
+        lines = []
+        stream = iter_cmd_output('seq 1 1000', on_stdout=lines.append, capture_lines=3)
+        self.assertEqual(stream.run(), 0)
+        self.assertEqual(len(lines), 1000)
+        self.assertEqual(list(stream.stdout_tail), ['998\n', '999\n', '1000\n'])
+
+        # 按数据块读取时，拼接后的结果与原始输出一致
+        chunks = [chunk for _, chunk in iter_cmd_output('seq 1 100000', lines=False, chunk_size=7)]
+        self.assertEqual(''.join(chunks), ''.join('%d\n' % i for i in range(1, 100001)))
+
     def tearDown(self) -> None:
         if os.path.exists(self.test_dir):
             os.rmdir(self.test_dir)
@@ -0,0 +1,126 @@
+import hashlib
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from happy_python import Manifest, build_manifest, verify_manifest
+from happy_python import digest_manifest
+
+
+class TestDigestManifest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self.tmp_dir.name, 'tree')
+        self.files = {
+            'a.txt': b'a',
+            'empty': b'',
+            'sub/b.bin': os.urandom(300 * 1024),
+            'sub/deep/c.bin': os.urandom(1000),
+            'sub/tab\tname': b'tab',
+            'big.bin': os.urandom(2 * 1024 * 1024 + 3),
+        }
+
+        for path, data in self.files.items():
+            path = os.path.join(self.root, path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+            with open(path, 'wb') as f:
+                f.write(data)
+
+        os.symlink('a.txt', os.path.join(self.root, 'link'))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_build_manifest(self):
+        manifest = build_manifest(self.root, piece_size=1024 * 1024, workers=4)
+
+        self.assertEqual([entry.path for entry in manifest], sorted(self.files))
+
+        entries = manifest.to_dict()
+
+        for path, data in self.files.items():
+            self.assertEqual(entries[path].size, len(data))
+
+            if len(data) < 1024 * 1024:
+                self.assertEqual(entries[path].digest, hashlib.sha256(data).hexdigest())
+
+        # 大文件为分块摘要拼接后的摘要
+        data = self.files['big.bin']
+        pieces = b''.join(hashlib.sha256(data[i:i + 1024 * 1024]).digest() for i in range(0, len(data), 1024 * 1024))
+        self.assertEqual(entries['big.bin'].digest, hashlib.sha256(pieces).hexdigest())
+
+        self.assertEqual(build_manifest(self.root, piece_size=1024 * 1024, workers=1), manifest)
+
+        filename = os.path.join(self.tmp_dir.name, 'tree.manifest')
+        manifest.save(filename)
+        self.assertEqual(Manifest.load(filename), manifest)
+
+    def test_verify_manifest(self):
+        manifest = build_manifest(self.root, 'md5', piece_size=1024 * 1024)
+        self.assertTrue(verify_manifest(self.root, manifest).ok)
+
+        os.unlink(os.path.join(self.root, 'a.txt'))
+
+        with open(os.path.join(self.root, 'new'), 'wb') as f:
+            f.write(b'new')
+
+        with open(os.path.join(self.root, 'sub/deep/c.bin'), 'r+b') as f:
+            f.write(b'x')
+
+        with open(os.path.join(self.root, 'big.bin'), 'ab') as f:
+            f.write(b'x')
+
+        diff = verify_manifest(self.root, manifest, workers=4)
+        self.assertFalse(diff.ok)
+        self.assertEqual(diff.missing, ['a.txt'])
+        self.assertEqual(diff.extra, ['new'])
+        self.assertEqual(diff.changed, ['big.bin', 'sub/deep/c.bin'])
+
+    def _scan_then(self, action):
+        """
+        遍历目录后、计算摘要前修改目录
+        """
+        scan_files = digest_manifest.scan_files
+
+        def wrapper(root):
+            files = list(scan_files(root))
+            action()
+            return iter(files)
+
+        return mock.patch.object(digest_manifest, 'scan_files', wrapper)
+
+    def _truncate(self, path, size):
+        with open(os.path.join(self.root, path), 'r+b') as f:
+            f.truncate(size)
+
+    def test_files_changed_while_hashing(self):
+        manifest = build_manifest(self.root, piece_size=1024 * 1024)
+
+        def action():
+            os.unlink(os.path.join(self.root, 'a.txt'))
+            os.unlink(os.path.join(self.root, 'sub/b.bin'))
+            self._truncate('big.bin', 1024 * 1024 + 10)
+
+        with self._scan_then(action):
+            diff = verify_manifest(self.root, manifest, workers=2)
+
+        self.assertEqual(diff.missing, ['a.txt', 'sub/b.bin'])
+        self.assertEqual(diff.extra, [])
+        self.assertEqual(diff.changed, ['big.bin'])
+
+        # 条目记录实际读取的字节数，遍历后被删除的文件不记录
+        def action():
+            os.unlink(os.path.join(self.root, 'sub/deep/c.bin'))
+            self._truncate('big.bin', 1024 * 1024 + 5)
+
+        with self._scan_then(action):
+            entries = build_manifest(self.root, piece_size=1024 * 1024).to_dict()
+
+        self.assertNotIn('sub/deep/c.bin', entries)
+        self.assertEqual(entries['big.bin'].size, 1024 * 1024 + 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
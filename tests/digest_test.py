@@ -1,9 +1,14 @@
+import hashlib
+import io
+import os
+import tempfile
 import unittest
 
 from happy_python import gen_md5_32_hexdigest, sign_sha1_digest, sign_sha224_digest, sign_sha256_digest, \
     sign_sha384_digest, sign_sha512_digest
 from happy_python import gen_sha1_hexdigest
 from happy_python import gen_sha512_hexdigest
+from happy_python import gen_stream_hexdigests, gen_file_hexdigests, gen_file_hexdigest
 
 
 class TestUtils(unittest.TestCase):
@@ -98,3 +103,26 @@ class TestUtils(unittest.TestCase):
         self.assertEqual(len(result), size)
         self.assertEqual(result,
                          'eEJIWxpVdFqYI8PhVZhuyb3lsUBpFnjF0gKk4fRmTxMKxPxNx1yKUdR7mo+0O9zzBlIUPaaW/nlAcDLOSKui+A==')
+
+    def test_gen_file_hexdigests(self):
+        data = os.urandom(3 * 1024 * 1024 + 17)
+        expected = {'md5': hashlib.md5(data).hexdigest(), 'sha256': hashlib.sha256(data).hexdigest()}
+
+        self.assertEqual(gen_md5_32_hexdigest(b'abc'), '900150983cd24fb0d6963f7d28e17f72')
+        self.assertEqual(gen_stream_hexdigests(io.BytesIO(data), chunk_size=65536), expected)
+
+        with tempfile.NamedTemporaryFile(delete=False) as f:
+            f.write(data)
+
+        try:
+            for use_mmap in (False, True):
+                self.assertEqual(gen_file_hexdigests(f.name, use_mmap=use_mmap), expected)
+
+            self.assertEqual(gen_file_hexdigest(f.name), expected['sha256'])
+            self.assertEqual(gen_file_hexdigests(f.name), expected)
+            self.assertEqual(gen_file_hexdigest(f.name, 'sha1', use_mmap=True), hashlib.sha1(data).hexdigest())
+        finally:
+            os.unlink(f.name)
+
+        with tempfile.NamedTemporaryFile() as f:
+            self.assertEqual(gen_file_hexdigest(f.name, 'md5', use_mmap=True), hashlib.md5(b'').hexdigest())
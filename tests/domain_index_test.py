@@ -0,0 +1,81 @@
+import os
+import tempfile
+import unittest
+
+from happy_python import DomainIndex, parse_domain_name, parse_domains, to_domain_obj
+
+
+class TestDomainIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = DomainIndex(to_domain_obj(d) for d in ('www.foo.com.cn', 'mail.foo.com.cn', 'foo.com.cn',
+                                                            'bar.com.cn', 'www.baz.com', 'foobar.1com'))
+
+    def test_query(self):
+        index = self.index
+
+        self.assertEqual(len(index), 5)
+        self.assertIn('foo.com.cn', index)
+        self.assertNotIn('com.cn', index)
+        self.assertNotIn('foo.com', index)
+
+        self.assertEqual(index.count('foo.com.cn'), 3)
+        self.assertEqual(index.count('.com.cn'), 4)
+        self.assertEqual(index.count('com'), 1)
+        self.assertEqual(index.count(''), 5)
+        self.assertEqual(index.count('qux.com'), 0)
+
+        self.assertEqual(sorted(index.find('foo.com.cn')), ['foo.com.cn', 'mail.foo.com.cn', 'www.foo.com.cn'])
+        self.assertEqual(list(index.find('qux.com')), [])
+        self.assertEqual(len(list(index)), 5)
+
+        self.assertEqual(index.children('com.cn'), {'foo': 3, 'bar': 1})
+        self.assertEqual(index.children(), {'cn': 4, 'com': 1})
+        self.assertEqual(index.domain_counts(), {'foo.com.cn': 3, 'bar.com.cn': 1, 'baz.com': 1})
+
+    def test_dedup(self):
+        index = self.index
+
+        self.assertFalse(index.add('www.foo.com.cn'))
+        self.assertFalse(index.add(parse_domain_name('foo.com.cn')))
+        self.assertEqual(index.update(parse_domains(['www.foo.com.cn', 'a.bar.com.cn', 'foobar.1com'], workers=1)), 1)
+        self.assertEqual(len(index), 6)
+        self.assertEqual(index.count('bar.com.cn'), 2)
+        self.assertEqual(index.domain_counts()['bar.com.cn'], 2)
+
+        with self.assertRaises(ValueError):
+            index.add('foobar.1com')
+
+    def test_save_load(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, 'domains.idx')
+            self.index.save(filename)
+            index = DomainIndex.load(filename)
+
+        self.assertEqual(sorted(index), sorted(self.index))
+        self.assertEqual(index.children('com.cn'), self.index.children('com.cn'))
+        self.assertEqual(index.domain_counts(), self.index.domain_counts())
+        self.assertTrue(index.add('new.baz.com'))
+        self.assertEqual(index.count('baz.com'), 2)
+
+    def test_load_invalid(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, 'domains.idx')
+            self.index.save(filename)
+
+            with open(filename, encoding='UTF-8') as f:
+                lines = f.readlines()
+
+            # 首行无效、版本不同、数据不完整
+            for content in ('\x00' * 64 + '\n',
+                            lines[0].replace('version=2', 'version=1') + ''.join(lines[1:]),
+                            ''.join(lines[:-1]),
+                            ''.join(lines[:2])):
+                with open(filename, 'w', encoding='UTF-8') as f:
+                    f.write(content)
+
+                with self.assertRaises(ValueError):
+                    DomainIndex.load(filename)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,10 @@
+import os
+import tempfile
 import unittest
 
-from happy_python import to_domain_obj
+from happy_python import to_domain_obj, parse_domains, DomainError, validate_domain, is_valid_domain, \
+    parse_domain_name, DomainName, normalize_domain, domain_to_unicode
+from happy_python.domain import SuffixTrie, TLD_TRIE
 
 
 class TestUtils(unittest.TestCase):
@@ -94,3 +98,154 @@ class TestUtils(unittest.TestCase):
                                    'aekui5phea2Eeyeelaijiex5ahniefaitied5Cohpei1Yoh6chaingohwie9pao.'
                                    'aekui5phea2Eeyeelaijiex5ahniefaitied5Cohpei1Yoh6chaingohwie9pao.com')
         self.assertIsNone(tmp_domain)
+
+    def test_suffix_trie(self):
+        trie = SuffixTrie()
+        trie.add('.uk')
+        trie.add('.co.uk')
+        trie.add('pvt.k12.ma.us')
+        trie.add('.uk')
+
+        self.assertEqual(len(trie), 3)
+        self.assertIn('.co.uk', trie)
+        self.assertIn('pvt.k12.ma.us', trie)
+        self.assertNotIn('.k12.ma.us', trie)
+        self.assertEqual(trie.match(['www', 'foo', 'co', 'uk']), 2)
+        self.assertEqual(trie.match(['foo', 'ac', 'uk']), 1)
+        self.assertEqual(trie.match(['foo', 'pvt', 'k12', 'ma', 'us']), 4)
+        self.assertEqual(trie.match(['foo', 'com']), 0)
+
+        self.assertIn('.com', TLD_TRIE)
+        self.assertIn('.ne.jp', TLD_TRIE)
+
+    def test_multi_label_suffix(self):
+        # 倒数第二个字段不是顶级域的多级公共后缀
+        domain = to_domain_obj('www.foobar.ne.jp')
+        self.assertIsNotNone(domain)
+        self.assertEqual(domain.feild_domain_name, 'foobar')
+        self.assertEqual(domain.feild_top_level_domains, ['.ne', '.jp'])
+        self.assertEqual(domain.get_host_name(), 'www')
+        self.assertEqual(domain.get_domain_name(), 'foobar.ne.jp')
+
+        domain = to_domain_obj('www.foobar.co.uk')
+        self.assertEqual(domain.feild_top_level_domains, ['.co', '.uk'])
+        self.assertEqual(domain.get_domain_name(), 'foobar.co.uk')
+
+        self.assertIsNone(to_domain_obj('com.cn.'))
+
+    def test_parse_domains(self):
+        domains = ['www.foobar.com.cn', 'foobar.1com', '', '.foobar.com', 'com', 'baz-.foobar.com', 'f.com',
+                   'foobar.com'] * 5
+        expected = [to_domain_obj(d) for d in domains]
+
+        for workers in (1, 2):
+            parser = parse_domains(domains, workers=workers, chunk_size=3)
+            records = list(parser)
+
+            self.assertEqual([r.name for r in records], domains)
+            self.assertEqual([r.is_valid for r in records], [d is not None for d in expected])
+            self.assertEqual(records[0][1:], ('www', 'foobar.com.cn', '.com.cn', None))
+            self.assertEqual(records[1].error, DomainError.UNKNOWN_TLD)
+            self.assertEqual(records[2].error, DomainError.EMPTY)
+            self.assertEqual(records[3].error, DomainError.LEADING_DOT)
+            self.assertEqual(records[4].error, DomainError.TOO_FEW_LABELS)
+            self.assertEqual(records[5].error, DomainError.BAD_HOST_LABEL)
+            self.assertEqual(records[6].error, DomainError.BAD_DOMAIN_LABEL)
+
+            self.assertEqual(parser.stats.total, 40)
+            self.assertEqual(parser.stats.valid, 10)
+            self.assertEqual(parser.stats.invalid, 30)
+            self.assertEqual(parser.stats.by_reason[DomainError.UNKNOWN_TLD], 5)
+
+        # 末尾带点的两段域名不能中断批量解析
+        for workers in (1, 2):
+            parser = parse_domains(['foo.', 'foobar.com', 'foo.'], workers=workers)
+            self.assertEqual([r.error for r in parser], [DomainError.EMPTY_LABEL, None, DomainError.EMPTY_LABEL])
+            self.assertEqual(parser.stats.by_reason[DomainError.EMPTY_LABEL], 2)
+
+        with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as f:
+            f.write('www.foobar.com\n  foobar.co.uk \nfoobar.foobar\n')
+
+        try:
+            parser = parse_domains(f.name, workers=1)
+            self.assertEqual([r.domain_name for r in parser], ['foobar.com', 'foobar.co.uk', ''])
+            self.assertEqual(parser.stats.invalid, 1)
+        finally:
+            os.unlink(f.name)
+
+    def test_validate_domain(self):
+        cases = [
+            ('www.foobar.com.cn', None, ''),
+            ('', DomainError.EMPTY, ''),
+            ('a' * 250 + '.com', DomainError.TOO_LONG, ''),
+            ('.foobar.com', DomainError.LEADING_DOT, ''),
+            ('.com', DomainError.LEADING_DOT, ''),
+            ('com', DomainError.TOO_FEW_LABELS, ''),
+            ('foo..com', DomainError.EMPTY_LABEL, ''),
+            ('foobar.com.', DomainError.EMPTY_LABEL, ''),
+            ('foo.', DomainError.EMPTY_LABEL, ''),
+            ('a.', DomainError.EMPTY_LABEL, ''),
+            ('a..', DomainError.EMPTY_LABEL, ''),
+            ('cbxc\u200d.', DomainError.EMPTY_LABEL, ''),
+            ('a' * 64 + '.com', DomainError.LABEL_TOO_LONG, 'a' * 64),
+            ('foobar.1com', DomainError.UNKNOWN_TLD, '1com'),
+            ('foobar%.com', DomainError.BAD_DOMAIN_LABEL, 'foobar%'),
+            ('baz-.foobar.com', DomainError.BAD_HOST_LABEL, 'baz-'),
+            ('baz%.foobar.com', DomainError.BAD_HOST_LABEL, 'baz%'),
+            ('WWW.foobar.com', DomainError.BAD_HOST_LABEL, 'WWW'),
+            ('foo_bar.com', DomainError.BAD_DOMAIN_LABEL, 'foo_bar'),
+            ('_www.test_.foobar.com', None, ''),
+            ('时尚.中国', None, ''),
+            ('www.时尚.中国', None, ''),
+            ('xn--9et52u.xn--fiqs8s', None, ''),
+            ('时尚.xn--fiqs8s', None, ''),
+            ('www.bücher.de', None, ''),
+            ('a' * 60 + '时尚.中国', DomainError.BAD_IDN_LABEL, 'a' * 60 + '时尚'),
+            ('时尚.中国x', DomainError.UNKNOWN_TLD, '中国x'),
+        ]
+
+        for domain, error, label in cases:
+            result = validate_domain(domain)
+            self.assertEqual(result.error, error, domain)
+            self.assertEqual(result.label, label, domain)
+            self.assertEqual(result.is_valid, error is None)
+            self.assertEqual(bool(result), error is None)
+            self.assertEqual(is_valid_domain(domain), error is None)
+            self.assertEqual(to_domain_obj(domain) is not None, error is None)
+
+    def test_domain_name(self):
+        domain = parse_domain_name('www.test.foobar.com.cn')
+        self.assertEqual(domain.name, 'www.test.foobar.com.cn')
+        self.assertEqual(domain.host_name, 'www.test')
+        self.assertEqual(domain.domain_name, 'foobar.com.cn')
+        self.assertEqual(domain.suffix, '.com.cn')
+        self.assertEqual(domain.feild_hosts, ('www', 'test'))
+        self.assertEqual(domain.feild_domain_name, 'foobar')
+        self.assertEqual(domain.feild_top_level_domains, ('.com', '.cn'))
+        self.assertEqual(domain.get_domain_name(), 'foobar.com.cn')
+        self.assertEqual(domain.get_host_name(), 'www.test')
+
+        # 缓存与驻留
+        self.assertIs(parse_domain_name('www.test.foobar.com.cn'), domain)
+        self.assertIs(parse_domain_name('foo.com.cn').suffix, domain.suffix)
+        self.assertEqual(DomainName.from_domain(to_domain_obj('www.test.foobar.com.cn')), domain)
+
+        domain = parse_domain_name('foobar.com')
+        self.assertIs(domain.domain_name, domain.name)
+        self.assertEqual(domain.feild_hosts, ())
+
+        with self.assertRaises(AttributeError):
+            domain.name = 'foo.com'
+
+        self.assertIsNone(parse_domain_name('foobar.1com'))
+
+    def test_normalize_domain(self):
+        self.assertEqual(normalize_domain(' WWW.Foobar.COM. '), 'www.foobar.com')
+        self.assertEqual(normalize_domain('www.时尚.中国'), 'www.xn--9et52u.xn--fiqs8s')
+        self.assertEqual(normalize_domain('Bücher.de'), 'xn--bcher-kva.de')
+        self.assertIsNone(normalize_domain('foobar.1com'))
+        self.assertIsNone(normalize_domain('foo..com'))
+
+        self.assertEqual(domain_to_unicode('www.xn--9et52u.xn--fiqs8s'), 'www.时尚.中国')
+        self.assertEqual(domain_to_unicode('www.foobar.com'), 'www.foobar.com')
+        self.assertEqual(domain_to_unicode('xn--zz.com'), 'xn--zz.com')
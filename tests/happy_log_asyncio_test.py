@@ -0,0 +1,75 @@
+import asyncio
+import logging
+import time
+import unittest
+
+from happy_python import HappyLog
+from happy_python.happy_log import SingletonMeta, AsyncLogManager, HappyLogLevel
+from happy_python.happy_log_asyncio import HappyAsyncLog, LoopLagMonitor
+
+
+class SlowListHandler(logging.Handler):
+    def __init__(self, delay: float = 0.0):
+        super().__init__()
+        self.delay = delay
+        self.messages = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        time.sleep(self.delay)
+        self.messages.append(record.getMessage())
+
+
+class TestHappyLogAsyncio(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        SingletonMeta._instances.clear()
+        AsyncLogManager().set_async_enabled(False)
+        self.hlog = HappyLog()
+        self.hlog.set_level(HappyLogLevel.INFO)
+        self.handler = SlowListHandler(delay=0.1)
+        self.hlog.logger.addHandler(self.handler)
+
+    def tearDown(self):
+        self.hlog.logger.removeHandler(self.handler)
+
+    async def test_non_blocking_log(self):
+        async with HappyAsyncLog(self.hlog) as alog:
+            start = time.perf_counter()
+
+            for i in range(5):
+                await alog.info('message', i)
+                self.hlog.info('sync', i)
+
+            # 慢 handler 在后台线程中执行，不阻塞事件循环
+            self.assertLess(time.perf_counter() - start, 0.1)
+
+            await alog.flush()
+            self.assertEqual(len(self.handler.messages), 10)
+            self.assertEqual(self.handler.messages[0], 'message 0')
+
+        self.assertIn(self.handler, self.hlog.logger.handlers)
+
+    async def test_drop_when_full(self):
+        async with HappyAsyncLog(self.hlog, maxsize=2) as alog:
+            for i in range(10):
+                await alog.warning('message', i)
+
+            self.assertGreater(alog.dropped, 0)
+
+        self.assertEqual(len(self.handler.messages) + alog.dropped, 10)
+
+    async def test_loop_lag_monitor(self):
+        self.handler.delay = 0
+
+        async with LoopLagMonitor(self.hlog, threshold=0.05, interval=0.01) as monitor:
+            await asyncio.sleep(0.02)
+            # 阻塞事件循环
+            time.sleep(0.2)
+            await asyncio.sleep(0.05)
+
+        self.assertGreaterEqual(monitor.stall_count, 1)
+        self.assertGreater(monitor.max_lag, 0.05)
+        self.assertTrue(any('Event loop lag' in m for m in self.handler.messages))
+
+
+if __name__ == '__main__':
+    unittest.main()
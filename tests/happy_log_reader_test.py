@@ -0,0 +1,74 @@
+import os
+import tempfile
+import unittest
+
+from happy_python.happy_log import HappyLogLevel
+from happy_python.happy_log_reader import HappyLogReader, read_log
+
+
+class TestHappyLogReader(unittest.TestCase):
+    def setUp(self):
+        self.log_dir = tempfile.TemporaryDirectory()
+        self.log_file = os.path.join(self.log_dir.name, 'app.log')
+
+        lines = []
+
+        for minute in range(60):
+            for second in (0, 30):
+                ts = '2024-05-01 10:%02d:%02d' % (minute, second)
+                lines.append('%s 100 [INFO] cmd: minute %d' % (ts, minute))
+
+                if minute % 10 == 0 and second == 0:
+                    lines.append('%s 200 [ERROR] domain: failed %d' % (ts, minute))
+                    lines.append('Traceback (most recent call last):')
+                    lines.append('  ValueError: 无效的域名')
+
+        with open(self.log_file, 'w', encoding='UTF-8') as f:
+            f.write('\n'.join(lines) + '\n')
+
+    def tearDown(self):
+        self.log_dir.cleanup()
+
+    def test_read_all(self):
+        entries = list(read_log(self.log_file))
+        self.assertEqual(len(entries), 126)
+        self.assertEqual(entries[0].timestamp, '2024-05-01 10:00:00')
+        self.assertEqual(entries[0].pid, 100)
+        self.assertEqual(entries[0].module, 'cmd')
+        self.assertEqual(entries[1].message,
+                         'failed 0\nTraceback (most recent call last):\n  ValueError: 无效的域名')
+
+    def test_read_filter(self):
+        with HappyLogReader(self.log_file) as reader:
+            entries = list(reader.read(start='2024-05-01 10:15', end='2024-05-01 10:40', levels=[HappyLogLevel.ERROR]))
+            self.assertEqual([e.message.split('\n')[0] for e in entries], ['failed 20', 'failed 30', 'failed 40'])
+
+            entries = list(reader.read(start='2024-05-01 10:59:30', pid=100))
+            self.assertEqual([e.message for e in entries], ['minute 59'])
+
+            entries = list(reader.read(end='2024-05-01 10:00', module='domain'))
+            self.assertEqual(len(entries), 1)
+
+            self.assertEqual(list(reader.read(start='2024-05-01 11')), [])
+
+    def test_index(self):
+        starts = ('2024-05-01 10:20:30', '2024-05-01 10:20', '2024-05-01 10:25:00', '2024-05-01 09')
+
+        with HappyLogReader(self.log_file) as reader:
+            expected = [[e.offset for e in reader.read(start=start)] for start in starts]
+            self.assertEqual(reader.build_index(interval=300), 12)
+
+        self.assertTrue(os.path.exists(self.log_file + '.hidx'))
+
+        with HappyLogReader(self.log_file) as reader:
+            self.assertTrue(reader.load_index())
+            self.assertEqual([[e.offset for e in reader.read(start=start)] for start in starts], expected)
+
+    def test_empty_file(self):
+        empty_file = os.path.join(self.log_dir.name, 'empty.log')
+        open(empty_file, 'w').close()
+        self.assertEqual(list(read_log(empty_file)), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
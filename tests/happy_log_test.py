@@ -2,6 +2,7 @@ import inspect
 import logging
 import os
 import tempfile
+import threading
 import unittest
 from logging.handlers import RotatingFileHandler
 
@@ -211,5 +212,59 @@ datefmt=%Y-%m-%d %H:%M:%S
 
         self.assertEqual(cm.output, ['TRACE:root:output->foo=1'])
 
+    def test_thread_safety_stress(self):
+        thread_num = 32
+        loop_num = 200
+        mgr = AsyncLogManager()
+        created = []
+        instances = []
+        errors = []
+        barrier = threading.Barrier(thread_num)
+        key = 'stress_handler_%d' % id(self)
+
+        def factory():
+            h = logging.NullHandler()
+            created.append(h)
+            return h
+
+        def worker(n: int):
+            try:
+                barrier.wait()
+                logger_name = 'stress_%d' % n
+
+                for i in range(loop_num):
+                    h = mgr.get_or_create_handler(key, factory)
+                    mgr.register_handlers(logger_name, [h])
+                    mgr.fallback(logging.makeLogRecord({'name': logger_name, 'msg': 'stress %d' % i}))
+                    instances.append(HappyLog())
+
+                    if i % 10 == 0:
+                        mgr.unregister_handlers(logger_name)
+                        instances[-1].set_level(HappyLogLevel.DEBUG if i % 20 else HappyLogLevel.INFO)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(thread_num)]
+
+        for t in threads:
+            t.start()
+
+        for t in threads:
+            t.join()
+
+        self.assertEqual(errors, [])
+        # 并发 get_or_create_handler 只能创建一个 handler
+        self.assertEqual(len(created), 1)
+        # 并发获取的单例必须是同一个实例
+        self.assertEqual(len(set(id(i) for i in instances)), 1)
+        self.assertIsInstance(mgr.active_handlers.get('stress_0', ()), tuple)
+
+        for n in range(thread_num):
+            mgr.unregister_handlers('stress_%d' % n)
+
+        # 只有一个 handler 挂在 logger 上，set_level 并发重载配置后没有残留重复 handler
+        self.assertEqual(len(instances[0].logger.handlers), 1)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,80 @@
+import threading
+import time
+import unittest
+
+from happy_python import HappyLog
+from happy_python.happy_log import HappyLogLevel, SingletonMeta, AsyncLogManager
+from happy_python.happy_profile import HappyProfiler, HappySampler, ProfileMode
+
+
+def _busy_func(n: int) -> int:
+    return sum(i * i for i in range(n))
+
+
+class TestHappyProfile(unittest.TestCase):
+    def setUp(self):
+        SingletonMeta._instances.clear()
+        AsyncLogManager().set_async_enabled(False)
+        self.hlog = HappyLog()
+        self.hlog.set_level(HappyLogLevel.INFO)
+
+    def test_cprofile(self):
+        with self.assertLogs(self.hlog.logger, level='INFO') as cm:
+            with self.hlog.profile('busy', top_n=5):
+                _busy_func(10000)
+
+        self.assertEqual(len(cm.output), 1)
+        self.assertIn('Profile busy (cprofile', cm.output[0])
+        self.assertIn('_busy_func', cm.output[0])
+
+    def test_tracemalloc_decorator(self):
+        @self.hlog.profile(mode=ProfileMode.TRACEMALLOC, top_n=3)
+        def alloc():
+            return [bytearray(1024) for _ in range(100)]
+
+        with self.assertLogs(self.hlog.logger, level='INFO') as cm:
+            self.assertEqual(len(alloc()), 100)
+
+        self.assertIn('alloc (tracemalloc', cm.output[0])
+
+    def test_max_chars(self):
+        with self.assertLogs(self.hlog.logger, level='INFO') as cm:
+            with HappyProfiler(self.hlog, 'busy', max_chars=100):
+                _busy_func(1000)
+
+        self.assertIn('truncated', cm.output[0])
+        self.assertLess(len(cm.records[0].getMessage()), 150)
+
+    def test_disabled_level(self):
+        with self.assertNoLogs(self.hlog.logger, level='INFO'):
+            with self.hlog.profile('busy', level=HappyLogLevel.DEBUG):
+                _busy_func(1000)
+
+    def test_sampler(self):
+        stop = threading.Event()
+
+        def busy():
+            while not stop.is_set():
+                _busy_func(1000)
+
+        t = threading.Thread(target=busy)
+        t.start()
+
+        try:
+            with HappySampler(self.hlog, interval=0.005) as sampler:
+                time.sleep(0.2)
+        finally:
+            stop.set()
+            t.join()
+
+        self.assertGreater(sampler.sample_count, 0)
+        self.assertTrue(any('_busy_func' in s for stack in sampler.samples for s in stack))
+
+        with self.assertLogs(self.hlog.logger, level='INFO') as cm:
+            sampler.report(top_n=2)
+
+        self.assertIn('Sampler:', cm.output[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
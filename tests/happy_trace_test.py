@@ -0,0 +1,118 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+
+from happy_python import HappyLog
+from happy_python.happy_log import HappyLogLevel, SingletonMeta, AsyncLogManager
+from happy_python.happy_trace import SPAN_RECORD_ATTR, ChromeTraceHandler
+
+
+class TestHappyTrace(unittest.TestCase):
+    def setUp(self):
+        SingletonMeta._instances.clear()
+        AsyncLogManager().set_async_enabled(False)
+        self.hlog = HappyLog()
+        self.hlog.set_level(HappyLogLevel.TRACE)
+
+    def tearDown(self):
+        self.hlog.set_level(HappyLogLevel.INFO)
+
+    def test_nested_span(self):
+        with self.assertLogs(self.hlog.logger, level='TRACE') as cm:
+            with self.hlog.span('outer', step=1):
+                with self.hlog.span('inner'):
+                    pass
+
+        events = [getattr(r, SPAN_RECORD_ATTR) for r in cm.records]
+        inner, outer = events
+
+        self.assertEqual(inner.name, 'inner')
+        self.assertEqual(inner.depth, 1)
+        self.assertEqual(inner.parent, 'outer')
+        self.assertEqual(outer.depth, 0)
+        self.assertEqual(outer.attrs, {'step': 1})
+        self.assertGreaterEqual(outer.duration_ns, inner.duration_ns)
+        self.assertLessEqual(outer.start_ns, inner.start_ns)
+
+    def test_span_decorator(self):
+        @self.hlog.span('foo')
+        def foo(n):
+            if n == 0:
+                raise ValueError('n')
+
+            return n
+
+        with self.assertLogs(self.hlog.logger, level='TRACE') as cm:
+            self.assertEqual(foo(1), 1)
+
+            with self.assertRaises(ValueError):
+                foo(0)
+
+        events = [getattr(r, SPAN_RECORD_ATTR) for r in cm.records]
+        self.assertEqual([e.name for e in events], ['foo', 'foo'])
+        self.assertEqual(events[1].attrs, {'error': 'ValueError'})
+
+    def test_span_asyncio_tasks(self):
+        @self.hlog.span('job')
+        async def job(name):
+            with self.hlog.span(name):
+                await asyncio.sleep(0.01)
+
+                with self.hlog.span(name + '.step'):
+                    await asyncio.sleep(0.01)
+
+        async def main():
+            with self.hlog.span('main'):
+                await asyncio.gather(job('a'), job('b'))
+
+        with self.assertLogs(self.hlog.logger, level='TRACE') as cm:
+            asyncio.run(main())
+
+        events = {(e.name, e.parent, e.depth) for e in (getattr(r, SPAN_RECORD_ATTR, None) for r in cm.records) if e}
+
+        # 并发的任务各自维护区间栈
+        self.assertEqual(events, {('main', '', 0), ('job', 'main', 1), ('a', 'job', 2), ('b', 'job', 2),
+                                  ('a.step', 'a', 3), ('b.step', 'b', 3)})
+
+    def test_span_disabled(self):
+        self.hlog.set_level(HappyLogLevel.INFO)
+        handler = ChromeTraceHandler(os.path.join(tempfile.gettempdir(), 'unused_trace.json'))
+        self.hlog.logger.addHandler(handler)
+
+        try:
+            with self.hlog.span('foo'):
+                pass
+        finally:
+            self.hlog.logger.removeHandler(handler)
+
+        self.assertEqual(handler.get_events(), [])
+
+    def test_chrome_trace_handler(self):
+        with tempfile.TemporaryDirectory() as d:
+            filename = os.path.join(d, 'trace.json')
+            handler = ChromeTraceHandler(filename)
+            self.hlog.logger.addHandler(handler)
+
+            try:
+                with self.hlog.span('outer'):
+                    with self.hlog.span('inner', n=2):
+                        pass
+
+                self.hlog.info('not a span')
+            finally:
+                self.hlog.logger.removeHandler(handler)
+                handler.close()
+
+            with open(filename, encoding='UTF-8') as f:
+                trace = json.load(f)
+
+        events = [e for e in trace['traceEvents'] if e['ph'] == 'X']
+        self.assertEqual([e['name'] for e in events], ['inner', 'outer'])
+        self.assertEqual(events[0]['args'], {'n': 2, 'parent': 'outer'})
+        self.assertTrue(any(e['ph'] == 'M' for e in trace['traceEvents']))
+
+
+if __name__ == '__main__':
+    unittest.main()
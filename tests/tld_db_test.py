@@ -0,0 +1,115 @@
+import os
+import subprocess
+import sys
+import tempfile
+import multiprocessing
+import unittest
+from unittest import mock
+
+from happy_python import domain, is_valid_domain, load_tld_db, parse_domains
+from happy_python.tld_db import SuffixTrie
+from happy_python.tld_db import MmapSuffixIndex, TLD_DB_FILE, TLD_TEXT_FILES, compile_tld_db, read_suffix_text, \
+    read_tld_db
+
+
+class TestTldDb(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.suffixes = ['.com', '.cn', '.com.cn', '.uk', '.co.uk', '.pvt.k12.ma.us', '.uk-foo', '.中国']
+        self.db_file = os.path.join(self.tmp_dir.name, 'tlds.idx')
+        compile_tld_db(self.suffixes, self.db_file)
+
+    def tearDown(self):
+        load_tld_db()
+        self.tmp_dir.cleanup()
+
+    def test_compile(self):
+        self.assertEqual(sorted(read_tld_db(self.db_file)), sorted(self.suffixes))
+
+        # 内置索引与文本文件一致
+        text_suffixes = {suffix for tmp in TLD_TEXT_FILES for suffix in read_suffix_text(tmp)}
+        self.assertEqual(set(read_tld_db(TLD_DB_FILE)), text_suffixes)
+
+    def test_mmap_index(self):
+        index = MmapSuffixIndex(self.db_file)
+        trie = SuffixTrie()
+
+        for suffix in self.suffixes:
+            trie.add(suffix)
+
+        try:
+            self.assertEqual(len(index), len(self.suffixes))
+            self.assertEqual(sorted(index), sorted(self.suffixes))
+            self.assertIn('.co.uk', index)
+            self.assertIn('.中国', index)
+            self.assertNotIn('.k12.ma.us', index)
+            self.assertNotIn('.org', index)
+
+            for feilds in (['www', 'foo', 'co', 'uk'], ['foo', 'ac', 'uk'], ['foo', 'pvt', 'k12', 'ma', 'us'],
+                           ['foo', 'k12', 'ma', 'us'], ['foo', 'org'], ['foo', 'uk-foo'], ['时尚', '中国']):
+                self.assertEqual(index.match(feilds), trie.match(feilds), feilds)
+        finally:
+            index.close()
+
+    def test_load_tld_db(self):
+        for use_mmap in (False, True):
+            self.assertEqual(load_tld_db(self.db_file, use_mmap=use_mmap), len(self.suffixes))
+            self.assertTrue(is_valid_domain('www.foobar.co.uk'))
+            self.assertFalse(is_valid_domain('www.foobar.org'))
+
+        text_file = os.path.join(self.tmp_dir.name, 'tlds.txt')
+
+        with open(text_file, 'w', encoding='UTF-8') as f:
+            f.write('# comment\n.org\n')
+
+        self.assertEqual(load_tld_db(text_file), 1)
+        self.assertTrue(is_valid_domain('www.foobar.org'))
+        self.assertFalse(is_valid_domain('www.foobar.com'))
+
+    def test_parse_domains_workers(self):
+        text_file = os.path.join(self.tmp_dir.name, 'tlds.txt')
+
+        with open(text_file, 'w', encoding='UTF-8') as f:
+            f.write('.internal\n')
+
+        domains = ['foo.internal', 'foo.com', 'foo.co.uk']
+
+        for filename, use_mmap, expected in ((text_file, False, [True, False, False]),
+                                             (self.db_file, True, [False, True, True])):
+            load_tld_db(filename, use_mmap=use_mmap)
+
+            # 工作进程使用父进程载入的顶级域数据，与启动方式无关
+            for method in ('fork', 'spawn'):
+                parser = parse_domains(domains, workers=2, chunk_size=1,
+                                       mp_context=multiprocessing.get_context(method))
+                self.assertEqual([r.is_valid for r in parser], expected, (filename, method))
+
+            self.assertEqual([r.is_valid for r in parse_domains(domains, workers=1)], expected)
+
+    def test_corrupt_db(self):
+        with open(self.db_file, 'rb') as f:
+            data = f.read()
+
+        for corrupt in (data[:12], data[:-3]):
+            with open(self.db_file, 'wb') as f:
+                f.write(corrupt)
+
+            for use_mmap in (False, True):
+                # 指定的索引文件损坏时载入空数据
+                self.assertEqual(load_tld_db(self.db_file, use_mmap=use_mmap), 0)
+                self.assertFalse(is_valid_domain('foo.com'))
+
+                # 内置索引文件损坏时使用文本文件
+                with mock.patch.object(domain, 'TLD_DB_FILE', self.db_file):
+                    self.assertGreater(load_tld_db(self.db_file, use_mmap=use_mmap), 1000)
+                    self.assertTrue(is_valid_domain('foo.com'))
+
+    def test_lazy_load(self):
+        code = 'import happy_python.domain as d; assert d._tld_db is None; ' \
+               'assert d.is_valid_domain("foo.org") is False; assert d.is_valid_domain("foo.co.uk")'
+        env = dict(os.environ, HAPPY_PYTHON_TLD_DB=self.db_file, HAPPY_PYTHON_TLD_DB_MMAP='1')
+        subprocess.run([sys.executable, '-c', code], env=env, check=True)
+
+
+if __name__ == '__main__':
+    unittest.main()